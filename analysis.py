@@ -0,0 +1,285 @@
+from dataclasses import dataclass
+from functools import lru_cache
+
+from helpers import _row_offsets
+from levelgen import GeneratorConfig
+from levelpack import _level_to_bytes
+
+# Grids are analysed as bitboards: Python ints with one bit per bubble, in the same order as the bytes
+# of a grid. Rows alternate between field_width and field_width - 1 bubbles, with the shorter rows sitting
+# half a bubble to the right, so every bubble at index i has the same six neighbours in the flat order:
+#
+#   up:    i - field_width (up-left),   i - field_width + 1 (up-right)
+#   side:  i - 1 (left),                i + 1 (right)
+#   down:  i + field_width - 1 (down-left), i + field_width (down-right)
+#
+# except at the edges of the field, which the masks in _HexMasks take care of. Shifting a whole bitboard
+# by these distances moves every bubble to its neighbour at once, so a flood fill takes a handful of
+# int operations per step no matter how many bubbles, or how many grids, it covers.
+#
+# Batches of grids are laid side by side in one bitboard, each grid padded to a whole number of bytes,
+# with the masks keeping bubbles from spreading from one grid into the next.
+
+# The color of every bubble value, with locked bubbles (21-39) counting as their color (1-19).
+# Empty, wild and special bubbles have no color.
+_COLOR_OF = bytes(value if 1 <= value <= 19 else value - 20 if 21 <= value <= 39 else 0 for value in range(256))
+# Translation tables turning a grid into '0' and '1' characters for int(..., 2).
+_FILLED_TO_BIT = b'0' + b'1' * 255
+_COLOR_TO_BIT = [bytes(b'1'[0] if color == value else b'0'[0] for value in _COLOR_OF) for color in range(40)]
+
+
+@dataclass
+class LevelAnalysis:
+    """The playability figures of a single grid, see analyze_levels.
+
+    Cells are given as (row, column) pairs, in the same layout generate_level returns.
+
+    Parameters
+    ----------
+    bubbles : int
+        the number of bubbles on the grid
+    components : dict
+        the sizes of the groups of touching bubbles of the same color, largest first, per color;
+        locked bubbles count as their color
+    match_clusters : list
+        the sizes of the groups of three or more touching bubbles of the same color, largest first
+    floating : tuple
+        the cells of the bubbles that are not connected to the top row through other bubbles
+    shot_targets : tuple
+        the empty cells a shot can come to rest in: reachable from the bottom of the field through
+        empty cells, and either in the top row or next to a bubble
+    """
+    bubbles: int
+    components: dict
+    match_clusters: list
+    floating: tuple
+    shot_targets: tuple
+
+
+def analyze_level(grid, config=GeneratorConfig()):
+    """Analyse a single grid, see analyze_levels.
+
+    Parameters
+    ----------
+    grid : list, memoryview or bytes
+        a level as generate_level returns it (but not as a string), or one flat list or bytes of bubbles
+    config : GeneratorConfig, optional
+        the configuration the level was generated with, used for the field size (default is a default GeneratorConfig)
+
+    Returns
+    -------
+    LevelAnalysis
+        the analysis of the grid
+    """
+    return analyze_levels([grid], config)[0]
+
+def analyze_levels(grids, config=GeneratorConfig()):
+    """Analyse a batch of grids for connected colors, floating bubbles and shot targets.
+
+    The floating bubbles and shot targets of the whole batch are worked out in a single pass over one bitboard,
+    so screening many levels at once is much faster than analysing them one at a time.
+
+    Parameters
+    ----------
+    grids : iterable
+        levels as generate_level returns them (but not as strings), or flat lists or bytes of bubbles,
+        such as LevelPackReader.get_level_bytes returns
+    config : GeneratorConfig, optional
+        the configuration the levels were generated with, used for the field size (default is a default GeneratorConfig)
+
+    Returns
+    -------
+    list
+        a LevelAnalysis per grid, in the same order
+    """
+    grids = [_grid_bytes(grid, config) for grid in grids]
+    if len(grids) == 0:
+        return []
+    masks = _hex_masks(config.field_width, config.field_height, len(grids))
+    single = _hex_masks(config.field_width, config.field_height, 1)
+
+    filled = _to_bitboard(grids, _FILLED_TO_BIT, masks)
+    floating = filled & ~_flood(filled & masks.top, filled, masks)
+    empty = masks.full & ~filled
+    reachable = _flood(empty & masks.bottom, empty, masks)
+    shot_targets = reachable & (masks.top | _spread(filled, masks))
+
+    floating_bits = _split(floating, masks)
+    shot_target_bits = _split(shot_targets, masks)
+    cells = _cells(config.field_width, config.field_height)
+
+    analyses = []
+    for grid, floating_cells, target_cells in zip(grids, floating_bits, shot_target_bits):
+        components = _components(grid, single)
+        analyses.append(LevelAnalysis(
+            bubbles=len(grid) - grid.count(0),
+            components=components,
+            match_clusters=sorted((size for sizes in components.values() for size in sizes if size >= 3), reverse=True),
+            floating=tuple(cells[index] for index in _bit_indexes(floating_cells)),
+            shot_targets=tuple(cells[index] for index in _bit_indexes(target_cells))))
+    return analyses
+
+def count_floating(grids, config=GeneratorConfig()):
+    """Return the number of floating bubbles on every grid of a batch, the quickest check for screening levels.
+
+    Parameters
+    ----------
+    grids : iterable
+        levels in any of the forms accepted by analyze_levels
+    config : GeneratorConfig, optional
+        the configuration the levels were generated with, used for the field size (default is a default GeneratorConfig)
+
+    Returns
+    -------
+    list
+        the number of floating bubbles per grid, in the same order
+    """
+    grids = [_grid_bytes(grid, config) for grid in grids]
+    if len(grids) == 0:
+        return []
+    masks = _hex_masks(config.field_width, config.field_height, len(grids))
+    filled = _to_bitboard(grids, _FILLED_TO_BIT, masks)
+    floating = filled & ~_flood(filled & masks.top, filled, masks)
+    return [bits.bit_count() for bits in _split(floating, masks)]
+
+
+@dataclass(frozen=True)
+class _HexMasks:
+    """The masks for flood filling a batch of grids of one size, see _hex_masks."""
+    field_width: int
+    count: int
+    stride: int
+    full: int
+    top: int
+    bottom: int
+    left: int
+    right: int
+    up_left: int
+    up_right: int
+    down_left: int
+    down_right: int
+
+
+@lru_cache(maxsize=64)
+def _hex_masks(field_width, field_height, count):
+    """Return the masks for count grids side by side, each taking up a whole number of bytes."""
+    offsets = _row_offsets(field_width, field_height)
+    stride = (offsets[-1] + 7) // 8 * 8
+
+    # Build the masks of a single grid, then repeat them for every grid in the batch.
+    top = bottom = left = right = up_left = up_right = down_left = down_right = 0
+    for row in range(field_height):
+        start = offsets[row]
+        length = offsets[row + 1] - start
+        for column in range(length):
+            bit = 1 << (start + column)
+            # The wide rows stick out past the narrow rows on both sides.
+            wide_left_edge = row % 2 == 0 and column == 0
+            wide_right_edge = row % 2 == 0 and column == length - 1
+            if row == 0:
+                top |= bit
+            if row == field_height - 1:
+                bottom |= bit
+            if column != 0:
+                left |= bit
+            if column != length - 1:
+                right |= bit
+            if row != 0 and not wide_left_edge:
+                up_left |= bit
+            if row != 0 and not wide_right_edge:
+                up_right |= bit
+            if row != field_height - 1 and not wide_left_edge:
+                down_left |= bit
+            if row != field_height - 1 and not wide_right_edge:
+                down_right |= bit
+
+    repeat = _repeat_mask(stride, count)
+    return _HexMasks(
+        field_width=field_width, count=count, stride=stride,
+        full=((1 << offsets[-1]) - 1) * repeat,
+        top=top * repeat, bottom=bottom * repeat, left=left * repeat, right=right * repeat,
+        up_left=up_left * repeat, up_right=up_right * repeat,
+        down_left=down_left * repeat, down_right=down_right * repeat)
+
+def _repeat_mask(stride, count):
+    """Return an int with a single bit at the start of every grid, multiplying a grid's mask by it repeats that mask."""
+    return int((b'0' * (stride - 1) + b'1') * count, 2)
+
+def _spread(bits, masks):
+    """Return the bits together with all of their neighbours."""
+    width = masks.field_width
+    return (bits
+            | (bits & masks.left) >> 1
+            | (bits & masks.right) << 1
+            | (bits & masks.up_left) >> width
+            | (bits & masks.up_right) >> (width - 1)
+            | (bits & masks.down_left) << (width - 1)
+            | (bits & masks.down_right) << width)
+
+def _flood(seeds, allowed, masks):
+    """Return every bit of allowed that can be reached from the seeds through other bits of allowed."""
+    filled = seeds & allowed
+    while True:
+        grown = _spread(filled, masks) & allowed
+        if grown == filled:
+            return filled
+        filled = grown
+
+def _to_bitboard(grids, table, masks):
+    """Turn grids of bytes into one bitboard, with a bit for every bubble the translation table maps to '1'."""
+    padding = [b'0' * (masks.stride - len(grid)) for grid in grids]
+    characters = b''.join(grid.translate(table) + pad for grid, pad in zip(grids, padding))
+    # int() reads the most significant bit first, so the first bubble has to come last.
+    return int(characters[::-1], 2)
+
+def _split(bits, masks):
+    """Split a bitboard of a batch back into one int per grid."""
+    grid_bytes = masks.stride // 8
+    data = bits.to_bytes(grid_bytes * masks.count, 'little')
+    return [int.from_bytes(data[start:start + grid_bytes], 'little')
+            for start in range(0, len(data), grid_bytes)]
+
+def _bit_indexes(bits):
+    """Return the index of every set bit, lowest first."""
+    indexes = []
+    while bits:
+        lowest = bits & -bits
+        indexes.append(lowest.bit_length() - 1)
+        bits ^= lowest
+    return indexes
+
+def _components(grid, masks):
+    """Return the sizes of the groups of touching bubbles of the same color on a single grid, per color."""
+    components = {}
+    colors = grid.translate(_COLOR_OF)
+    for color in set(colors):
+        if color == 0:
+            continue
+        remaining = _to_bitboard([grid], _COLOR_TO_BIT[color], masks)
+        sizes = []
+        while remaining:
+            component = _flood(remaining & -remaining, remaining, masks)
+            sizes.append(component.bit_count())
+            remaining ^= component
+        components[color] = sorted(sizes, reverse=True)
+    return components
+
+@lru_cache(maxsize=64)
+def _cells(field_width, field_height):
+    """Return the (row, column) of every index on a grid."""
+    offsets = _row_offsets(field_width, field_height)
+    return tuple((row, column) for row in range(field_height) for column in range(offsets[row + 1] - offsets[row]))
+
+def _grid_bytes(grid, config):
+    """Turn a grid into bytes, checking that it fits the configured field."""
+    grid_bytes = _level_to_bytes(grid)
+    if len(grid_bytes) != _row_offsets(config.field_width, config.field_height)[-1]:
+        raise ValueError(
+            f'Expected a grid of {config.field_width}x{config.field_height}, got {len(grid_bytes)} bubbles.')
+    return grid_bytes
+
+def _has_floating_bubbles(grid, field_width, field_height):
+    """Return True if any bubble on a grid of bytes is not connected to the top row through other bubbles."""
+    masks = _hex_masks(field_width, field_height, 1)
+    filled = _to_bitboard([grid], _FILLED_TO_BIT, masks)
+    return _flood(filled & masks.top, filled, masks) != filled
@@ -0,0 +1,275 @@
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from cache import _generate_level_bytes, level_key
+from catalog import get_catalog
+from helpers import _bytes_to_output
+from levelgen import GeneratorConfig, _parse_level_entry, level_seed
+
+
+class AsyncLevelGenerator:
+    """Generates levels for asyncio applications without blocking the event loop.
+
+    Generation runs in an executor, a process pool by default, so it does not hold up other requests.
+    At most max_pending levels are handed to the executor at once; any further requests wait their turn
+    without blocking, so a burst of requests cannot pile up unbounded work.
+
+    Requests for the same seeded level that arrive while it is being generated share that one generation.
+    Cancelling a request only cancels the generation if no other request is waiting for it.
+
+    A generator can be used from more than one event loop, for instance by successive asyncio.run calls
+    or loops in other threads; the max_pending limit and the shared generations are kept per loop.
+
+    Custom element and fill sets are only sent to a worker process the first time it needs them and are
+    then looked up by their digest, so the worker keeps their compiled catalogs between requests.
+    Keys and digests are worked out in a thread, as building a catalog would hold up the event loop.
+
+    Parameters
+    ----------
+    executor : concurrent.futures.Executor, optional
+        the executor to generate levels in, which is left running on close; a ProcessPoolExecutor is made
+        and shut down on close if not provided (default is None)
+    max_workers : int, optional
+        the number of worker processes if no executor is provided, None to use every core (default is None)
+    max_pending : int, optional
+        the most levels to hand to the executor at once per event loop (default is 64)
+    cache : LevelCache, optional
+        a cache to look seeded levels up in before generating them, and to store them in after (default is None)
+    """
+
+    def __init__(self, executor=None, max_workers=None, max_pending=64, cache=None):
+        self._owns_executor = executor is None
+        if executor is None:
+            executor = ProcessPoolExecutor(max_workers=max_workers)
+        self.executor = executor
+        self.max_pending = max_pending
+        self.cache = cache
+        # The semaphore and the shared jobs of every event loop, as asyncio objects belong to a single loop.
+        self._loops = {}
+        self._loops_lock = threading.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Shut down the executor if it was made by the generator, cancelling any work that has not started."""
+        if self._owns_executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def generate_level(
+                self, world, level, stars=0, required=[], excludes=[],
+                elements_set=None, fill_set=None, config=GeneratorConfig(),
+                only_required=False, seed=None):
+        """Generate a level in the executor, see generate_level for the parameters.
+
+        The rng and telemetry parameters are not supported, as generation happens in another process.
+        """
+        arguments = (world, level, stars, list(required), list(excludes), elements_set, fill_set,
+                     config, only_required, seed)
+        key, set_digests = await asyncio.get_running_loop().run_in_executor(None, _prepare_job, arguments)
+        job_arguments = (arguments, set_digests)
+
+        # Levels without a seed are different every time, so they can be neither cached nor shared.
+        if seed is None:
+            return _bytes_to_output(await self._run(job_arguments), config)
+
+        if self.cache is not None:
+            level_bytes = self.cache.get(key)
+            if level_bytes is not None:
+                return _bytes_to_output(level_bytes, config)
+
+        jobs = self._loop_state().jobs
+        job = jobs.get(key)
+        if job is None:
+            job = _SharedJob(asyncio.ensure_future(self._run(job_arguments, key)))
+            jobs[key] = job
+            job.task.add_done_callback(lambda _: self._forget(jobs, key, job))
+        return _bytes_to_output(await job.wait(), config)
+
+    async def iter_levels(
+                self, levels, required=[], excludes=[],
+                elements_set=None, fill_set=None, config=GeneratorConfig(),
+                only_required=False, master_seed=None, window=None):
+        """Generate a batch of levels in the executor, yielding them in order as they are done.
+
+        Takes the levels in any of the forms accepted by generate_levels. Up to window levels are
+        generated ahead of the one being waited for; stopping the iteration cancels them.
+
+        Parameters
+        ----------
+        levels : iterable
+            the levels to generate, see generate_levels
+        required, excludes, elements_set, fill_set, config, only_required, master_seed : optional
+            see generate_levels
+        window : int, optional
+            the most levels to generate ahead, max_pending if not provided (default is None)
+
+        Yields
+        ------
+        tuple
+            the world, level and stars of the level, followed by the generated level
+        """
+        if window is None:
+            window = self.max_pending
+        entries = iter(levels)
+        running = deque()
+
+        try:
+            while True:
+                # Keep the window full, so the executor always has work while we wait for the oldest level.
+                while len(running) < window:
+                    entry = next(entries, None)
+                    if entry is None:
+                        break
+                    world, level, stars, level_required, level_excludes, level_only_required, seed = \
+                        _parse_level_entry(entry, required, excludes, only_required)
+                    if seed is None and master_seed is not None:
+                        seed = level_seed(master_seed, world, level, stars)
+                    running.append((world, level, stars, asyncio.ensure_future(self.generate_level(
+                        world, level, stars, level_required, level_excludes, elements_set, fill_set,
+                        config, level_only_required, seed))))
+
+                if not running:
+                    return
+                world, level, stars, task = running.popleft()
+                yield world, level, stars, await task
+        finally:
+            for _, _, _, task in running:
+                task.cancel()
+
+    async def _run(self, job_arguments, key=None):
+        """Generate the bytes of a level in the executor once there is room, storing them in the cache if keyed."""
+        arguments, set_digests = job_arguments
+        loop = asyncio.get_running_loop()
+        async with self._loop_state().pending:
+            try:
+                level_bytes = await loop.run_in_executor(
+                    self.executor, _generate_in_worker, _without_sets(arguments), set_digests)
+            except _UnknownSets:
+                # This worker has not been sent the sets yet, so send them along this once.
+                level_bytes = await loop.run_in_executor(
+                    self.executor, _generate_in_worker, _without_sets(arguments), set_digests, arguments[5:7])
+        if key is not None and self.cache is not None:
+            self.cache.put(key, level_bytes)
+        return level_bytes
+
+    def _forget(self, jobs, key, job):
+        """Stop sharing a job once it is done."""
+        if jobs.get(key) is job:
+            del jobs[key]
+
+    def _loop_state(self):
+        """Return the semaphore and shared jobs of the running event loop, forgetting those of closed loops."""
+        loop = asyncio.get_running_loop()
+        with self._loops_lock:
+            state = self._loops.get(loop)
+            if state is None:
+                for closed_loop in [other for other in self._loops if other.is_closed()]:
+                    del self._loops[closed_loop]
+                state = _LoopState(asyncio.Semaphore(self.max_pending), {})
+                self._loops[loop] = state
+            return state
+
+
+class _LoopState:
+    """The parts of an AsyncLevelGenerator that belong to a single event loop."""
+
+    def __init__(self, pending, jobs):
+        self.pending = pending
+        self.jobs = jobs
+
+
+class _SharedJob:
+    """A generation that any number of requests can wait for, which is cancelled when the last of them is."""
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+    async def wait(self):
+        """Wait for the result, without cancelling it for the other requests if this one is cancelled."""
+        self.waiters += 1
+        try:
+            return await asyncio.shield(self.task)
+        finally:
+            self.waiters -= 1
+            if self.waiters == 0 and not self.task.done():
+                self.task.cancel()
+
+
+class _UnknownSets(Exception):
+    """Raised by a worker that has not been sent the element or fill set of a job yet."""
+
+
+# The custom element and fill sets this process was sent, by digest, see _generate_in_worker.
+# Keeping the lists themselves lets get_catalog find their catalogs again for every job.
+_WORKER_SETS_SIZE = 32
+_worker_sets = OrderedDict()
+
+def _prepare_job(arguments):
+    """Return the key of a level and the digests of its custom element and fill sets, None for the defaults."""
+    elements_set, fill_set = arguments[5:7]
+    set_digests = tuple(None if elements is None else get_catalog(elements).digest
+                        for elements in (elements_set, fill_set))
+    key = level_key(*arguments) if arguments[-1] is not None else None
+    return key, set_digests
+
+def _without_sets(arguments):
+    """Return the arguments of a level with the element and fill set left out, as those are sent by digest."""
+    return arguments[:5] + (None, None) + arguments[7:]
+
+def _generate_in_worker(arguments, set_digests, sets=None):
+    """Generate the bytes of a level in a worker, looking its element and fill sets up by digest."""
+    if sets is not None:
+        for digest, elements in zip(set_digests, sets):
+            if digest is not None:
+                _worker_sets[digest] = elements
+                _worker_sets.move_to_end(digest)
+        while len(_worker_sets) > _WORKER_SETS_SIZE:
+            _worker_sets.popitem(last=False)
+
+    resolved_sets = []
+    for digest in set_digests:
+        if digest is not None and digest not in _worker_sets:
+            raise _UnknownSets()
+        resolved_sets.append(None if digest is None else _worker_sets[digest])
+    return _generate_level_bytes(*arguments[:5], *resolved_sets, *arguments[7:])
+
+
+# The generator used by the module level functions, made when first needed.
+_default_generator = None
+
+async def generate_level_async(
+            world, level, stars=0, required=[], excludes=[],
+            elements_set=None, fill_set=None, config=GeneratorConfig(),
+            only_required=False, seed=None):
+    """Generate a level without blocking the event loop, using a shared AsyncLevelGenerator.
+
+    Takes the same parameters as generate_level, except for rng and telemetry. Make your own
+    AsyncLevelGenerator to choose the executor, limits or cache.
+    """
+    return await _get_default_generator().generate_level(
+        world, level, stars, required, excludes, elements_set, fill_set, config, only_required, seed)
+
+def iter_levels_async(
+            levels, required=[], excludes=[],
+            elements_set=None, fill_set=None, config=GeneratorConfig(),
+            only_required=False, master_seed=None, window=None):
+    """Generate a batch of levels without blocking the event loop, see AsyncLevelGenerator.iter_levels.
+
+    Use it with async for, for instance `async for world, level, stars, grid in iter_levels_async(levels):`.
+    """
+    return _get_default_generator().iter_levels(
+        levels, required, excludes, elements_set, fill_set, config, only_required, master_seed, window)
+
+def _get_default_generator():
+    """Return the shared AsyncLevelGenerator, making it on first use."""
+    global _default_generator
+    if _default_generator is None:
+        _default_generator = AsyncLevelGenerator()
+    return _default_generator
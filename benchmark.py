@@ -0,0 +1,227 @@
+"""Benchmarks for the level generator.
+
+Run `python benchmark.py` to time the import and every scenario and print the results as JSON, or use
+`--output results.json` to save them and `--compare results.json` to compare a later run against them.
+"""
+import argparse
+import dataclasses
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import colors
+import helpers
+import levelgen
+from consts import DESIGNS
+from levelgen import GeneratorConfig, generate_levels
+from sampler import WeightedSampler
+
+# The functions to time, as (module or class, attribute name) pairs. Functions imported
+# into helpers or levelgen by name have to be replaced there as well.
+PROFILED_FUNCTIONS = [
+    (helpers, '_filter_list'),
+    (helpers, '_weighted_roll'),
+    (WeightedSampler, 'sample'),
+    (helpers, '_apply_element'),
+    (helpers, '_apply_fill'),
+    (colors, 'resolve_element_colors'),
+    (helpers, '_color_swap_element'),
+    (helpers, '_color_swap_fill'),
+    (helpers, '_list_to_2D'),
+    ]
+
+
+@dataclasses.dataclass
+class Scenario:
+    """A single benchmark scenario: a batch of levels and the arguments to generate them with."""
+    name: str
+    levels: list
+    kwargs: dict = dataclasses.field(default_factory=dict)
+
+
+def build_scenarios():
+    """Return every benchmark scenario."""
+    campaign = [(world, level) for world in range(1, 6) for level in range(1, 41)]
+
+    # A large custom library made of renamed copies of the shipped designs.
+    large_library = []
+    designs = [design for design in DESIGNS if not design.treat_as_fill]
+    for number in range(1200):
+        design = designs[number % len(designs)]
+        large_library.append(dataclasses.replace(
+            design, name=f'{design.name}{number}',
+            keywords=[*design.keywords, f'set{number % 40}', f'theme{number % 7}']))
+
+    heavy_excludes = ['japan', 'flag', 'locked', 3, 4] + [f'set{number}' for number in range(0, 40, 2)] \
+        + [f'missing{number}' for number in range(30)]
+    heavy_required = ['windmill', 'cloud', 'pinetree', 'diagonalR3', 1, 2, 6]
+
+    return [
+        Scenario('default_8x8', campaign),
+        Scenario('large_field_32x64', campaign[:40], {
+            'config': GeneratorConfig(field_width=32, field_height=64, base_difficulty=200)}),
+        Scenario('endless_20x200', campaign[:20], {
+            'config': GeneratorConfig(field_width=20, field_height=200, base_difficulty=1000, diff_per_level=0)}),
+        Scenario('large_library', campaign, {'elements_set': large_library}),
+        Scenario('large_library_heavy_excludes', campaign, {
+            'elements_set': large_library, 'excludes': heavy_excludes}),
+        Scenario('heavy_excludes_required', campaign, {
+            'excludes': heavy_excludes, 'required': heavy_required}),
+        Scenario('only_required', campaign, {
+            'required': heavy_required, 'only_required': True}),
+        ]
+
+def run_scenario(scenario, repeat=3, master_seed=1234):
+    """Run a scenario and return its results as a dict."""
+    generate = lambda: generate_levels(scenario.levels, master_seed=master_seed, **scenario.kwargs)
+
+    # Levels per second, taken from the fastest of a few clean runs.
+    best_time = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        generate()
+        best_time = min(best_time, time.perf_counter() - start)
+
+    # Per-function timings and peak memory each get their own run, as both slow things down.
+    with _profiled_functions() as function_timings:
+        generate()
+
+    tracemalloc.start()
+    generate()
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'levels': len(scenario.levels),
+        'seconds': best_time,
+        'levels_per_second': len(scenario.levels) / best_time,
+        'peak_memory_bytes': peak_memory,
+        'functions': function_timings,
+        }
+
+def run_benchmarks(scenario_names=None, repeat=3):
+    """Run the (selected) scenarios and return all results, with some information about the environment."""
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'commit': _git_commit(),
+        'import': measure_import_time(),
+        'scenarios': {},
+        }
+    for scenario in build_scenarios():
+        if scenario_names and scenario.name not in scenario_names:
+            continue
+        results['scenarios'][scenario.name] = run_scenario(scenario, repeat)
+    return results
+
+def measure_import_time(repeat=5):
+    """Return the time to import levelgen and to generate the first level in a fresh interpreter, best of repeat."""
+    script = ('import json, time; start = time.perf_counter(); import levelgen; imported = time.perf_counter(); '
+              'levelgen.generate_level(1, 1, seed=1); '
+              'print(json.dumps([imported - start, time.perf_counter() - imported]))')
+    import_seconds = []
+    first_level_seconds = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', script], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        imported, first_level = json.loads(output)
+        import_seconds.append(imported)
+        first_level_seconds.append(first_level)
+
+    return {'import_seconds': min(import_seconds), 'first_level_seconds': min(first_level_seconds)}
+
+def compare_results(baseline, current):
+    """Return a line per scenario and function with the speed-up of current over baseline."""
+    lines = []
+    if 'import' in baseline and 'import' in current:
+        lines.append(f'import: {baseline["import"]["import_seconds"] * 1000:.1f} -> '
+                     f'{current["import"]["import_seconds"] * 1000:.1f} ms')
+    for name, result in current['scenarios'].items():
+        if name not in baseline['scenarios']:
+            continue
+        old = baseline['scenarios'][name]
+        lines.append(f'{name}: {old["levels_per_second"]:.1f} -> {result["levels_per_second"]:.1f} levels/s '
+                     f'({result["levels_per_second"] / old["levels_per_second"]:.2f}x)')
+        for function, timing in result['functions'].items():
+            old_timing = old['functions'].get(function)
+            if old_timing and old_timing['total_seconds'] > 0 and timing['total_seconds'] > 0:
+                lines.append(f'    {function}: {old_timing["total_seconds"] / timing["total_seconds"]:.2f}x')
+    return lines
+
+@contextmanager
+def _profiled_functions():
+    """Replace the profiled functions with timed versions and collect their timings."""
+    timings = {}
+    originals = []
+
+    for owner, name in PROFILED_FUNCTIONS:
+        original = getattr(owner, name)
+        label = name if owner is helpers else f'{owner.__name__}.{name}'
+        timed = _timed(original, timings.setdefault(label, {'calls': 0, 'total_seconds': 0.0}))
+
+        targets = [owner]
+        for module in (helpers, levelgen):
+            if module is not owner and getattr(module, name, None) is original:
+                targets.append(module)
+        for target in targets:
+            originals.append((target, name, original))
+            setattr(target, name, timed)
+
+    try:
+        yield timings
+    finally:
+        for target, name, original in originals:
+            setattr(target, name, original)
+        for timing in timings.values():
+            timing['mean_microseconds'] = (
+                timing['total_seconds'] / timing['calls'] * 1e6 if timing['calls'] else 0.0)
+
+def _timed(function, timing):
+    """Wrap a function so the time spent in it (including anything it calls) is added to timing."""
+    def timed_function(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timing['calls'] += 1
+            timing['total_seconds'] += time.perf_counter() - start
+    return timed_function
+
+def _git_commit():
+    """Return the current git commit, if there is one."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the level generator.')
+    parser.add_argument('--scenario', action='append', help='only run this scenario, can be repeated')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs per scenario')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='compare the results against an earlier JSON file')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.scenario, args.repeat)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            print('\n'.join(compare_results(json.load(baseline_file), results)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
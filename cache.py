@@ -0,0 +1,227 @@
+import dataclasses
+import hashlib
+import os
+from collections import OrderedDict
+
+from catalog import get_catalog
+from helpers import _bytes_to_output
+from levelgen import GENERATION_VERSION, GeneratorConfig, _default_sets, generate_level
+from levelpack import _level_to_bytes
+
+# Levels are keyed by the version of generation, so cached levels from older versions are never returned.
+CACHE_VERSION = GENERATION_VERSION
+
+
+class LevelCache:
+    """A cache in front of generate_level for seeded levels, in memory and optionally on disk.
+
+    Levels are keyed by a SHA-256 hash of everything that goes into generating them: world, level, stars,
+    required, excludes, the contents of the element and fill sets, the GeneratorConfig, only_required and
+    the seed. Editing an element therefore changes the key, so stale levels are never returned, and the
+    disk tier can be shared between processes and kept between runs.
+
+    Levels are stored as one byte per bubble. Every hit returns a new copy in the form the config asks
+    for, so changing a returned level never changes the cache.
+
+    Parameters
+    ----------
+    directory : str or path, optional
+        the directory for the disk tier, which is not used if not provided (default is None)
+    max_entries : int, optional
+        the most levels to keep in memory, least recently used levels are dropped first (default is 4096)
+    max_disk_bytes : int, optional
+        the most bytes of levels to keep on disk, least recently used levels are deleted first (default is 64 MiB)
+    """
+
+    def __init__(self, directory=None, max_entries=4096, max_disk_bytes=64 * 2**20):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._disk_bytes = None
+
+    def generate_level(
+                self, world, level, stars=0, required=[], excludes=[],
+                elements_set=None, fill_set=None, config=GeneratorConfig(),
+                only_required=False, seed=None):
+        """Return a level from the cache, generating and storing it if it is not there yet.
+
+        Takes the same parameters as generate_level. Levels without a seed are different every time,
+        so they are generated without using the cache.
+        """
+        if seed is None:
+            return generate_level(world, level, stars, required, excludes, elements_set, fill_set,
+                                  config, only_required)
+
+        key = level_key(world, level, stars, required, excludes, elements_set, fill_set, config, only_required, seed)
+        level_bytes = self.get(key)
+        if level_bytes is None:
+            level_bytes = _generate_level_bytes(
+                world, level, stars, required, excludes, elements_set, fill_set, config, only_required, seed)
+            self.put(key, level_bytes)
+        return _bytes_to_output(level_bytes, config)
+
+    def key(self, world, level, stars=0, required=[], excludes=[],
+            elements_set=None, fill_set=None, config=GeneratorConfig(), only_required=False, seed=None):
+        """Return the key of a level as a hex string, see level_key."""
+        return level_key(world, level, stars, required, excludes, elements_set, fill_set, config, only_required, seed)
+
+    def get(self, key):
+        """Return the bytes of a level by its key, or None if it is not in the cache."""
+        level_bytes = self._memory.get(key)
+        if level_bytes is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return level_bytes
+
+        if self.directory is not None:
+            level_bytes = self._read(key)
+            if level_bytes is not None:
+                self._remember(key, level_bytes)
+                self.hits += 1
+                self.disk_hits += 1
+                return level_bytes
+
+        self.misses += 1
+        return None
+
+    def put(self, key, level_bytes):
+        """Store the bytes of a level by its key."""
+        level_bytes = bytes(level_bytes)
+        self._remember(key, level_bytes)
+        if self.directory is not None:
+            self._write(key, level_bytes)
+
+    def clear(self):
+        """Empty the cache, including the disk tier."""
+        self._memory.clear()
+        if self.directory is not None:
+            for path, _, _ in self._disk_entries():
+                _remove(path)
+            self._disk_bytes = 0
+
+    def stats(self):
+        """Return the hit and miss counts and the current size of the cache as a dict."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'memory_entries': len(self._memory),
+            'disk_bytes': self._disk_size() if self.directory is not None else 0,
+            }
+
+    def _remember(self, key, level_bytes):
+        """Add a level to the memory tier, dropping the least recently used level if it is full."""
+        self._memory[key] = level_bytes
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _path(self, key):
+        """Return the path of a level on disk, spread over subdirectories to keep them small."""
+        return os.path.join(self.directory, key[:2], f'{key}.level')
+
+    def _read(self, key):
+        """Return the bytes of a level from disk, or None, marking it as recently used."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as level_file:
+                level_bytes = level_file.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return level_bytes
+
+    def _write(self, key, level_bytes):
+        """Write a level to disk and evict old levels if the disk tier got too big; failing to do so is not an error."""
+        path = self._path(key)
+        disk_bytes = self._disk_size()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first, so other processes never see a half written level.
+            temporary_path = f'{path}.{os.getpid()}.tmp'
+            with open(temporary_path, 'wb') as level_file:
+                level_file.write(level_bytes)
+            os.replace(temporary_path, path)
+        except OSError:
+            return
+
+        self._disk_bytes = disk_bytes + len(level_bytes)
+        if self._disk_bytes > self.max_disk_bytes:
+            self._evict()
+
+    def _evict(self):
+        """Delete the least recently used levels from disk until the disk tier is well below its limit."""
+        # Going a bit below the limit means we do not have to scan the directory for every new level.
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_disk_bytes * 0.9:
+                break
+            _remove(path)
+            total -= size
+        self._disk_bytes = total
+
+    def _disk_size(self):
+        """Return the bytes of levels on disk, only scanning the directory the first time."""
+        if self._disk_bytes is None:
+            self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+        return self._disk_bytes
+
+    def _disk_entries(self):
+        """Return the path, size and last use of every level on disk."""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for subdirectory in os.scandir(self.directory):
+            if not subdirectory.is_dir():
+                continue
+            for entry in os.scandir(subdirectory.path):
+                if entry.name.endswith('.level'):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+
+def level_key(world, level, stars=0, required=[], excludes=[],
+              elements_set=None, fill_set=None, config=GeneratorConfig(), only_required=False, seed=None):
+    """Return a stable key for the inputs of a level, the same in every process and run.
+
+    The key is a SHA-256 hash of every input of generate_level that changes the bubbles of the level,
+    including the contents of the element and fill sets, but not the form of the output.
+
+    Returns
+    -------
+    str
+        the key as a hex string
+    """
+    elements_set, fill_set = _default_sets(elements_set, fill_set)
+    bubble_config = dataclasses.replace(config, return_string=False, return_view=False)
+    inputs = (CACHE_VERSION, world, level, stars, list(required), list(excludes),
+              get_catalog(elements_set).digest,
+              get_catalog(fill_set).digest,
+              bubble_config, only_required, seed)
+    return hashlib.sha256(repr(inputs).encode()).hexdigest()
+
+def _generate_level_bytes(world, level, stars, required, excludes, elements_set, fill_set, config, only_required, seed):
+    """Generate a level and return it as one byte per bubble, whatever form the config asks for."""
+    # Generate the level as views, so turning it into bytes copies it just once.
+    generated_level = generate_level(
+        world, level, stars, required, excludes, elements_set, fill_set,
+        dataclasses.replace(config, return_string=False, return_view=True), only_required, seed=seed)
+    return _level_to_bytes(generated_level)
+
+def _remove(path):
+    """Delete a file that another process may already have deleted."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
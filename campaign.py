@@ -0,0 +1,256 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import secrets
+
+from catalog import get_catalog
+from farm import _chunks, _generate_chunk, _run_chunks, _worker_config
+from helpers import _row_offsets
+from levelgen import GENERATION_VERSION, GeneratorConfig, _default_sets, _parse_level_entry
+from levelpack import _jsonl_line, _level_to_bytes, write_level_pack
+
+# Bump this whenever the checkpoint layout changes. Checkpoints are also tied to GENERATION_VERSION,
+# so checkpoints of either an older layout or older generation are never resumed.
+CHECKPOINT_VERSION = 4
+# The columns of a campaign file; any other columns, such as notes, are ignored.
+CAMPAIGN_COLUMNS = ('world', 'level', 'stars', 'required', 'excludes', 'only_required', 'seed')
+
+
+class CampaignError(ValueError):
+    """Raised when a campaign file cannot be read or a checkpoint cannot be resumed."""
+
+
+def read_campaign(path):
+    """Read the levels of a campaign from a CSV or TSV file, for instance exported from a spreadsheet.
+
+    Every row is one level, with a 'world' and 'level' column and optionally 'stars', 'required',
+    'excludes', 'only_required' and 'seed' columns. Required and excludes are separated by spaces,
+    e.g. `windmill 1 2`, where whole numbers are read as colors. Empty cells fall back to the defaults,
+    and any other columns, such as notes, are ignored.
+
+    Parameters
+    ----------
+    path : str or path
+        the campaign file, its extension decides the delimiter (.csv or .tsv)
+
+    Returns
+    -------
+    list
+        a dict per level, in any of the forms accepted by generate_levels
+    """
+    extension = os.path.splitext(str(path))[1].lower()
+    if extension not in ('.csv', '.tsv'):
+        raise CampaignError(f'{path}: unknown campaign format {extension!r}, use .csv or .tsv.')
+    try:
+        with open(path, 'rb') as campaign_file:
+            text = campaign_file.read().decode('utf-8-sig')
+    except UnicodeDecodeError as error:
+        raise CampaignError(f'{path}: {error}') from None
+
+    levels = []
+    reader = csv.DictReader(io.StringIO(text), delimiter='\t' if extension == '.tsv' else ',')
+    try:
+        for line_number, row in enumerate(reader, 2):
+            # Ignore empty cells, so spreadsheets can leave optional columns blank.
+            row = {key.strip(): value.strip() for key, value in row.items()
+                   if key and key.strip() in CAMPAIGN_COLUMNS and value and value.strip()}
+            if row:
+                levels.append(_parse_campaign_row(row, f'{path}: line {line_number}'))
+    except csv.Error as error:
+        raise CampaignError(f'{path}: {error}') from None
+    return levels
+
+def generate_campaign(
+            levels, output, master_seed=None, required=[], excludes=[],
+            elements_set=None, fill_set=None, config=GeneratorConfig(),
+            only_required=False, jobs=1, chunk_size=64, checkpoint_every=1024, restart=False, progress=None):
+    """Generate a campaign straight to a file across multiple processes, resuming where an earlier run stopped.
+
+    Levels are written in the same order as the input while they are generated, so the campaign never
+    has to fit in memory. Progress is saved to a '<output>.checkpoint' file; running the same campaign
+    again after an interruption carries on after the last saved level without generating finished levels
+    again. Every level gets its own seed from the master seed, see level_seed, so the output is exactly
+    the same no matter how many processes are used or how often the run was interrupted.
+    The checkpoint is deleted once the campaign is done.
+
+    JSON Lines output is written to the output file as it goes. Level pack output is collected in a
+    '<output>.partial' file first, as the index can only be written once every level is known.
+
+    Parameters
+    ----------
+    levels : iterable
+        the levels to generate, in any of the forms accepted by generate_levels, such as the output of read_campaign
+    output : str or path
+        the file to write to, its extension decides the format: .jsonl for JSON Lines or .blp for a level pack
+    master_seed : int or str, optional
+        the seed for the whole campaign; a random one is picked if not provided, or the one of the checkpoint
+        when resuming (default is None)
+    required, excludes, elements_set, fill_set, config, only_required : optional
+        see generate_levels
+    jobs : int, optional
+        the number of worker processes, None to use every core (default is 1)
+    chunk_size : int, optional
+        the number of levels to send to a worker at once (default is 64)
+    checkpoint_every : int, optional
+        the number of levels to generate between saving progress (default is 1024)
+    restart : bool, optional
+        a flag used to ignore an existing checkpoint and start over (default is False)
+    progress : callable, optional
+        called with the number of levels done and the total after every chunk (default is None)
+
+    Returns
+    -------
+    int
+        the number of levels in the output
+    """
+    levels = list(levels)
+    output_format = _output_format(output)
+    if output_format == 'pack' and config.return_string:
+        raise ValueError('Levels generated with return_string cannot be written to a level pack.')
+    config = _worker_config(config)
+
+    elements_set, fill_set = _default_sets(elements_set, fill_set)
+    keys = [_parse_level_entry(entry, required, excludes, only_required)[:3] for entry in levels]
+    if output_format == 'pack':
+        # Check this up front rather than when the pack is written, which may be hours later.
+        seen = set()
+        for key in keys:
+            if key in seen:
+                raise ValueError(f'Level {key} is in the campaign more than once.')
+            seen.add(key)
+
+    # Everything that changes the output apart from the master seed, so only the same campaign is resumed.
+    inputs = hashlib.sha256(repr((
+        CHECKPOINT_VERSION, GENERATION_VERSION, output_format, levels, list(required), list(excludes),
+        get_catalog(elements_set).digest, get_catalog(fill_set).digest, config, only_required)).encode()).hexdigest()
+
+    checkpoint_path = f'{output}.checkpoint'
+    data_path = output if output_format == 'jsonl' else f'{output}.partial'
+    checkpoint = None if restart else _read_checkpoint(checkpoint_path)
+    if checkpoint is None:
+        if master_seed is None:
+            master_seed = secrets.randbits(64)
+        checkpoint = {'inputs': inputs, 'master_seed': master_seed, 'levels': 0, 'bytes': 0}
+    elif checkpoint['inputs'] != inputs or master_seed not in (None, checkpoint['master_seed']):
+        raise CampaignError(
+            f'{checkpoint_path} belongs to a different campaign, settings or master seed; restart to start over.')
+
+    with _open_data(data_path, checkpoint) as data_file:
+        _write_checkpoint(checkpoint_path, checkpoint)
+        task = (required, excludes, elements_set, fill_set, config, only_required, checkpoint['master_seed'])
+        generated_chunks = _run_chunks(_generate_chunk, _chunks(levels[checkpoint['levels']:], chunk_size), task, jobs)
+        unsaved = 0
+
+        try:
+            for generated in generated_chunks:
+                done = checkpoint['levels']
+                if output_format == 'jsonl':
+                    data = ''.join(_jsonl_line(*key, generated_level) for key, generated_level in zip(
+                        keys[done:done + len(generated)], generated)).encode()
+                else:
+                    data = b''.join(_level_to_bytes(generated_level) for generated_level in generated)
+                data_file.write(data)
+                checkpoint['levels'] += len(generated)
+                checkpoint['bytes'] += len(data)
+
+                unsaved += len(generated)
+                if unsaved >= checkpoint_every:
+                    _save(data_file, checkpoint_path, checkpoint)
+                    unsaved = 0
+                if progress is not None:
+                    progress(checkpoint['levels'], len(levels))
+        finally:
+            generated_chunks.close()
+            # Whatever stopped us, everything written so far does not have to be generated again.
+            _save(data_file, checkpoint_path, checkpoint)
+
+    if output_format == 'pack':
+        write_level_pack(_read_partial(data_path, keys, config), output, config)
+        os.remove(data_path)
+    os.remove(checkpoint_path)
+    return len(levels)
+
+
+def _parse_campaign_row(row, location):
+    """Turn a row of a campaign file into a batch entry for generate_levels."""
+    entry = {}
+    for column in ('world', 'level', 'stars'):
+        if column in row:
+            entry[column] = _parse_campaign_int(row[column], column, location)
+    if 'world' not in entry or 'level' not in entry:
+        raise CampaignError(f'{location}: every level needs a world and a level.')
+    for column in ('required', 'excludes'):
+        if column in row:
+            entry[column] = [int(item) if item.lstrip('-').isdigit() else item for item in row[column].split()]
+    if 'only_required' in row:
+        entry['only_required'] = row['only_required'].lower() in ('1', 'true', 'yes', 'y')
+    if 'seed' in row:
+        entry['seed'] = int(row['seed']) if row['seed'].lstrip('-').isdigit() else row['seed']
+    return entry
+
+def _parse_campaign_int(value, column, location):
+    """Parse a whole number cell of a campaign file."""
+    try:
+        return int(value)
+    except ValueError:
+        raise CampaignError(f'{location}: {column} must be a whole number, got {value!r}.') from None
+
+def _output_format(output):
+    """Return the format to write a campaign in, decided by the extension of the output file."""
+    extension = os.path.splitext(str(output))[1].lower()
+    if extension == '.jsonl':
+        return 'jsonl'
+    if extension == '.blp':
+        return 'pack'
+    raise ValueError(f'{output}: unknown output format {extension!r}, use .jsonl or .blp.')
+
+def _open_data(data_path, checkpoint):
+    """Open the file levels are written to, cutting off anything written after the checkpoint."""
+    if checkpoint['bytes'] == 0:
+        return open(data_path, 'wb')
+    try:
+        data_file = open(data_path, 'r+b')
+    except FileNotFoundError:
+        raise CampaignError(f'{data_path} is missing, so the checkpoint cannot be resumed; restart to start over.') from None
+    if data_file.seek(0, os.SEEK_END) < checkpoint['bytes']:
+        data_file.close()
+        raise CampaignError(f'{data_path} is shorter than its checkpoint; restart to start over.')
+    # Truncating does not move the position, which is still at the old end of the file.
+    data_file.truncate(checkpoint['bytes'])
+    data_file.seek(checkpoint['bytes'])
+    return data_file
+
+def _save(data_file, checkpoint_path, checkpoint):
+    """Make sure the written levels are on disk, then record them in the checkpoint."""
+    data_file.flush()
+    os.fsync(data_file.fileno())
+    _write_checkpoint(checkpoint_path, checkpoint)
+
+def _read_checkpoint(checkpoint_path):
+    """Return the contents of a checkpoint, or None if there is none."""
+    try:
+        with open(checkpoint_path, 'r', encoding='utf-8') as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        raise CampaignError(f'{checkpoint_path} is not a valid checkpoint; restart to start over.') from None
+    if not isinstance(checkpoint, dict) or set(checkpoint) != {'inputs', 'master_seed', 'levels', 'bytes'}:
+        raise CampaignError(f'{checkpoint_path} is not a valid checkpoint; restart to start over.')
+    return checkpoint
+
+def _write_checkpoint(checkpoint_path, checkpoint):
+    """Write a checkpoint, replacing the previous one in one go so it is never half written."""
+    temporary_path = f'{checkpoint_path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.replace(temporary_path, checkpoint_path)
+
+def _read_partial(data_path, keys, config):
+    """Read the levels of a finished campaign back from its partial file, one at a time."""
+    level_size = _row_offsets(config.field_width, config.field_height)[-1]
+    with open(data_path, 'rb') as data_file:
+        for world, level, stars in keys:
+            yield world, level, stars, data_file.read(level_size)
@@ -0,0 +1,173 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+
+from solver import DifficultySolver
+
+
+@dataclass
+class CatalogEntry:
+    """Precompiled data for a single DesignElement or Fill in an ElementCatalog.
+
+    Parameters
+    ----------
+    element : DesignElement or Fill
+        the element this entry was compiled from
+    bubbles : frozenset
+        every distinct value in the output, both color ints and letter variables
+    keywords : frozenset
+        the keywords of the element
+    """
+    element: object
+    bubbles: frozenset
+    keywords: frozenset
+
+
+class ElementCatalog:
+    """A compiled list of DesignElements or Fills with indexes for fast filtering.
+
+    All of the work that does not depend on the level is done once when the catalog is built:
+    each element's output is scanned, and every keyword, name and bubble value
+    is indexed to the elements containing it. Filtering on a list of excludes then only takes
+    a few set operations, and the results are kept in an LRU cache per distinct set of excludes.
+    The same goes for the DifficultySolver of every filtered list, see solver.
+
+    Note that the catalog does not notice elements being edited in place after it was built;
+    build a new catalog (or use a new list) if you change your elements.
+
+    Parameters
+    ----------
+    elements : list
+        the list of DesignElements or Fills to compile
+    filter_cache_size : int, optional
+        the maximum number of filter results to keep (default = 128)
+    """
+
+    def __init__(self, elements, filter_cache_size=128):
+        self.elements = list(elements)
+        self.entries = []
+        self.by_keyword = {}
+        self.by_name = {}
+        self.by_bubble = {}
+
+        for index, element in enumerate(self.elements):
+            entry = _compile_entry(element)
+            self.entries.append(entry)
+
+            self.by_name.setdefault(element.name, set()).add(index)
+            for keyword in entry.keywords:
+                self.by_keyword.setdefault(keyword, set()).add(index)
+            for bubble in entry.bubbles:
+                self.by_bubble.setdefault(bubble, set()).add(index)
+
+        self._cached_filter = lru_cache(maxsize=filter_cache_size)(self._filter_indexes)
+        self._cached_solver = lru_cache(maxsize=filter_cache_size)(self._build_solver)
+        self._digest = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getstate__(self):
+        # The filter and solver caches cannot be pickled, so they are rebuilt empty when unpickling.
+        state = self.__dict__.copy()
+        state['filter_cache_size'] = self._cached_filter.cache_parameters()['maxsize']
+        del state['_cached_filter']
+        del state['_cached_solver']
+        return state
+
+    def __setstate__(self, state):
+        filter_cache_size = state.pop('filter_cache_size')
+        self.__dict__.update(state)
+        self._cached_filter = lru_cache(maxsize=filter_cache_size)(self._filter_indexes)
+        self._cached_solver = lru_cache(maxsize=filter_cache_size)(self._build_solver)
+
+    @property
+    def digest(self):
+        """A SHA-256 hash of every element in the catalog, which changes whenever any element does."""
+        if self._digest is None:
+            import hashlib
+
+            digest = hashlib.sha256()
+            for element in self.elements:
+                # The repr of an element holds every field that affects generation.
+                digest.update(repr(element).encode())
+                digest.update(b'\n')
+            self._digest = digest.hexdigest()
+        return self._digest
+
+    def filter(self, excludes):
+        """Return the elements that do not match any of the excludes by name, keyword or bubble value."""
+        return [self.elements[index] for index in self._cached_filter(_freeze(excludes))]
+
+    def solver(self, excludes):
+        """Return a DifficultySolver for the elements left over after applying the excludes, kept per set of excludes."""
+        return self._cached_solver(_freeze(excludes))
+
+    def _build_solver(self, frozen_excludes):
+        """Build a DifficultySolver for the elements left over after applying the frozen excludes."""
+        return DifficultySolver([self.elements[index] for index in self._cached_filter(frozen_excludes)])
+
+    def _filter_indexes(self, frozen_excludes):
+        """Return the indexes of the elements left over after applying the frozen excludes."""
+        excluded = set()
+        for entry in frozen_excludes:
+            excluded |= self.by_name.get(entry, set())
+            excluded |= self.by_keyword.get(entry, set())
+            excluded |= self.by_bubble.get(entry, set())
+
+        return tuple(index for index in range(len(self.entries)) if index not in excluded)
+
+
+# Catalogs are cached per list object, so repeatedly filtering the same list reuses the indexes.
+# We hold on to the list itself to make sure its id cannot be reused by a different list.
+_CATALOG_CACHE_SIZE = 32
+_catalogs = OrderedDict()
+
+def get_catalog(elements):
+    """Return the cached ElementCatalog for a list of elements, building it if needed.
+
+    The catalog is rebuilt if elements were added, removed or replaced in the list since it was built.
+    Catalogs are not kept per field width, as filtering and solving do not depend on it.
+
+    Parameters
+    ----------
+    elements : list
+        the list of DesignElements or Fills
+    """
+    key = id(elements)
+    element_ids = tuple(map(id, elements))
+
+    cached = _catalogs.get(key)
+    if cached is not None and cached[1] == element_ids:
+        _catalogs.move_to_end(key)
+        return cached[2]
+
+    catalog = ElementCatalog(elements)
+    _remember_catalog(catalog, elements)
+    return catalog
+
+def _remember_catalog(catalog, elements=None):
+    """Cache a catalog so get_catalog returns it for the list of elements (default is the catalog's own list)."""
+    if elements is None:
+        elements = catalog.elements
+    key = id(elements)
+    _catalogs[key] = (elements, tuple(map(id, elements)), catalog)
+    _catalogs.move_to_end(key)
+    if len(_catalogs) > _CATALOG_CACHE_SIZE:
+        _catalogs.popitem(last=False)
+
+def _compile_entry(element):
+    """Scan the output of a single element."""
+    if len(element.output) != 0 and isinstance(element.output[0], (list, tuple)):
+        bubbles = frozenset(bubble for row in element.output for bubble in row)
+    else: # This is a Fill or a Design Element treated as Fill.
+        bubbles = frozenset(element.output)
+
+    return CatalogEntry(
+        element=element,
+        bubbles=bubbles,
+        keywords=frozenset(element.keywords))
+
+def _freeze(excludes):
+    """Turn a list of excludes into a hashable key."""
+    return frozenset(excludes)
@@ -0,0 +1,178 @@
+"""Command line interface of the level generator, run as `python -m levelgen <command>`.
+
+Commands:
+    generate    generate the levels of a campaign file to JSON Lines or a level pack, resuming interrupted runs
+    update      regenerate only the levels of a campaign file affected by changes to its rows or elements
+    serve       answer JSON level requests over HTTP or stdin/stdout from warm worker processes
+"""
+import argparse
+import json
+import sys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m levelgen', description='Generate levels for bubble shooters.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help='answer JSON level requests from warm worker processes')
+    serve.add_argument('--stdio', action='store_true',
+                       help='read one JSON request per line from stdin and write answers to stdout, instead of HTTP')
+    serve.add_argument('--host', default='127.0.0.1', help='the address to serve HTTP on (default: 127.0.0.1)')
+    serve.add_argument('--port', type=int, default=8765, help='the port to serve HTTP on (default: 8765)')
+    serve.add_argument('--workers', type=int, help='the number of worker processes (default: every core)')
+    serve.add_argument('--library', action='append', default=[], metavar='[NAME=]PATH',
+                       help='load an element library for requests to use by name, can be repeated '
+                            '(default name: the file name without extension)')
+
+    generate = commands.add_parser('generate', help='generate the levels of a campaign file')
+    generate.add_argument('campaign', help='a CSV or TSV file with a world, level and optional stars, required, '
+                                           'excludes, only_required and seed column per level')
+    generate.add_argument('output', help='the file to write, .jsonl for JSON Lines or .blp for a level pack')
+    generate.add_argument('--jobs', '-j', type=int, default=1,
+                          help='the number of worker processes, 0 for every core (default: 1)')
+    generate.add_argument('--seed', help='the master seed of the campaign (default: random, or the one being resumed)')
+    generate.add_argument('--library', metavar='PATH', help='an element library to use instead of the default elements')
+    generate.add_argument('--config', type=json.loads, default={}, metavar='JSON',
+                          help='GeneratorConfig fields as a JSON object, e.g. \'{"use_solver": true}\'')
+    generate.add_argument('--chunk-size', type=int, default=64,
+                          help='the number of levels to send to a worker at once (default: 64)')
+    generate.add_argument('--checkpoint-every', type=int, default=1024,
+                          help='the number of levels to generate between saving progress (default: 1024)')
+    generate.add_argument('--restart', action='store_true',
+                          help='ignore the progress of an earlier run and start over')
+    generate.add_argument('--quiet', '-q', action='store_true', help='do not report progress')
+
+    update = commands.add_parser('update', help='regenerate the levels of a campaign file affected by changes')
+    update.add_argument('campaign', help='a CSV or TSV file of levels, see generate')
+    update.add_argument('output', help='the file to update, .jsonl for JSON Lines or .blp for a level pack')
+    update.add_argument('--jobs', '-j', type=int, default=1,
+                        help='the number of worker processes, 0 for every core (default: 1)')
+    update.add_argument('--seed', help='the master seed of the campaign (default: the one of the last update)')
+    update.add_argument('--library', metavar='PATH', help='an element library to use instead of the default elements')
+    update.add_argument('--config', type=json.loads, default={}, metavar='JSON',
+                        help='GeneratorConfig fields as a JSON object, e.g. \'{"use_solver": true}\'')
+    update.add_argument('--used-only', action='store_true',
+                        help='only regenerate levels that used a changed element, keeping levels whose roll changed')
+    update.add_argument('--dry-run', action='store_true', help='list the levels that would be regenerated and why')
+
+    args = parser.parse_args(argv)
+    if args.command == 'generate':
+        return _generate(args)
+    if args.command == 'update':
+        return _update(args)
+    if args.command == 'serve':
+        return _serve(args)
+
+def _generate(args):
+    """Run the generate command."""
+    import signal
+    import time
+    from campaign import generate_campaign, read_campaign
+    from levelgen import GeneratorConfig
+
+    start = time.perf_counter()
+
+    def report(done, total):
+        elapsed = time.perf_counter() - start
+        print(f'\r{done}/{total} levels, {elapsed:.0f}s', end='', file=sys.stderr, flush=True)
+
+    try:
+        levels = read_campaign(args.campaign)
+        elements_set, fill_set = _load_elements(args.library)
+        config = GeneratorConfig(**args.config)
+
+        # Let a process manager stop the run the same way as Ctrl+C, so the progress is saved either way.
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        written = generate_campaign(
+            levels, args.output, _parse_seed(args.seed), elements_set=elements_set, fill_set=fill_set, config=config,
+            jobs=args.jobs or None, chunk_size=args.chunk_size, checkpoint_every=args.checkpoint_every,
+            restart=args.restart, progress=None if args.quiet else report)
+    except KeyboardInterrupt:
+        print('\nInterrupted, run the same command again to resume.', file=sys.stderr)
+        return 130
+    except (OSError, TypeError, ValueError) as error:
+        # CampaignError and LibraryError are ValueErrors, as are bad config fields.
+        print(f'\nerror: {error}', file=sys.stderr)
+        return 1
+
+    if not args.quiet:
+        print(f'\nWrote {written} levels to {args.output}.', file=sys.stderr)
+    return 0
+
+def _update(args):
+    """Run the update command."""
+    from campaign import read_campaign
+    from incremental import update_campaign
+    from levelgen import GeneratorConfig
+
+    try:
+        levels = read_campaign(args.campaign)
+        elements_set, fill_set = _load_elements(args.library)
+        regenerated = update_campaign(
+            levels, args.output, _parse_seed(args.seed), elements_set=elements_set, fill_set=fill_set,
+            config=GeneratorConfig(**args.config), exact=not args.used_only, processes=args.jobs or None,
+            dry_run=args.dry_run)
+    except (OSError, TypeError, ValueError) as error:
+        print(f'error: {error}', file=sys.stderr)
+        return 1
+
+    if args.dry_run:
+        for (world, level, stars), reason in regenerated.items():
+            print(f'{world}-{level} ({stars} stars): {reason}')
+    print(f'{"Would regenerate" if args.dry_run else "Regenerated"} {len(regenerated)} of {len(levels)} levels.',
+          file=sys.stderr)
+    return 0
+
+def _serve(args):
+    """Run the serve command."""
+    import signal
+    from library import LibraryError
+    from server import LevelServer
+
+    try:
+        level_server = LevelServer(_parse_libraries(args.library), args.workers)
+    except (OSError, LibraryError) as error:
+        print(f'error: {error}', file=sys.stderr)
+        return 1
+
+    # Stop cleanly, printing the stats, when asked to by a process manager as well.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        if args.stdio:
+            level_server.serve_stdio()
+        else:
+            level_server.serve_http(args.host, args.port)
+    finally:
+        level_server.close()
+        print(json.dumps(level_server.stats.summary()), file=sys.stderr)
+    return 0
+
+def _load_elements(path):
+    """Return the designs and fills of a library file, or None for both to use the defaults."""
+    if path is None:
+        return None, None
+    from library import load_library
+    library = load_library(path)
+    return library.designs, library.fills
+
+def _parse_seed(seed):
+    """Turn a seed argument into an int if it is a whole number, leaving other seeds as strings."""
+    if seed is not None and seed.lstrip('-').isdigit():
+        return int(seed)
+    return seed
+
+def _parse_libraries(specs):
+    """Turn NAME=PATH or PATH arguments into a dict of library paths by name."""
+    import os
+    libraries = {}
+    for spec in specs:
+        name, separator, path = spec.partition('=')
+        if not separator:
+            path = spec
+            name = os.path.splitext(os.path.basename(spec))[0]
+        libraries[name] = path
+    return libraries
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+from functools import lru_cache
+
+from consts import VARIABLE_BASE
+from sampler import resolve_rng
+
+# The basic colors that letter variables are swapped for, see the bubble legend in the README.
+BASIC_COLORS = tuple(range(1, 10))
+# Translation table that leaves every byte as it is, to start color tables from.
+_IDENTITY = bytes(range(256))
+
+
+def resolve_element_colors(elements, excluded_colors=frozenset(), rng=None):
+    """Pick the colors for the letter variables of a whole batch of elements at once.
+
+    Every element has its palette worked out once and cached: its allowed_colors, or the basic
+    colors if it has none, without any excluded colors. Each element then draws a color per
+    variable from its palette without replacement, in one pass over the batch, and the result
+    is returned as a translation table that swaps every variable for its color in one go.
+
+    Parameters
+    ----------
+    elements : iterable
+        the DesignElements to pick colors for
+    excluded_colors : frozenset, optional
+        color ints that should not be picked; an element's palette ignores these if that would
+        leave too few colors for its variables (default is empty)
+    rng : random.Random or numpy.random.Generator, optional
+        the random number generator to use, see resolve_rng (default is None)
+
+    Returns
+    -------
+    list
+        a translation table for bytes.translate per element, or None for elements without variables
+    """
+    rng = resolve_rng(rng)
+    draw = rng.random
+    tables = []
+    for element in elements:
+        variable_count = len(element.variables)
+        if variable_count == 0:
+            tables.append(None)
+            continue
+
+        # A partial Fisher-Yates shuffle over a copy of the palette draws without replacement.
+        pool = list(element_palette(element, excluded_colors))
+        table = bytearray(_IDENTITY)
+        for variable_index in range(variable_count):
+            index = int(draw() * len(pool))
+            pool[index], pool[-1] = pool[-1], pool[index]
+            table[VARIABLE_BASE + variable_index] = pool.pop()
+        tables.append(bytes(table))
+    return tables
+
+@lru_cache(maxsize=4096)
+def element_palette(element, excluded_colors=frozenset()):
+    """Return the colors the letter variables of an element are picked from.
+
+    Parameters
+    ----------
+    element : DesignElement
+        the element to return the palette of
+    excluded_colors : frozenset, optional
+        color ints to leave out of the palette, unless that would leave too few colors
+        for the element's variables (default is empty)
+
+    Returns
+    -------
+    tuple
+        the colors to pick from, in order
+
+    Raises
+    ------
+    ValueError
+        if the element has more letter variables than colors to pick from
+    """
+    palette = element.allowed_colors or BASIC_COLORS
+    if len(palette) < len(element.variables):
+        raise ValueError(
+            f'{element.name} has {len(element.variables)} letter variables but only {len(palette)} colors to pick from.')
+
+    filtered_palette = tuple(color for color in palette if color not in excluded_colors)
+    if len(filtered_palette) < len(element.variables):
+        return palette
+    return filtered_palette
+
+def fill_color_table(fill, color_list, required=(), rng=None):
+    """Pick the colors for the letter variables of a fill and return them as a translation table.
+
+    Required color ints are used first, in order, after which colors are drawn from color_list
+    without replacement.
+
+    Parameters
+    ----------
+    fill : Fill or DesignElement
+        the fill to pick colors for
+    color_list : list
+        the colors to draw from, such as the output of available_colors; drawn colors are removed from it
+    required : iterable, optional
+        the requirements of the level, of which only the color ints are used (default is empty)
+    rng : random.Random or numpy.random.Generator, optional
+        the random number generator to use, see resolve_rng (default is None)
+
+    Returns
+    -------
+    bytes or None
+        a translation table for bytes.translate, or None if the fill has no variables
+    """
+    if len(fill.variables) == 0:
+        return None
+    rng = resolve_rng(rng)
+
+    required_colors = [entry for entry in required if isinstance(entry, int)]
+    table = bytearray(_IDENTITY)
+    for variable_index in range(len(fill.variables)):
+        if variable_index < len(required_colors):
+            color = required_colors[variable_index]
+            if color in color_list:
+                color_list.remove(color)
+        else:
+            color = color_list.pop(rng.randint(0, len(color_list) - 1))
+        table[VARIABLE_BASE + variable_index] = color
+    return bytes(table)
+
+def available_colors(grid, min_colors, excluded_colors=frozenset(), rng=None):
+    """Return the basic colors that are not on the grid yet and not excluded.
+
+    If that leaves fewer than min_colors, random basic colors are added until there are enough,
+    avoiding excluded colors unless every basic color is excluded.
+
+    Parameters
+    ----------
+    grid : bytearray
+        the bubbles placed so far, one byte per bubble
+    min_colors : int
+        the minimum number of colors to return
+    excluded_colors : frozenset, optional
+        color ints to leave out (default is empty)
+    rng : random.Random or numpy.random.Generator, optional
+        the random number generator to use, see resolve_rng (default is None)
+
+    Returns
+    -------
+    list
+        the available colors, in order, followed by any padding
+    """
+    # Look for every color on its own, which stops at the first bubble of it rather than going over the whole grid.
+    colors_to_return = [color for color in BASIC_COLORS
+                        if color not in excluded_colors and color not in grid]
+
+    if len(colors_to_return) < min_colors:
+        rng = resolve_rng(rng)
+        padding_colors = [color for color in BASIC_COLORS if color not in excluded_colors] or BASIC_COLORS
+        while len(colors_to_return) < min_colors:
+            colors_to_return.append(padding_colors[rng.randint(0, len(padding_colors) - 1)])
+    return colors_to_return
+
+def excluded_color_set(excludes):
+    """Return the color ints in a list of excludes as a frozenset."""
+    return frozenset(entry for entry in excludes if isinstance(entry, int) and not isinstance(entry, bool))
@@ -1,12 +1,21 @@
+import os
 from dataclasses import dataclass, field
 
-@dataclass
+# Letter variables are stored in the encoded outputs as byte values from here onwards, in order
+# of first appearance, so swapping them for colors is a single bytes.translate.
+# Actual bubbles therefore have to stay below this value.
+VARIABLE_BASE = 128
+
+@dataclass(frozen=True, slots=True)
 class DesignElement:
     """Level Design Element that provides a string that can be loaded onto the list of bubbles.
 
     If treat_as_fill is True, make sure to provide an output that will run from the first bubble.
     If not, provide the output in a 2D list with a list per row. Remember to use leading zeroes in your designs when needed.
 
+    Design elements are frozen and hashable; lists passed in are stored as tuples. The output is also
+    stored encoded as bytes with one byte per bubble, see encoded_rows and variables.
+
     Parameters
     ----------
      name : str
@@ -18,35 +27,66 @@ class DesignElement:
      keywords: list
           a list of strings that can be used to filter out the element from the available elements
      output : list
-          the bubbles of which the design element consists
+          the bubbles of which the design element consists, ints from 0 to 127 or letter variables
      y_min : int, optional
           minimal starting point for the design element, allows you to better position elements (default = 0)
      y_max : int, optional
-          maximum starting point for the design element, allows you to better position elements (default = 0)
+          maximum starting point for the design element, allows you to better position elements; 0 means there is
+          no maximum, otherwise it must not be less than y_min (default = 0)
      treat_as_fill : bool, optional
           a flag used to determine whether to use the apply fill method rather than the apply element method
           if True, make sure to supply a fill as single long list that spans your playing field (default = False)
      allowed_colors: list[int], optional
-          a list of valid choices for when the design uses letter variables. If provided as [], it will pick a random
-          color instead (default = [])
+          a list of valid choices for when the design uses letter variables, ints from 0 to 127. If provided as [],
+          it will pick a random color instead (default = [])
      override : bool, optional
           a flag used to make the element overwrite any existing bubbles (default = False)
+     field_width : int, optional
+          only used if treat_as_fill is True, the width of the field the output is laid out for, see Fill (default = 8)
+     field_height : int, optional
+          only used if treat_as_fill is True, the height of the field the output is laid out for; on other field
+          sizes the design keeps its own rows and is only fitted across the width of the field (default = 8)
+     encoded_rows : tuple[bytes]
+          set automatically, the rows of the output as bytes, with letter variables stored as VARIABLE_BASE
+          plus their index in variables; a single row if the output is not 2D
+     variables : tuple[str]
+          set automatically, the letter variables in the output in order of first appearance
     """
     name: str
     cost: int
     chance_weight: int
-    keywords: list
-    output: list
+    keywords: tuple
+    output: tuple
     y_min: int = 0
     y_max: int = 0
     treat_as_fill: bool = False
-    allowed_colors: list[int] = field(default_factory=list)
+    allowed_colors: tuple = ()
     override: bool = False
+    field_width: int = 8
+    field_height: int = 8
+    encoded_rows: tuple = field(init=False, repr=False, compare=False)
+    variables: tuple = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, 'keywords', tuple(self.keywords))
+        object.__setattr__(self, 'allowed_colors', tuple(self.allowed_colors))
+        # Colors from VARIABLE_BASE onwards are letter variables in the encoded outputs, see _freeze_output.
+        for color in self.allowed_colors:
+            if not isinstance(color, int) or isinstance(color, bool) or not 0 <= color < VARIABLE_BASE:
+                raise ValueError(
+                    f'{self.name}: allowed_colors must be ints from 0 to {VARIABLE_BASE - 1}, got {color!r}.')
+        # A y_max of 0 means there is no maximum, any other y_max below y_min leaves no row to place the element on.
+        if self.y_max != 0 and self.y_min > self.y_max:
+            raise ValueError(f'{self.name}: y_min ({self.y_min}) must not be more than y_max ({self.y_max}).')
+        _freeze_output(self, not self.treat_as_fill)
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Fill:
     """Level Design Fill that is used to fill in the spaces between design elements after generation.
 
+    Fills are frozen and hashable; lists passed in are stored as tuples. The output is also stored
+    encoded as bytes with one byte per bubble, see encoded_rows and variables.
+
     Parameters
     ----------
     name : str 
@@ -56,387 +96,488 @@ class Fill:
     chance_weight : int
         how much this element is weighted in determining which fill to pick
     output : list
-        the bubbles of which the fill consists
+        the bubbles of which the fill consists, ints from 0 to 127 or letter variables
     keywords : list
         a list of strings that can be used to filter out the fill from the available fills
     override : bool, optional 
         a flag used to make the fill overwrite any existing bubbles (default = False)
+    field_width : int, optional
+        the width of the field the output is laid out for; on fields of any other size the fill is
+        tiled or stretched to cover the field, see GeneratorConfig.fill_scaling (default = 8)
+    field_height : int, optional
+        the height of the field the output is laid out for (default = 8)
+    encoded_rows : tuple[bytes]
+        set automatically, the output as a single row of bytes, see DesignElement
+    variables : tuple[str]
+        set automatically, the letter variables in the output in order of first appearance
     """
     name: str
     cost: int
     chance_weight: int
-    output: list
-    keywords: list
+    output: tuple
+    keywords: tuple
     override: bool = False
+    field_width: int = 8
+    field_height: int = 8
+    encoded_rows: tuple = field(init=False, repr=False, compare=False)
+    variables: tuple = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, 'keywords', tuple(self.keywords))
+        _freeze_output(self, False)
+
+
+def _freeze_output(element, is_2d):
+    """Store the output of an element as tuples and set its encoded rows and variables."""
+    if is_2d:
+        rows = tuple(tuple(row) for row in element.output)
+    else:
+        rows = (tuple(element.output),)
+
+    variables = []
+    encoded_rows = []
+    for row in rows:
+        encoded_row = bytearray()
+        for bubble in row:
+            if isinstance(bubble, str):
+                if bubble not in variables:
+                    variables.append(bubble)
+                encoded_row.append(VARIABLE_BASE + variables.index(bubble))
+            elif isinstance(bubble, int) and 0 <= bubble < VARIABLE_BASE:
+                encoded_row.append(bubble)
+            else:
+                raise ValueError(
+                    f'{element.name}: bubbles must be ints from 0 to {VARIABLE_BASE - 1} or letters, got {bubble!r}.')
+        encoded_rows.append(bytes(encoded_row))
+
+    if VARIABLE_BASE + len(variables) > 256:
+        raise ValueError(f'{element.name}: too many letter variables.')
+
+    object.__setattr__(element, 'output', rows if is_2d else rows[0])
+    object.__setattr__(element, 'encoded_rows', tuple(encoded_rows))
+    object.__setattr__(element, 'variables', tuple(variables))
+
+
+# DESIGNS and FILLS are only built when they are first used, so importing this module
+# (or levelgen) does no work beyond defining names. If LEVELGEN_CATALOG_CACHE is set to the path of
+# a file written by write_catalog_cache, they are loaded from there instead while it is up to date.
+_CACHE_ENV_VAR = 'LEVELGEN_CATALOG_CACHE'
+
+def __getattr__(name):
+    if name in ('DESIGNS', 'FILLS'):
+        designs, fills = _load_defaults()
+        globals().update(DESIGNS=designs, FILLS=fills)
+        return globals()[name]
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+def write_catalog_cache(path):
+    """Write the default DESIGNS and FILLS to a cache file that can be loaded through LEVELGEN_CATALOG_CACHE.
+
+    Parameters
+    ----------
+    path : str or path
+        the file to write the cache to
+    """
+    import pickle
+
+    with open(path, 'wb') as cache_file:
+        pickle.dump((_source_digest(), _build_designs(), _build_fills()), cache_file, pickle.HIGHEST_PROTOCOL)
+
+def _load_defaults():
+    """Return the default designs and fills, from the cache file if there is a valid one."""
+    cache_path = os.environ.get(_CACHE_ENV_VAR)
+    if cache_path:
+        import pickle
+
+        try:
+            with open(cache_path, 'rb') as cache_file:
+                digest, designs, fills = pickle.load(cache_file)
+            # Only use the cache if it was written from this exact version of this file.
+            if digest == _source_digest():
+                return designs, fills
+        except (OSError, pickle.UnpicklingError, ValueError, EOFError):
+            pass
+
+    return _build_designs(), _build_fills()
+
+def _source_digest():
+    """Return a digest of this file, used to tell whether a cache file is out of date."""
+    import hashlib
 
+    with open(__file__, 'rb') as source_file:
+        return hashlib.blake2b(source_file.read(), digest_size=16).digest()
 
-DESIGNS = [ # These are based on default field width and height
-     DesignElement(name = 'torii', cost = 20, chance_weight = 1, treat_as_fill = True,
-          keywords = ['fill', 'japan'],
-          output = [
-               0, 0, 0, 0, 0, 0, 0, 0,
-               0, 0, 0, 0, 0, 0, 0,
-               2, 0, 0, 0, 0, 0, 0, 2, 
-               2, 2, 2, 2, 2, 2, 2, 
-               0, 0, 2, 0, 0, 2, 0, 0, 
-               0, 2, 2, 2, 2, 2, 0, 
-               0, 2, 0, 0, 0, 0 ,2, 0, 
-               2, 0, 0, 0, 0, 0, 2,
-               ]),
-     DesignElement(name = 'fireworks', cost = 15, chance_weight = 3, y_max = 1,
-          allowed_colors=[21, 22, 23, 24, 25, 26, 27, 28, 29], keywords = ['locked'],
-          output = [
-               [0, 'A', 'A'],
-               ['A', 97, 'A'],
-               ]),
-     DesignElement(name = 'cloud', cost = 10, chance_weight = 5, y_max = 1,
-          keywords = [],
-          output = [
-               [0, 7, 7],
-               [7, 7, 7],
-               ]),
-     DesignElement(name = 'cloudJP', cost = 10, chance_weight = 5, y_max = 1,
-          keywords = ['japan'],
-          output = [
-               [7, 7, 7, 7, 0],
-               [0, 0, 7, 0, 0],
-               [0, 7, 7, 7, 7],
-               ]),
-     DesignElement(name = 'cherrytree', cost = 30, chance_weight = 1,
-          keywords = ['japan'],
-          output = [
-               [0, 5, 5],
-               [5, 5, 5],
-               [5, 1, 1, 0],
-               [0, 1, 5, 0],
-               [0, 1, 1, 0, 0],
-               [0, 1, 0, 0, 0],
-               ]),
-     DesignElement(name = 'pinetree', cost = 30, chance_weight = 1,
-          keywords = [],
-          output = [
-               [0, 0, 9],
-               [9, 9],
-               [9, 9, 9],
-               [9, 9, 9, 9],
-               [0, 0, 1, 0, 0],
-               [1, 1, 0, 0],
-               ]),
-     DesignElement(name = 'tree', cost = 30, chance_weight = 1,
-          keywords = [],
-          output = [
-               [0, 9, 9],
-               [9, 9, 9],
-               [9, 1, 9, 9],
-               [0, 1, 9, 0],
-               [1, 1, 0, 0],
-               [1, 0, 0, 0],
-               [1, 1, 0, 0, 0],
-               ]),
-     DesignElement(name = 'mountain', cost = 60, chance_weight = 1, treat_as_fill = True,
-          keywords = ['fill', 'japan'],
-          output = [
-               0, 0, 0, 2, 2, 0, 0, 0,
-               0, 0, 2, 7, 2, 0, 0,
-               0, 0, 0, 7, 7, 0, 0, 0, 
-               0, 0, 8, 7, 8, 0, 0, 
-               0, 0, 8, 8, 8, 8, 0, 0, 
-               0, 8, 8, 8, 8, 8, 0, 
-               0, 8, 8, 8, 8, 8 ,8, 0, 
-               8, 8, 8, 8, 8, 8, 8,
-               ]),
-     DesignElement(name = 'bridge', cost = 20, chance_weight = 1, treat_as_fill = True,
-          keywords = ['fill'],
-          output = [
-               0, 0, 0, 0, 0, 0, 0, 0,
-               0, 0, 0, 0, 0, 0, 0,
-               0, 0, 0, 0, 0, 0, 0, 0, 
-               0, 0, 0, 0, 0, 0, 0, 
-               0, 7, 0, 0, 0, 0, 7, 0, 
-               8, 8, 8, 8, 8, 8, 8, 
-               7, 7, 0, 0, 0, 0, 7, 7, 
-               7, 0, 0, 0, 0, 0, 7,
-               ]),
-     DesignElement(name = 'windmill', cost = 40, chance_weight = 1,
-          keywords = ['ned'],
-          output = [
-               [7, 0, 0, 7],
-               [7, 1, 7, 0],
-               [3, 3, 0, 0],
-               [7, 1, 7, 0, 0],
-               [7, 1, 1, 7, 0, 0],
-               ]), 
-     DesignElement(name = 'triangle_down_large', cost = 10, chance_weight = 5,
-          keywords = [],
-          output = [
-               ['A', 'A', 'A'],
-               ['A', 'A', 0],
-               ['A', 0, 0],
-               ]),
-     DesignElement(name = 'triangle_down_small', cost = 5, chance_weight = 5,
-          keywords = [],
-          output = [
-               ['A', 'A'],
-               ['A', 0],
-               ]),
-     DesignElement(name = 'triangle_up_large', cost = 10, chance_weight = 5,
-          keywords = [],
-          output = [
-               [0, 0, 'A'],
-               ['A', 'A'],
-               ['A', 'A', 'A'],
-               ]),
-     DesignElement(name = 'triangle_up_small', cost = 5, chance_weight = 5,
-          keywords = [],
-          output = [
-               [0, 'A'],
-               ['A', 'A'],
-               ]),
-     DesignElement(name = 'diamond_small', cost = 5, chance_weight = 5,
-          keywords = [],
-          output = [
-               [0, 'A'],
-               ['A', 'A'],
-               ['A', 0],
-               ]),
-     DesignElement(name = 'diamond_large', cost = 5, chance_weight = 5,
-          keywords = [],
-          output = [
-               [0, 'A'],
-               ['A', 'A'],
-               ['A', 'A', 'A'],
-               ['A', 'A', 0],
-               ['A', 0, 0],
-               ]),
-     DesignElement(name = 'circle', cost = 5, chance_weight = 5,
-          keywords = [],
-          output = [
-               [0, 'A', 'A'],
-               ['A', 'A', 'A'],
-               ['A', 'A', 0],
-               ]),
-]
+def _build_designs():
+    """Return a new list of the default design elements."""
+    return [ # These are based on default field width and height
+         DesignElement(name = 'torii', cost = 20, chance_weight = 1, treat_as_fill = True,
+              keywords = ['fill', 'japan'],
+              output = [
+                   0, 0, 0, 0, 0, 0, 0, 0,
+                   0, 0, 0, 0, 0, 0, 0,
+                   2, 0, 0, 0, 0, 0, 0, 2, 
+                   2, 2, 2, 2, 2, 2, 2, 
+                   0, 0, 2, 0, 0, 2, 0, 0, 
+                   0, 2, 2, 2, 2, 2, 0, 
+                   0, 2, 0, 0, 0, 0 ,2, 0, 
+                   2, 0, 0, 0, 0, 0, 2,
+                   ]),
+         DesignElement(name = 'fireworks', cost = 15, chance_weight = 3, y_max = 1,
+              allowed_colors=[21, 22, 23, 24, 25, 26, 27, 28, 29], keywords = ['locked'],
+              output = [
+                   [0, 'A', 'A'],
+                   ['A', 97, 'A'],
+                   ]),
+         DesignElement(name = 'cloud', cost = 10, chance_weight = 5, y_max = 1,
+              keywords = [],
+              output = [
+                   [0, 7, 7],
+                   [7, 7, 7],
+                   ]),
+         DesignElement(name = 'cloudJP', cost = 10, chance_weight = 5, y_max = 1,
+              keywords = ['japan'],
+              output = [
+                   [7, 7, 7, 7, 0],
+                   [0, 0, 7, 0, 0],
+                   [0, 7, 7, 7, 7],
+                   ]),
+         DesignElement(name = 'cherrytree', cost = 30, chance_weight = 1,
+              keywords = ['japan'],
+              output = [
+                   [0, 5, 5],
+                   [5, 5, 5],
+                   [5, 1, 1, 0],
+                   [0, 1, 5, 0],
+                   [0, 1, 1, 0, 0],
+                   [0, 1, 0, 0, 0],
+                   ]),
+         DesignElement(name = 'pinetree', cost = 30, chance_weight = 1,
+              keywords = [],
+              output = [
+                   [0, 0, 9],
+                   [9, 9],
+                   [9, 9, 9],
+                   [9, 9, 9, 9],
+                   [0, 0, 1, 0, 0],
+                   [1, 1, 0, 0],
+                   ]),
+         DesignElement(name = 'tree', cost = 30, chance_weight = 1,
+              keywords = [],
+              output = [
+                   [0, 9, 9],
+                   [9, 9, 9],
+                   [9, 1, 9, 9],
+                   [0, 1, 9, 0],
+                   [1, 1, 0, 0],
+                   [1, 0, 0, 0],
+                   [1, 1, 0, 0, 0],
+                   ]),
+         DesignElement(name = 'mountain', cost = 60, chance_weight = 1, treat_as_fill = True,
+              keywords = ['fill', 'japan'],
+              output = [
+                   0, 0, 0, 2, 2, 0, 0, 0,
+                   0, 0, 2, 7, 2, 0, 0,
+                   0, 0, 0, 7, 7, 0, 0, 0, 
+                   0, 0, 8, 7, 8, 0, 0, 
+                   0, 0, 8, 8, 8, 8, 0, 0, 
+                   0, 8, 8, 8, 8, 8, 0, 
+                   0, 8, 8, 8, 8, 8 ,8, 0, 
+                   8, 8, 8, 8, 8, 8, 8,
+                   ]),
+         DesignElement(name = 'bridge', cost = 20, chance_weight = 1, treat_as_fill = True,
+              keywords = ['fill'],
+              output = [
+                   0, 0, 0, 0, 0, 0, 0, 0,
+                   0, 0, 0, 0, 0, 0, 0,
+                   0, 0, 0, 0, 0, 0, 0, 0, 
+                   0, 0, 0, 0, 0, 0, 0, 
+                   0, 7, 0, 0, 0, 0, 7, 0, 
+                   8, 8, 8, 8, 8, 8, 8, 
+                   7, 7, 0, 0, 0, 0, 7, 7, 
+                   7, 0, 0, 0, 0, 0, 7,
+                   ]),
+         DesignElement(name = 'windmill', cost = 40, chance_weight = 1,
+              keywords = ['ned'],
+              output = [
+                   [7, 0, 0, 7],
+                   [7, 1, 7, 0],
+                   [3, 3, 0, 0],
+                   [7, 1, 7, 0, 0],
+                   [7, 1, 1, 7, 0, 0],
+                   ]), 
+         DesignElement(name = 'triangle_down_large', cost = 10, chance_weight = 5,
+              keywords = [],
+              output = [
+                   ['A', 'A', 'A'],
+                   ['A', 'A', 0],
+                   ['A', 0, 0],
+                   ]),
+         DesignElement(name = 'triangle_down_small', cost = 5, chance_weight = 5,
+              keywords = [],
+              output = [
+                   ['A', 'A'],
+                   ['A', 0],
+                   ]),
+         DesignElement(name = 'triangle_up_large', cost = 10, chance_weight = 5,
+              keywords = [],
+              output = [
+                   [0, 0, 'A'],
+                   ['A', 'A'],
+                   ['A', 'A', 'A'],
+                   ]),
+         DesignElement(name = 'triangle_up_small', cost = 5, chance_weight = 5,
+              keywords = [],
+              output = [
+                   [0, 'A'],
+                   ['A', 'A'],
+                   ]),
+         DesignElement(name = 'diamond_small', cost = 5, chance_weight = 5,
+              keywords = [],
+              output = [
+                   [0, 'A'],
+                   ['A', 'A'],
+                   ['A', 0],
+                   ]),
+         DesignElement(name = 'diamond_large', cost = 5, chance_weight = 5,
+              keywords = [],
+              output = [
+                   [0, 'A'],
+                   ['A', 'A'],
+                   ['A', 'A', 'A'],
+                   ['A', 'A', 0],
+                   ['A', 0, 0],
+                   ]),
+         DesignElement(name = 'circle', cost = 5, chance_weight = 5,
+              keywords = [],
+              output = [
+                   [0, 'A', 'A'],
+                   ['A', 'A', 'A'],
+                   ['A', 'A', 0],
+                   ]),
+    ]
 
-FILLS = [   # These are based on default field width and height
-     Fill(name = 'ireland', cost = 10, chance_weight = 1, 
-          keywords = ['flag', 'ire'],
-          output = [
-               9, 9, 7, 7, 7, 7, 3, 3,
-               9, 9, 7, 7, 7, 3, 3,
-               9, 9, 7, 7, 7, 7, 3, 3,
-               9, 9, 7, 7, 7, 3, 3,
-               9, 9, 7, 7, 7, 7, 3, 3,
-               9, 9, 7, 7, 7, 3, 3,
-               9, 9, 7, 7, 7, 7, 3, 3,
-               ]),
-     Fill(name = 'netherlands', cost = 10, chance_weight = 1, 
-          keywords = ['flag', 'ned'],
-          output = [
-               2, 2, 2, 2, 2, 2, 2, 2,
-               2, 2, 2, 2, 2, 2, 2,
-               7, 7, 7, 7, 7, 7, 7, 7,
-               7, 7, 7, 7, 7, 7, 7,
-               6, 6, 6, 6, 6, 6, 6, 6,
-               6, 6, 6, 6, 6, 6, 6,
-               0, 0, 0, 0, 0, 0, 0, 0,
-               ]),
-     Fill(name = 'japan', cost = 10, chance_weight = 1, 
-          keywords = ['flag', 'japan'],
-          output = [
-               7, 7, 7, 7, 7, 7, 7, 7,
-               7, 7, 7, 7, 7, 7, 7,
-               7, 7, 7, 2, 2, 7, 7, 7,
-               7, 7, 2, 2, 2, 7, 7,
-               7, 7, 7, 2, 2, 7, 7, 7,
-               7, 7, 7, 7, 7, 7, 7,
-               7, 7, 7, 7, 7, 7, 7, 7,
-               ]),
-     Fill(name = 'ustates', cost = 10, chance_weight = 1, 
-          keywords = ['flag', 'usa'],
-          output = [
-               7, 6, 6, 2, 2, 2, 2, 2,
-               6, 2, 6, 7, 7, 7, 7,
-               6, 6, 6, 2, 2, 2, 2, 2,
-               7, 7, 7, 7, 7, 7, 7,
-               2, 2, 2, 2, 2, 2, 2, 2,
-               0, 0, 0, 0, 0, 0, 0,
-               0, 0, 0, 0, 0, 0, 0, 0,
-               ]),
-     Fill(name = 'australia', cost = 10, chance_weight = 1, 
-          keywords = ['flag', 'aus'],
-          output = [
-               2, 6, 2, 6, 6, 6, 6, 6,
-               2, 2, 6, 6, 7, 6, 6,
-               2, 6, 2, 6, 6, 6, 7, 6,
-               6, 6, 6, 7, 6, 7, 6,
-               6, 7, 7, 6, 6, 6, 6, 6,
-               6, 7, 6, 6, 7, 6, 6,
-               6, 6, 6, 6, 6, 6, 6, 6,
-               ]),
-     Fill(name = 'skyground', cost = 10, chance_weight = 4, 
-          keywords = ['day', 'night'],
-          output = [
-               6, 6, 6, 6, 6, 6, 6, 6,
-               6, 6, 6, 6, 6, 6, 6,
-               6, 6, 6, 6, 6, 6, 6, 6,
-               1, 1, 1, 1, 1, 1, 1,
-               8, 8, 8, 8, 8, 8, 8, 8,
-               0, 0, 0, 0, 0, 0, 0,
-               0, 0, 0, 0, 0, 0, 0, 0,
-               ]),
-     Fill(name = 'skygroundDUSK', cost = 10, chance_weight = 4, 
-          keywords = ['dusk'],
-          output = [
-               3, 3, 3, 3, 3, 3, 3, 3,
-               3, 3, 3, 3, 3, 3, 3,
-               3, 3, 3, 3, 3, 3, 3, 3,
-               1, 1, 1, 1, 1, 1, 1,
-               8, 8, 8, 8, 8, 8, 8, 8,
-               0, 0, 0, 0, 0, 0, 0,
-               0, 0, 0, 0, 0, 0, 0, 0,
-               ]),
-     Fill(name = 'city', cost = 30, chance_weight = 4, 
-          keywords = [],
-          output = [
-               6, 6, 6, 6, 6, 6, 6, 6,
-               6, 6, 6, 6, 6, 6, 6,
-               6, 8, 6, 6, 6, 6, 8, 8,
-               8, 8, 6, 8, 6, 8, 8,
-               8, 8, 0, 8, 0, 0, 8, 8,
-               8, 8, 0, 8, 0, 8, 8,
-               0, 0, 0, 0, 0, 0, 0, 0,
-               ]),
-     Fill(name = 'frame', cost = 40, chance_weight = 4, override = True, 
-          keywords = ['museum'],
-          output = [
-               1, 1, 1, 8, 8, 1, 1, 1,
-               1, 0, 0, 0, 0, 0, 1,
-               1, 0, 0, 0, 0, 0, 0, 1,
-               8, 0, 0, 0, 0, 0, 8,
-               8, 0, 0, 0, 0, 0, 0, 8,
-               1, 0, 0, 0, 0, 0, 1,
-               1, 0, 0, 0, 0, 0, 0, 1,
-               1, 1, 8, 8, 8, 1, 1,
-               ]),
-     # Name goes 'diagonal[Direction (L/R)][number of colors]'
-     Fill(name = 'diagonalR2', cost = 30, chance_weight = 4, 
-          keywords = ['diagonal'],
-          output = [
-               'A', 'B', 'A', 'B', 'A', 'B', 'A', 'B',
-               'A', 'B', 'A', 'B', 'A', 'B', 'A',
-               'B', 'A', 'B', 'A', 'B', 'A', 'B', 'A',
-               'B', 'A', 'B', 'A', 'B', 'A', 'B',
-               'A', 'B', 'A', 'B', 'A', 'B', 'A', 'B',
-               'A', 'B', 'A', 'B', 'A', 'B', 'A',
-               'B', 'A', 'B', 'A', 'B', 'A', 'B', 'A',
-               'B', 'A', 'B', 'A', 'B', 'A', 'B',
-               ]),
-     Fill(name = 'diagonalR3', cost = 30, chance_weight = 4,
-          keywords = ['diagonal'],
-          output = [
-               'A', 'B', 'C', 'A', 'B', 'C', 'A', 'B',
-               'A', 'B', 'C', 'A', 'B', 'C', 'A',
-               'C', 'A', 'B', 'C', 'A', 'B', 'C', 'A',
-               'C', 'A', 'B', 'C', 'A', 'B', 'C',
-               'B', 'C', 'A', 'B', 'C', 'A', 'B', 'C',
-               'B', 'C', 'A', 'B', 'C', 'A', 'B',
-               'A', 'B', 'C', 'A', 'B', 'C', 'A', 'B',
-               'A', 'B', 'C', 'A', 'B', 'C', 'A',
-               ]),
-     Fill(name = 'diagonalR4', cost = 30, chance_weight = 4, 
-          keywords = ['diagonal'],
-          output = [
-               'A', 'B', 'C', 'D', 'A', 'B', 'C', 'D',
-               'A', 'B', 'C', 'D', 'A', 'B', 'C',
-               'D', 'A', 'B', 'C', 'D', 'A', 'B', 'C',
-               'D', 'A', 'B', 'C', 'D', 'A', 'B',
-               'C', 'D', 'A', 'B', 'C', 'D', 'A', 'B',
-               'C', 'D', 'A', 'B', 'C', 'D', 'A',
-               'B', 'C', 'D', 'A', 'B', 'C', 'D', 'A',
-               'B', 'C', 'D', 'A', 'B', 'C', 'D',
-               ]),
-     Fill(name = 'diagonalL2', cost = 30, chance_weight = 4,
-          keywords = ['diagonal'],
-          output = [
-               'B', 'A', 'B', 'A', 'B', 'A', 'B', 'A',
-               'A', 'B', 'A', 'B', 'A', 'B', 'A',
-               'A', 'B', 'A', 'B', 'A', 'B', 'A', 'B',
-               'B', 'A', 'B', 'A', 'B', 'A', 'B',
-               'B', 'A', 'B', 'A', 'B', 'A', 'B', 'A',
-               'A', 'B', 'A', 'B', 'A', 'B', 'A',
-               'A', 'B', 'A', 'B', 'A', 'B', 'A', 'B',
-               'B', 'A', 'B', 'A', 'B', 'A', 'B',
-               ]),
-     Fill(name = 'diagonalL3', cost = 30, chance_weight = 4,
-          keywords = ['diagonal'],
-          output = [
-               'B', 'A', 'C', 'B', 'A', 'C', 'B', 'A',
-               'A', 'C', 'B', 'A', 'C', 'B', 'A',
-               'A', 'C', 'B', 'A', 'C', 'B', 'A', 'C',
-               'C', 'B', 'A', 'C', 'B', 'A', 'C',
-               'C', 'B', 'A', 'C', 'B', 'A', 'C', 'B',
-               'B', 'A', 'C', 'B', 'A', 'C', 'B',
-               'B', 'A', 'C', 'B', 'A', 'C', 'B', 'A',
-               'A', 'C', 'B', 'A', 'C', 'B', 'A',
-               ]),
-     Fill(name = 'diagonalL4', cost = 30, chance_weight = 4,
-          keywords = ['diagonal'],
-          output = [
-               'D', 'C', 'B', 'A', 'D', 'C', 'B', 'A',
-               'C', 'B', 'A', 'D', 'C', 'B', 'A',
-               'C', 'B', 'A', 'D', 'C', 'B', 'A', 'D',
-               'B', 'A', 'D', 'C', 'B', 'A', 'D',
-               'B', 'A', 'D', 'C', 'B', 'A', 'D', 'C',
-               'A', 'D', 'C', 'B', 'A', 'D', 'C',
-               'A', 'D', 'C', 'B', 'A', 'D', 'C', 'B',
-               'D', 'C', 'B', 'A', 'D', 'C', 'B',
-               ]),
-     Fill(name = 'columns2narrow', cost = 30, chance_weight = 4,
-          keywords = ['column'],
-          output = [
-               'A', 'B', 'A', 'B', 'A', 'B', 'A', 'B',
-               'A', 'B', 'A', 'B', 'A', 'B', 'A',
-               'A', 'B', 'A', 'B', 'A', 'B', 'A', 'B',
-               'A', 'B', 'A', 'B', 'A', 'B', 'A',
-               'A', 'B', 'A', 'B', 'A', 'B', 'A', 'B',
-               'A', 'B', 'A', 'B', 'A', 'B', 'A',
-               'A', 'B', 'A', 'B', 'A', 'B', 'A', 'B',
-               'A', 'B', 'A', 'B', 'A', 'B', 'A',
-               ]),
-     Fill(name = 'columns2broad', cost = 30, chance_weight = 4,
-          keywords = ['column'],
-          output = [
-               'A', 'A', 'B', 'B', 'A', 'A', 'B', 'B',
-               'A', 'A', 'B', 'B', 'A', 'A', 'B',
-               'A', 'A', 'B', 'B', 'A', 'A', 'B', 'B',
-               'A', 'A', 'B', 'B', 'A', 'A', 'B',
-               'A', 'A', 'B', 'B', 'A', 'A', 'B', 'B',
-               'A', 'A', 'B', 'B', 'A', 'A', 'B',
-               'A', 'A', 'B', 'B', 'A', 'A', 'B', 'B',
-               'A', 'A', 'B', 'B', 'A', 'A', 'B',
-               ]),
-     Fill(name = 'columns3', cost = 30, chance_weight = 4,
-          keywords = ['column'],
-          output = [
-               'A', 'B', 'C', 'A', 'B', 'C', 'A', 'B',
-               'A', 'B', 'C', 'A', 'B', 'C', 'A',
-               'A', 'B', 'C', 'A', 'B', 'C', 'A', 'B',
-               'A', 'B', 'C', 'A', 'B', 'C', 'A',
-               'A', 'B', 'C', 'A', 'B', 'C', 'A', 'B',
-               'A', 'B', 'C', 'A', 'B', 'C', 'A',
-               'A', 'B', 'C', 'A', 'B', 'C', 'A', 'B',
-               'A', 'B', 'C', 'A', 'B', 'C', 'A',
-               ]),
-     Fill(name = 'columns4', cost = 30, chance_weight = 4,
-          keywords = ['column'],
-          output = [
-               'A', 'B', 'C', 'D', 'A', 'B', 'C', 'D',
-               'A', 'B', 'C', 'D', 'A', 'B', 'C',
-               'A', 'B', 'C', 'D', 'A', 'B', 'C', 'D',
-               'A', 'B', 'C', 'D', 'A', 'B', 'C',
-               'A', 'B', 'C', 'D', 'A', 'B', 'C', 'D',
-               'A', 'B', 'C', 'D', 'A', 'B', 'C',
-               'A', 'B', 'C', 'D', 'A', 'B', 'C', 'D',
-               'A', 'B', 'C', 'D', 'A', 'B', 'C',
-               ]),
-]
\ No newline at end of file
+def _build_fills():
+    """Return a new list of the default fills."""
+    return [   # These are based on default field width and height
+         Fill(name = 'ireland', cost = 10, chance_weight = 1, 
+              keywords = ['flag', 'ire'],
+              output = [
+                   9, 9, 7, 7, 7, 7, 3, 3,
+                   9, 9, 7, 7, 7, 3, 3,
+                   9, 9, 7, 7, 7, 7, 3, 3,
+                   9, 9, 7, 7, 7, 3, 3,
+                   9, 9, 7, 7, 7, 7, 3, 3,
+                   9, 9, 7, 7, 7, 3, 3,
+                   9, 9, 7, 7, 7, 7, 3, 3,
+                   ]),
+         Fill(name = 'netherlands', cost = 10, chance_weight = 1, 
+              keywords = ['flag', 'ned'],
+              output = [
+                   2, 2, 2, 2, 2, 2, 2, 2,
+                   2, 2, 2, 2, 2, 2, 2,
+                   7, 7, 7, 7, 7, 7, 7, 7,
+                   7, 7, 7, 7, 7, 7, 7,
+                   6, 6, 6, 6, 6, 6, 6, 6,
+                   6, 6, 6, 6, 6, 6, 6,
+                   0, 0, 0, 0, 0, 0, 0, 0,
+                   ]),
+         Fill(name = 'japan', cost = 10, chance_weight = 1, 
+              keywords = ['flag', 'japan'],
+              output = [
+                   7, 7, 7, 7, 7, 7, 7, 7,
+                   7, 7, 7, 7, 7, 7, 7,
+                   7, 7, 7, 2, 2, 7, 7, 7,
+                   7, 7, 2, 2, 2, 7, 7,
+                   7, 7, 7, 2, 2, 7, 7, 7,
+                   7, 7, 7, 7, 7, 7, 7,
+                   7, 7, 7, 7, 7, 7, 7, 7,
+                   ]),
+         Fill(name = 'ustates', cost = 10, chance_weight = 1, 
+              keywords = ['flag', 'usa'],
+              output = [
+                   7, 6, 6, 2, 2, 2, 2, 2,
+                   6, 2, 6, 7, 7, 7, 7,
+                   6, 6, 6, 2, 2, 2, 2, 2,
+                   7, 7, 7, 7, 7, 7, 7,
+                   2, 2, 2, 2, 2, 2, 2, 2,
+                   0, 0, 0, 0, 0, 0, 0,
+                   0, 0, 0, 0, 0, 0, 0, 0,
+                   ]),
+         Fill(name = 'australia', cost = 10, chance_weight = 1, 
+              keywords = ['flag', 'aus'],
+              output = [
+                   2, 6, 2, 6, 6, 6, 6, 6,
+                   2, 2, 6, 6, 7, 6, 6,
+                   2, 6, 2, 6, 6, 6, 7, 6,
+                   6, 6, 6, 7, 6, 7, 6,
+                   6, 7, 7, 6, 6, 6, 6, 6,
+                   6, 7, 6, 6, 7, 6, 6,
+                   6, 6, 6, 6, 6, 6, 6, 6,
+                   ]),
+         Fill(name = 'skyground', cost = 10, chance_weight = 4, 
+              keywords = ['day', 'night'],
+              output = [
+                   6, 6, 6, 6, 6, 6, 6, 6,
+                   6, 6, 6, 6, 6, 6, 6,
+                   6, 6, 6, 6, 6, 6, 6, 6,
+                   1, 1, 1, 1, 1, 1, 1,
+                   8, 8, 8, 8, 8, 8, 8, 8,
+                   0, 0, 0, 0, 0, 0, 0,
+                   0, 0, 0, 0, 0, 0, 0, 0,
+                   ]),
+         Fill(name = 'skygroundDUSK', cost = 10, chance_weight = 4, 
+              keywords = ['dusk'],
+              output = [
+                   3, 3, 3, 3, 3, 3, 3, 3,
+                   3, 3, 3, 3, 3, 3, 3,
+                   3, 3, 3, 3, 3, 3, 3, 3,
+                   1, 1, 1, 1, 1, 1, 1,
+                   8, 8, 8, 8, 8, 8, 8, 8,
+                   0, 0, 0, 0, 0, 0, 0,
+                   0, 0, 0, 0, 0, 0, 0, 0,
+                   ]),
+         Fill(name = 'city', cost = 30, chance_weight = 4, 
+              keywords = [],
+              output = [
+                   6, 6, 6, 6, 6, 6, 6, 6,
+                   6, 6, 6, 6, 6, 6, 6,
+                   6, 8, 6, 6, 6, 6, 8, 8,
+                   8, 8, 6, 8, 6, 8, 8,
+                   8, 8, 0, 8, 0, 0, 8, 8,
+                   8, 8, 0, 8, 0, 8, 8,
+                   0, 0, 0, 0, 0, 0, 0, 0,
+                   ]),
+         Fill(name = 'frame', cost = 40, chance_weight = 4, override = True, 
+              keywords = ['museum'],
+              output = [
+                   1, 1, 1, 8, 8, 1, 1, 1,
+                   1, 0, 0, 0, 0, 0, 1,
+                   1, 0, 0, 0, 0, 0, 0, 1,
+                   8, 0, 0, 0, 0, 0, 8,
+                   8, 0, 0, 0, 0, 0, 0, 8,
+                   1, 0, 0, 0, 0, 0, 1,
+                   1, 0, 0, 0, 0, 0, 0, 1,
+                   1, 1, 8, 8, 8, 1, 1,
+                   ]),
+         # Name goes 'diagonal[Direction (L/R)][number of colors]'
+         Fill(name = 'diagonalR2', cost = 30, chance_weight = 4, 
+              keywords = ['diagonal'],
+              output = [
+                   'A', 'B', 'A', 'B', 'A', 'B', 'A', 'B',
+                   'A', 'B', 'A', 'B', 'A', 'B', 'A',
+                   'B', 'A', 'B', 'A', 'B', 'A', 'B', 'A',
+                   'B', 'A', 'B', 'A', 'B', 'A', 'B',
+                   'A', 'B', 'A', 'B', 'A', 'B', 'A', 'B',
+                   'A', 'B', 'A', 'B', 'A', 'B', 'A',
+                   'B', 'A', 'B', 'A', 'B', 'A', 'B', 'A',
+                   'B', 'A', 'B', 'A', 'B', 'A', 'B',
+                   ]),
+         Fill(name = 'diagonalR3', cost = 30, chance_weight = 4,
+              keywords = ['diagonal'],
+              output = [
+                   'A', 'B', 'C', 'A', 'B', 'C', 'A', 'B',
+                   'A', 'B', 'C', 'A', 'B', 'C', 'A',
+                   'C', 'A', 'B', 'C', 'A', 'B', 'C', 'A',
+                   'C', 'A', 'B', 'C', 'A', 'B', 'C',
+                   'B', 'C', 'A', 'B', 'C', 'A', 'B', 'C',
+                   'B', 'C', 'A', 'B', 'C', 'A', 'B',
+                   'A', 'B', 'C', 'A', 'B', 'C', 'A', 'B',
+                   'A', 'B', 'C', 'A', 'B', 'C', 'A',
+                   ]),
+         Fill(name = 'diagonalR4', cost = 30, chance_weight = 4, 
+              keywords = ['diagonal'],
+              output = [
+                   'A', 'B', 'C', 'D', 'A', 'B', 'C', 'D',
+                   'A', 'B', 'C', 'D', 'A', 'B', 'C',
+                   'D', 'A', 'B', 'C', 'D', 'A', 'B', 'C',
+                   'D', 'A', 'B', 'C', 'D', 'A', 'B',
+                   'C', 'D', 'A', 'B', 'C', 'D', 'A', 'B',
+                   'C', 'D', 'A', 'B', 'C', 'D', 'A',
+                   'B', 'C', 'D', 'A', 'B', 'C', 'D', 'A',
+                   'B', 'C', 'D', 'A', 'B', 'C', 'D',
+                   ]),
+         Fill(name = 'diagonalL2', cost = 30, chance_weight = 4,
+              keywords = ['diagonal'],
+              output = [
+                   'B', 'A', 'B', 'A', 'B', 'A', 'B', 'A',
+                   'A', 'B', 'A', 'B', 'A', 'B', 'A',
+                   'A', 'B', 'A', 'B', 'A', 'B', 'A', 'B',
+                   'B', 'A', 'B', 'A', 'B', 'A', 'B',
+                   'B', 'A', 'B', 'A', 'B', 'A', 'B', 'A',
+                   'A', 'B', 'A', 'B', 'A', 'B', 'A',
+                   'A', 'B', 'A', 'B', 'A', 'B', 'A', 'B',
+                   'B', 'A', 'B', 'A', 'B', 'A', 'B',
+                   ]),
+         Fill(name = 'diagonalL3', cost = 30, chance_weight = 4,
+              keywords = ['diagonal'],
+              output = [
+                   'B', 'A', 'C', 'B', 'A', 'C', 'B', 'A',
+                   'A', 'C', 'B', 'A', 'C', 'B', 'A',
+                   'A', 'C', 'B', 'A', 'C', 'B', 'A', 'C',
+                   'C', 'B', 'A', 'C', 'B', 'A', 'C',
+                   'C', 'B', 'A', 'C', 'B', 'A', 'C', 'B',
+                   'B', 'A', 'C', 'B', 'A', 'C', 'B',
+                   'B', 'A', 'C', 'B', 'A', 'C', 'B', 'A',
+                   'A', 'C', 'B', 'A', 'C', 'B', 'A',
+                   ]),
+         Fill(name = 'diagonalL4', cost = 30, chance_weight = 4,
+              keywords = ['diagonal'],
+              output = [
+                   'D', 'C', 'B', 'A', 'D', 'C', 'B', 'A',
+                   'C', 'B', 'A', 'D', 'C', 'B', 'A',
+                   'C', 'B', 'A', 'D', 'C', 'B', 'A', 'D',
+                   'B', 'A', 'D', 'C', 'B', 'A', 'D',
+                   'B', 'A', 'D', 'C', 'B', 'A', 'D', 'C',
+                   'A', 'D', 'C', 'B', 'A', 'D', 'C',
+                   'A', 'D', 'C', 'B', 'A', 'D', 'C', 'B',
+                   'D', 'C', 'B', 'A', 'D', 'C', 'B',
+                   ]),
+         Fill(name = 'columns2narrow', cost = 30, chance_weight = 4,
+              keywords = ['column'],
+              output = [
+                   'A', 'B', 'A', 'B', 'A', 'B', 'A', 'B',
+                   'A', 'B', 'A', 'B', 'A', 'B', 'A',
+                   'A', 'B', 'A', 'B', 'A', 'B', 'A', 'B',
+                   'A', 'B', 'A', 'B', 'A', 'B', 'A',
+                   'A', 'B', 'A', 'B', 'A', 'B', 'A', 'B',
+                   'A', 'B', 'A', 'B', 'A', 'B', 'A',
+                   'A', 'B', 'A', 'B', 'A', 'B', 'A', 'B',
+                   'A', 'B', 'A', 'B', 'A', 'B', 'A',
+                   ]),
+         Fill(name = 'columns2broad', cost = 30, chance_weight = 4,
+              keywords = ['column'],
+              output = [
+                   'A', 'A', 'B', 'B', 'A', 'A', 'B', 'B',
+                   'A', 'A', 'B', 'B', 'A', 'A', 'B',
+                   'A', 'A', 'B', 'B', 'A', 'A', 'B', 'B',
+                   'A', 'A', 'B', 'B', 'A', 'A', 'B',
+                   'A', 'A', 'B', 'B', 'A', 'A', 'B', 'B',
+                   'A', 'A', 'B', 'B', 'A', 'A', 'B',
+                   'A', 'A', 'B', 'B', 'A', 'A', 'B', 'B',
+                   'A', 'A', 'B', 'B', 'A', 'A', 'B',
+                   ]),
+         Fill(name = 'columns3', cost = 30, chance_weight = 4,
+              keywords = ['column'],
+              output = [
+                   'A', 'B', 'C', 'A', 'B', 'C', 'A', 'B',
+                   'A', 'B', 'C', 'A', 'B', 'C', 'A',
+                   'A', 'B', 'C', 'A', 'B', 'C', 'A', 'B',
+                   'A', 'B', 'C', 'A', 'B', 'C', 'A',
+                   'A', 'B', 'C', 'A', 'B', 'C', 'A', 'B',
+                   'A', 'B', 'C', 'A', 'B', 'C', 'A',
+                   'A', 'B', 'C', 'A', 'B', 'C', 'A', 'B',
+                   'A', 'B', 'C', 'A', 'B', 'C', 'A',
+                   ]),
+         Fill(name = 'columns4', cost = 30, chance_weight = 4,
+              keywords = ['column'],
+              output = [
+                   'A', 'B', 'C', 'D', 'A', 'B', 'C', 'D',
+                   'A', 'B', 'C', 'D', 'A', 'B', 'C',
+                   'A', 'B', 'C', 'D', 'A', 'B', 'C', 'D',
+                   'A', 'B', 'C', 'D', 'A', 'B', 'C',
+                   'A', 'B', 'C', 'D', 'A', 'B', 'C', 'D',
+                   'A', 'B', 'C', 'D', 'A', 'B', 'C',
+                   'A', 'B', 'C', 'D', 'A', 'B', 'C', 'D',
+                   'A', 'B', 'C', 'D', 'A', 'B', 'C',
+                   ]),
+    ]
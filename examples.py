@@ -24,4 +24,8 @@ levelgen.generate_level(1,2,
 # but excludes objects associated with Japan or flags.
 levelgen.generate_level(7,2,
                         required=['windmill', 'frame', 'pinetree'],
-                        excludes=['japan', 'flag'])
\ No newline at end of file
+                        excludes=['japan', 'flag'])
+
+# Generate all of the levels in the first two worlds in one go, excluding anything locked.
+levelgen.generate_levels([(world, level) for world in range(1, 3) for level in range(1, 11)],
+                         excludes=['locked'])
\ No newline at end of file
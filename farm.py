@@ -0,0 +1,104 @@
+import dataclasses
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from levelgen import GeneratorConfig, generate_levels
+
+
+def farm_levels(
+            levels, master_seed, required=[], excludes=[],
+            elements_set=None, fill_set=None, config=GeneratorConfig(),
+            only_required=False, processes=None, chunk_size=64):
+    """Generate a batch of levels across multiple processes.
+
+    Every level is generated with its own random number generator, seeded from the master seed
+    and the level's world, level and stars. The output is therefore exactly the same no matter
+    how many processes are used, how the levels are split up, or in which order they finish.
+
+    Parameters
+    ----------
+    levels : iterable
+        the levels to generate, in any of the forms accepted by generate_levels
+    master_seed : int or str
+        the seed for the whole batch, see level_seed
+    required : list, optional
+        the default requirements for every level, see generate_level (default is empty)
+    excludes : list, optional
+        the default exclusions for every level, see generate_level (default is empty)
+    elements_set : list, optional
+        the list of DesignElements to incorporate (default is DESIGNS from consts.py)
+    fill_set : list, optional
+        the list of Fills to incorporate (default is FILLS from consts.py)
+    config : GeneratorConfig, optional
+        the configuration for this function (default is a default GeneratorConfig)
+    only_required : bool, optional
+        the default only_required flag for every level, see generate_level (default is False)
+    processes : int, optional
+        the number of worker processes, uses every core if not provided (default is None)
+    chunk_size : int, optional
+        the number of levels to send to a worker at once (default is 64)
+
+    Returns
+    -------
+    list
+        the generated levels, in the same order as the input
+    """
+    task = (required, excludes, elements_set, fill_set, _worker_config(config), only_required, master_seed)
+    return [level for generated in _run_chunks(_generate_chunk, _chunks(list(levels), chunk_size), task, processes)
+            for level in generated]
+
+def _run_chunks(function, chunks, task, processes):
+    """Yield function(chunk, task) for every chunk in order, in worker processes if there is more than one.
+
+    Only a couple of chunks are queued per worker at a time, so the results do not pile up in memory
+    when they are used as they come in. Stopping the iteration cancels the chunks that have not started.
+
+    Parameters
+    ----------
+    function : callable
+        a module level function taking a chunk and the task, so it can be sent to worker processes
+    chunks : list
+        the chunks of work, see _chunks
+    task : tuple
+        everything the chunks have in common
+    processes : int
+        the number of worker processes, None to use every core
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+    # There is no point in starting processes for a single chunk.
+    if processes <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield function(chunk, task)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=min(processes, len(chunks)))
+    running = deque()
+    try:
+        for chunk in chunks:
+            running.append(executor.submit(function, chunk, task))
+            if len(running) >= 2 * processes:
+                yield running.popleft().result()
+        while running:
+            yield running.popleft().result()
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+def _chunks(items, chunk_size):
+    """Split a list into chunks of at most chunk_size items."""
+    return [items[start:start + chunk_size] for start in range(0, len(items), chunk_size)]
+
+def _worker_config(config):
+    """Return the config to generate levels with in worker processes.
+
+    Memoryviews cannot be sent back from worker processes, so the rows are always lists.
+    """
+    return dataclasses.replace(config, return_view=False)
+
+def _generate_chunk(chunk, task):
+    """Generate one chunk of levels inside a worker process."""
+    required, excludes, elements_set, fill_set, config, only_required, master_seed = task
+    return generate_levels(
+        chunk, required=required, excludes=excludes, elements_set=elements_set,
+        fill_set=fill_set, config=config, only_required=only_required, master_seed=master_seed)
@@ -1,311 +1,427 @@
-import random
-import dataclasses
-
-def _apply_element(element, list, config):
-    """Apply the output of an element to the list of bubbles."""
+from functools import lru_cache
+
+from catalog import get_catalog
+from colors import available_colors, excluded_color_set, fill_color_table, resolve_element_colors
+from sampler import WeightedSampler, resolve_rng
+
+# Translation tables for bytes.translate, used to turn a row of bubbles into a mask
+# with 0xFF for every filled or every empty bubble respectively.
+_NONZERO_TO_FULL = bytes([0] + [255] * 255)
+_ZERO_TO_FULL = bytes([255] + [0] * 255)
+# Translation table to turn bubbles 0-9 into their ASCII digits.
+_BYTE_TO_DIGIT = bytes((ord('0') + value) % 256 for value in range(256))
+
+def _apply_element(element, list, config, rng=None, telemetry=None, color_table=None, spot_tracker=None,
+                   placement=None):
+    """Apply the output of an element to the list of bubbles, recording the attempt in telemetry if provided.
+
+    If a _SpotTracker is provided, the legal spots of elements are looked up in it rather than checked
+    on the whole field, and it is told about the bubbles this element adds. If a placement is provided,
+    a starting index and number of legal spots from _plan_placements, the element is written there instead.
+    """
+    rng = resolve_rng(rng)
     list_to_return = list
-    # We use an empty list in the required section as that is used for fills;
-    # for elements we use the allowed_colors section instead.
-    
-    index = 0
-    is_odd_row = True
-    attempts = 0
-    is_legal = False
-
-    # Try to find a starting location a few times before giving up.
-    while not is_legal:
-        # If we have tried too often, just give up.
-        if attempts > 5:
-            return list_to_return
-        # Otherwise, pick a starting location and see if we're allowed to place there.
-        else:
-            index, is_odd_row = _get_starting_index(element, config)
-            is_legal = _verify_legal_placement(element, list, config, index, is_odd_row)
-
-        attempts +=1
-    
-    element_to_apply = _2d_to_list(_color_swap_element(element), config)
-
-    for bubble in element_to_apply:
-        try:
-            if element.override == True or list_to_return[index] == 0:
-                if bubble != 0:
-                    list_to_return[index] = bubble
-        except:
-            pass
-        index += 1
-        
+    # Colors are usually picked for a whole batch of elements up front, see resolve_element_colors;
+    # if they were not, pick them for just this element.
+    if color_table is None and len(element.variables) != 0:
+        color_table = resolve_element_colors([element], rng=rng)[0]
+    element_to_apply = _color_swap_element(element, config, color_table)
+
+    # Find every spot where the element may be placed on the current field and pick one of those,
+    # so we only fail to place the element if there is no legal spot at all.
+    if placement is not None:
+        index, legal_spots = placement
+    elif spot_tracker is not None and element.override == False:
+        index, legal_spots = spot_tracker.pick(element, list, config, rng)
+    else:
+        legal_indexes = _get_legal_indexes(element, list, config)
+        legal_spots = len(legal_indexes)
+        index = rng.choice(legal_indexes) if legal_spots != 0 else None
+    if telemetry is not None:
+        telemetry.record_placement(element, legal_spots)
+    if index is None:
+        return list_to_return
+
+    # Anything that falls off the end of the field is dropped.
+    _masked_write(list_to_return, index, element_to_apply, element.override)
+    if spot_tracker is not None:
+        spot_tracker.record_placement(element, index, config.field_width)
     return list_to_return
 
-def _apply_fill(fill, list, excludes, required, config):
-    """Apply the output of a fill to the list of bubbles and return the new list."""
+def _apply_fill(fill, list, excludes, required, config, rng=None, spot_tracker=None):
+    """Apply the output of a fill to the list of bubbles and return the new list, telling the _SpotTracker if provided."""
+    rng = resolve_rng(rng)
     list_to_return = list
-    fill_to_apply = _color_swap_fill(fill, _filter_colors(list, 4, excludes), required)
+    fill_to_apply = _color_swap_fill(fill, _filter_colors(list, 4, excludes, rng), required, rng, config)
 
     # Overwrite any empty spaces with the fill or just overwrite anything with override=True.
-    for index in range(len(fill_to_apply)):
-        if fill.override == True or list_to_return[index] == 0:
-            if fill_to_apply[index] != 0:
-                list_to_return[index] = int(fill_to_apply[index])
-
-    return list_to_return
-
-def _color_swap_element(element):
-    """Swap string color variables in elements to integers."""
-    list_to_return = []
-    color_dict = {}
-    allowed_colors = element.allowed_colors.copy()
-    element_to_return = dataclasses.replace(element)
-
-    # Populate the allowed color list with the standard 1-9 color ints if we did
-    # not specify any specific allowed colors.
-    if len(allowed_colors) == 0:
-        for number in range(1, 10):
-            allowed_colors.append(number)
-
-    for row in element.output:
-        row_to_append = []
-        for bubble in row:
-            if isinstance(bubble, str):
-                if bubble not in color_dict:
-                    color_dict[bubble] = allowed_colors.pop(random.randint(0, len(allowed_colors) - 1))
-
-            if bubble in color_dict:
-                row_to_append.append(color_dict[bubble])
-            else:
-                row_to_append.append(bubble)
-
-        list_to_return.append(row_to_append)
-
-    element_to_return.output = list_to_return
-    return element_to_return
-
-def _color_swap_fill(element, color_list, required):
-    """Swap string color variables in fills to integers."""
-    list_to_return = []
-    required_colors = []
-    color_dict = {}
-
-    # Add any required colors to their own list
-    for entry in required:
-        if isinstance(entry, int):
-            required_colors.append(entry)
-
-    # Go through the output and replace strings with integers. 
-    # Takes any required colors first.
-    for entry in element.output:
-        if isinstance(entry, str):
-            if entry not in color_dict:
-                if len(required_colors) != 0:
-                    color_dict[entry] = required_colors.pop(0)
-                    if color_dict[entry] in color_list:
-                        color_list.remove(color_dict[entry])
-                else:
-                    color_dict[entry] = color_list.pop(random.randint(0, len(color_list) - 1))
-
-        if entry in color_dict:
-            list_to_return.append(color_dict[entry])
-        else:
-            list_to_return.append(entry)
+    _masked_write(list_to_return, 0, fill_to_apply, fill.override)
+    if spot_tracker is not None:
+        spot_tracker.record_write(list_to_return, 0, len(fill_to_apply), config.field_width)
     return list_to_return
 
-def _filter_colors(bubble_list, min_colors, excludes):
+def _color_swap_element(element, config, color_table=None):
+    """Return the output of an element as bytes laid out for the field, with its letter variables swapped using color_table."""
+    element_to_return = _encoded_output(element, config.field_width)
+    if color_table is None:
+        return element_to_return
+    return element_to_return.translate(color_table)
+
+def _color_swap_fill(element, color_list, required, rng=None, config=None):
+    """Swap string color variables in fills to integers and return the output as bytes, fitted to the field of the config if provided."""
+    fill_to_return = element.encoded_rows[0]
+    if config is not None:
+        fill_to_return = _fitted_fill(element, config.field_width, config.field_height, config.fill_scaling)
+    color_table = fill_color_table(element, color_list, required, rng)
+    if color_table is None:
+        return fill_to_return
+    return fill_to_return.translate(color_table)
+
+def _filter_colors(bubble_list, min_colors, excludes, rng=None):
     """Take the range of basic color ints and remove the ones in use. Then pad the range with random ints if there would not be enough colors."""
-    colors_to_return = []
-    for number in range(1, 10):
-        colors_to_return.append(number)
-    
-    # Filter out all of the used integers
-    for bubble in bubble_list:
-        if bubble in colors_to_return:
-            colors_to_return.remove(bubble)
-    
-    # Filter out all excluded integers
-    for entry in excludes:
-        if entry in colors_to_return:
-            colors_to_return.remove(entry)
-    
-    # If not enough colors to satisfy the min_colors, add random colors until we do.
-    while len(colors_to_return) < min_colors:
-        colors_to_return.append(random.randint(1, 9))
-
-    return colors_to_return
+    return available_colors(bubble_list, min_colors, excluded_color_set(excludes), rng)
 
 def _filter_list(excludes, list_to_filter):
-    """Filter a list based on provided keywords or names and return the list without those matches."""
-    filtered_list = []
-    for entry in list_to_filter:
-        add_to_list = True
-
-        # Filter based on name or keywords.
-        if entry.name not in excludes:
-            for keyword in entry.keywords:
-                if keyword in excludes:
-                    add_to_list = False
+    """Filter a list based on provided keywords, names or color integers and return the list without those matches."""
+    # The catalog indexes every name, keyword and bubble once, so this is just a few set operations.
+    return get_catalog(list_to_filter).filter(excludes)
+
+def _get_solver(excludes, list_to_filter):
+    """Return the cached DifficultySolver for a list filtered on the provided keywords, names or color integers."""
+    return get_catalog(list_to_filter).solver(excludes)
+
+def _legal_mask(element, list, config):
+    """Return a bytearray with a 1 for every legal starting index of the element on the current list of bubbles."""
+    # Shift the filled bubbles of the whole field back by the offset of every bubble of the element,
+    # one byte per bubble, so every starting index that would cover a filled bubble ends up non-zero.
+    occupied = int.from_bytes(list.translate(_NONZERO_TO_FULL), 'little')
+    blocked = 0
+    for offset in _bubble_offsets(element, config.field_width):
+        blocked |= occupied >> (8 * offset)
+    legal = _starting_mask(element, config.field_width, config.field_height) & ~blocked
+    return bytearray(legal.to_bytes(len(list), 'little'))
+
+def _get_legal_indexes(element, list, config):
+    """Return every starting index where the element can legally be placed on the current list of bubbles."""
+    starting_indexes = _starting_indexes(element, config.field_width, config.field_height)
+
+    # If the element is set to override, any placement is legal!
+    if element.override == True:
+        return starting_indexes
+
+    legal = _legal_mask(element, list, config)
+    return [index for index in starting_indexes if legal[index]]
+
+class _SpotTracker:
+    """Keeps the legal starting indexes of elements on one list of bubbles up to date while elements are placed.
+
+    The field of an element is checked once, the first time it is looked up. After that, every placed
+    element only clears the starting indexes whose bubbles it now covers, see _covered_offsets, so the
+    work per placement does not grow with the size of the field. Bubbles are only ever added to the list,
+    so spots never become legal again. Anything else written to the list, such as a fill, has to be
+    passed to record_write.
+    """
+
+    def __init__(self):
+        # Per element: a mask with a 1 for every legal starting index, the number of those,
+        # and a list of starting indexes that holds at least every legal one to draw from.
+        self._spots = {}
+        # The result of _covered_offsets per pair of elements, by id, which is quicker than hashing the elements.
+        self._covered = {}
+
+    def pick(self, element, list, config, rng):
+        """Return a random legal starting index for a non-overriding element, or None, and the number of legal spots."""
+        spots = self._spots.get(element)
+        if spots is None:
+            legal = _legal_mask(element, list, config)
+            spots = self._spots[element] = [
+                legal, legal.count(1), _starting_indexes(element, config.field_width, config.field_height)]
+        legal, count, indexes = spots
+        if count == 0:
+            return None, 0
+
+        # Drawing from the list until the index is still legal picks every legal spot with the same chance.
+        # Dropping the spots that were taken once they are the majority keeps that to two draws on average.
+        if 2 * count < len(indexes):
+            indexes = spots[2] = [index for index in indexes if legal[index]]
+        while True:
+            index = indexes[rng.randint(0, len(indexes) - 1)]
+            if legal[index]:
+                return index, count
+
+    def record_placement(self, element, index, field_width):
+        """Clear every starting index that overlaps the bubbles of an element placed at index."""
+        covered = self._covered
+        for tracked, spots in self._spots.items():
+            key = (id(tracked), id(element))
+            cached = covered.get(key)
+            if cached is None:
+                # Keep the placed element alongside its offsets, so its id cannot be reused while the tracker lives.
+                cached = covered[key] = (_covered_offsets(tracked, element, field_width), element)
+            offsets = cached[0]
+            legal = spots[0]
+            size = len(legal)
+            cleared = 0
+            for offset in offsets:
+                start = index + offset
+                if 0 <= start < size and legal[start]:
+                    legal[start] = 0
+                    cleared += 1
+            spots[1] -= cleared
+
+    def record_write(self, list, start, end, field_width):
+        """Clear every starting index that is no longer legal after bubbles were written from start to end."""
+        occupied = list.translate(_NONZERO_TO_FULL)
+        for tracked, spots in self._spots.items():
+            legal = spots[0]
+            offsets = _bubble_offsets(tracked, field_width)
+            if len(offsets) == 0:
+                continue
+            # Only starting indexes whose bubbles reach into the written bubbles can have changed,
+            # so check just those the same way _legal_mask checks the whole field.
+            low = max(0, start - offsets[-1])
+            high = min(end, len(legal))
+            if low >= high:
+                continue
+            window = int.from_bytes(occupied[low:high + offsets[-1]], 'little')
+            blocked = 0
+            for offset in offsets:
+                blocked |= window >> (8 * offset)
+            before = legal[low:high]
+            after = (int.from_bytes(before, 'little') & ~blocked).to_bytes(high - low, 'little')
+            legal[low:high] = after
+            spots[1] -= before.count(1) - after.count(1)
+
+def _plan_placements(elements, list, config, rng):
+    """Return a starting index and number of legal spots for every element in order, or None if one of them does not fit.
+
+    The elements are placed on a copy of the list the same way _apply_element and _apply_fill place them,
+    only keeping track of which bubbles are filled. Every planned index is therefore still legal when the
+    elements are applied to the list itself in the same order. Elements treated as fills get None as their index.
+    """
+    filled = bytearray(list)
+    spot_tracker = _SpotTracker()
+    placements = []
+    for element in elements:
+        if element.treat_as_fill:
+            fitted = _fitted_fill(element, config.field_width, config.field_height, config.fill_scaling)
+            _masked_write(filled, 0, fitted, element.override)
+            spot_tracker.record_write(filled, 0, len(fitted), config.field_width)
+            placements.append((None, 0))
+            continue
+
+        if element.override == True:
+            starting_indexes = _starting_indexes(element, config.field_width, config.field_height)
+            legal_spots = len(starting_indexes)
+            index = rng.choice(starting_indexes) if legal_spots != 0 else None
         else:
-            add_to_list = False
-        
-        # Filter based on color integers.
-        if isinstance(entry.output[0], list): # This is a multi-list output like Design Elements.
-            for row in entry.output:
-                for bubble in row:
-                    if bubble in excludes:
-                        add_to_list = False
-        else: # This is a Fill or a Design Element treated as Fill.
-            for bubble in entry.output:
-                if bubble in excludes:
-                    add_to_list = False
-
-        if add_to_list:
-                filtered_list.append(entry)
-
-    return filtered_list
-
-def _get_starting_index(element, config):
-    """Pick a random legal starting location on the grid and return the starting index and if this is an odd or even row."""
-    starting_index = 0
-    widest_row_width = _get_widest(element.output)
-    
-    # Pick a random starting location on the playing field.
+            index, legal_spots = spot_tracker.pick(element, filled, config, rng)
+        if index is None:
+            return None
+        _masked_write(filled, index, _encoded_output(element, config.field_width), element.override)
+        spot_tracker.record_placement(element, index, config.field_width)
+        placements.append((index, legal_spots))
+    return placements
+
+@lru_cache(maxsize=4096)
+def _starting_indexes(element, field_width, field_height):
+    """Return every starting index the element may start from on a field of this size, worked out once per size.
+
+    Rows of a design are laid out from the row above by _encoded_output, so every row sits half a bubble
+    further to the right on the hex grid. A starting index is only allowed if every bubble of every row
+    lands inside its own row of the field, so no part of the element wraps around into a neighbouring row.
+    Empty bubbles at the ends of rows may stick out, and rows below the bottom of the field are dropped.
+    """
+    row_offsets = _row_offsets(field_width, field_height)
+    rows = element.encoded_rows
+    # The first and last filled bubble of every row, or None for rows without any.
+    extents = []
+    for row in rows:
+        filled = row.translate(_NONZERO_TO_FULL)
+        extents.append((filled.find(255), filled.rfind(255)) if 255 in filled else None)
+
     # Make sure the entire design fits on the field height-wise.
-    y_axis = 0
     if element.y_max != 0:
-        y_axis = random.randint(element.y_min, element.y_max)
-    else:
-        y_axis = random.randint(element.y_min, config.field_height - len(element.output))
-
-    # Make it so that we don't cut off the element by accident.
-    x_start = widest_row_width - len(element.output[0])
-
-    # Get correct x_axis offset depending on which row we start on.
-    if y_axis % 2 == 0: 
-        # Adding the 1 prevents it from accidentally cutting off the next row.
-        try:
-            x_axis = random.randint(x_start, config.field_width - (widest_row_width + 1))
-        except:
-            x_axis = random.randint(0, 1)
-        is_odd_row = False
+        y_range = range(max(0, element.y_min), min(element.y_max, field_height - 1) + 1)
     else:
-        x_axis = random.randint(x_start, (config.field_width - 1) - widest_row_width)
-        is_odd_row = True
-    
-    # Set starting bubble index, starting with the correct row.
-    for row_nr in range(0, y_axis):
-        if row_nr % 2 == 0:
-            starting_index += config.field_width
-        else:
-            starting_index += config.field_width - 1
-
-    # Now move to the correct column.
-    starting_index += x_axis
-    return starting_index, is_odd_row
-
-def _get_widest(output):
-    """Return the length of the widest row in the output."""
-    widest_row = []
-    for row in output:
-        if len(row) > len(widest_row):
-            widest_row = row
-    return len(widest_row)
+        y_range = range(max(0, element.y_min), field_height - len(rows) + 1)
+
+    starting_indexes = []
+    for y_axis in y_range:
+        # Follow the rows of the element down the field, keeping the columns every row allows.
+        # Never start before the first bubble of the field, even with leading empty bubbles,
+        # and elements without any bubbles never stick out at all.
+        x_min = -row_offsets[y_axis] if any(extents) else 0
+        x_max = field_width - 1
+        shift = 0
+        for row_number, row in enumerate(rows):
+            field_row = y_axis + row_number
+            if field_row >= field_height:
+                break
+            row_length = row_offsets[field_row + 1] - row_offsets[field_row]
+            if extents[row_number] is not None:
+                first, last = extents[row_number]
+                x_min = max(x_min, -shift - first)
+                x_max = min(x_max, row_length - 1 - shift - last)
+            if row_number + 1 < len(rows):
+                shift += len(row) + max(0, field_width - len(rows[row_number + 1])) - row_length
+
+        starting_indexes.extend(range(row_offsets[y_axis] + x_min, row_offsets[y_axis] + x_max + 1))
+
+    return tuple(starting_indexes)
 
 def _2d_to_list(element, config):
+    """Turn the 2D output of a design element into one list that can be laid over the bubble list."""
+    rows = element.output
     output_to_return = []
-    field_width = config.field_width
-
-    # Go through the rows in the output; we use a non-pythonic solution so we can 
-    # easily access the length of the next row.
-    for index in range(0, len(element.output)):
-        # Append all of the bubbles and then apply a number of 0's to reach the
-        # starting point of the next row.
-        for bubble in element.output[index]:
-            output_to_return.append(bubble)
-        try:
-            for i in range(0, field_width - len(element.output[index+1])):
-                output_to_return.append(0)
-        except:
-            pass
-
-        #is_odd_row = not is_odd_row
 
-    return output_to_return
+    # Append all of the bubbles and then apply a number of 0's to reach the
+    # starting point of the next row.
+    for index in range(0, len(rows)):
+        output_to_return.extend(rows[index])
+        if index + 1 < len(rows):
+            output_to_return.extend([0] * (config.field_width - len(rows[index + 1])))
 
-def _jump_row(index, row, is_odd_row, config):
-    """Skip to the next row."""
-    filled_bubbles = 0
-    for bubble in row:
-        if bubble == 0:
-            pass
-        else:
-            filled_bubbles = filled_bubbles + 1
+    return output_to_return
 
-    index += (config.field_width - 1 - filled_bubbles)
-    is_odd_row = not is_odd_row
-    return index, is_odd_row
+def _list_to_2D(list, config, as_view=False):
+    """Change the bubble list input to a 2D List to return, leaving the input as it is.
 
-def _list_to_2D(list, config):
-    """Change the bubble list input to a 2D List to return."""
-    list_to_return = []
+    If as_view is True, the rows are memoryviews into the bubble list instead of copies.
+    """
+    row_offsets = _row_offsets(config.field_width, config.field_height)
+    row_bounds = zip(row_offsets, row_offsets[1:])
 
-    for index in range(0, config.field_height):
-        temp_list = []
-        if index % 2 == 0:
-            for i in range(0, config.field_width):
-                temp_list.append(list.pop(0))
-        else:
-            for i in range(0, config.field_width - 1):
-                temp_list.append(list.pop(0))
-        list_to_return.append(temp_list)
-        
-    return list_to_return
+    if as_view:
+        view = memoryview(list)
+        return [view[start:end] for start, end in row_bounds]
+    return [[*list[start:end]] for start, end in row_bounds]
 
 def _list_to_string(list):
     """Change the bubble list input to a string to return."""
-    string_to_return = ''
+    # Grids with only single digit bubbles can be turned into digits in one go.
+    if isinstance(list, (bytes, bytearray)) and (len(list) == 0 or max(list) < 10):
+        return list.translate(_BYTE_TO_DIGIT).decode('ascii')
+    return ''.join(map(str, list))
+
+def _bytes_to_output(level_bytes, config):
+    """Turn the bytes of a level into a new level in the form the config asks for, as generate_level returns it."""
+    if config.return_string:
+        return _list_to_string(level_bytes)
+    return _list_to_2D(bytearray(level_bytes), config, config.return_view)
+
+def _weighted_roll(elements_set, sampler=None, rng=None):
+    """Return a random element from a list with items with weighted chances."""
+    # Building the sampler is the expensive part, so reuse one if we have it.
+    if sampler is None:
+        sampler = WeightedSampler(elements_set)
+    return sampler.roll(rng)
+
+def _blank_grid(config):
+    """Return an empty bubble grid, one byte per bubble, for the configured field."""
+    # Due to the nature of hex grids, the field has a base width at even 
+    # height numbers, and width-1 at odd numbers.
+    return bytearray(_row_offsets(config.field_width, config.field_height)[-1])
+
+@lru_cache(maxsize=1024)
+def _fitted_fill(fill, field_width, field_height, fill_scaling):
+    """Return the encoded output of a fill fitted to a field of this size, worked out once per size.
+
+    Fills laid out for this field size are returned as they are. Otherwise the output is split into the
+    rows of the field it was laid out for, and every row of this field takes the bubbles of one of those,
+    either repeating them ('tile') or spreading them out ('stretch'), so the fill covers the whole field.
+    Design elements treated as fills are scenes rather than backgrounds, so they keep the rows they cover
+    and are only fitted across the field; applying one then does not take longer on longer fields.
+    """
+    output = fill.encoded_rows[0]
+    if (field_width, field_height) == (fill.field_width, fill.field_height):
+        return output
+    if fill_scaling not in ('tile', 'stretch'):
+        raise ValueError(f"fill_scaling must be 'tile' or 'stretch', got {fill_scaling!r}.")
+
+    # Only the rows the output reaches are repeated, so a short fill does not leave empty bands when tiled.
+    source_offsets = _row_offsets(fill.field_width, fill.field_height)
+    source_rows = []
+    for start, end in zip(source_offsets, source_offsets[1:]):
+        if start >= len(output):
+            break
+        source_rows.append(output[start:end].ljust(end - start, b'\0'))
+    if len(source_rows) == 0:
+        return output
+
+    height = field_height
+    if getattr(fill, 'treat_as_fill', False):
+        height = min(field_height, len(source_rows))
+    row_offsets = _row_offsets(field_width, field_height)
+    fitted = bytearray()
+    for row in range(height):
+        length = row_offsets[row + 1] - row_offsets[row]
+        if fill_scaling == 'tile':
+            source = source_rows[row % len(source_rows)]
+            fitted += (source * (length // len(source) + 1))[:length]
+        else:
+            source = source_rows[row * len(source_rows) // height]
+            fitted += bytes(source[column * len(source) // length] for column in range(length))
+    return bytes(fitted)
+
+@lru_cache(maxsize=4096)
+def _covered_offsets(tracked, placed, field_width):
+    """Return the offsets from where placed starts at which tracked would overlap one of its bubbles."""
+    tracked_bubbles = _bubble_offsets(tracked, field_width)
+    return tuple(sorted({placed_bubble - tracked_bubble
+                         for placed_bubble in _bubble_offsets(placed, field_width)
+                         for tracked_bubble in tracked_bubbles}))
+
+@lru_cache(maxsize=4096)
+def _starting_mask(element, field_width, field_height):
+    """Return an int with a 1 in the byte of every starting index of the element, for use with a grid's bytes."""
+    mask = bytearray(_row_offsets(field_width, field_height)[-1])
+    for index in _starting_indexes(element, field_width, field_height):
+        mask[index] = 1
+    return int.from_bytes(mask, 'little')
+
+@lru_cache(maxsize=4096)
+def _bubble_offsets(element, field_width):
+    """Return the offset of every non-empty bubble in the encoded output of an element."""
+    return tuple(offset for offset, bubble in enumerate(_encoded_output(element, field_width)) if bubble)
+
+@lru_cache(maxsize=4096)
+def _encoded_output(element, field_width):
+    """Return the encoded output of an element as one row of bytes, padded between rows like _2d_to_list."""
+    rows = element.encoded_rows
+    output_to_return = bytearray()
+    for index in range(0, len(rows)):
+        output_to_return += rows[index]
+        if index + 1 < len(rows):
+            output_to_return += bytes(max(0, field_width - len(rows[index + 1])))
+    return bytes(output_to_return)
+
+def _masked_write(grid, index, values, override):
+    """Write the non-empty values onto the grid from index onwards, only writing onto empty bubbles unless override is True."""
+    end = min(len(grid), index + len(values))
+    if end <= index:
+        return
+
+    values = bytes(values[:end - index])
+    current_area = grid[index:end]
+    current = int.from_bytes(current_area, 'little')
+    new = int.from_bytes(values, 'little')
+
+    # Work on the whole area at once by treating it as one big integer, one byte per bubble.
+    if override:
+        result = (current & ~int.from_bytes(values.translate(_NONZERO_TO_FULL), 'little')) | new
+    else:
+        result = current | (new & int.from_bytes(current_area.translate(_ZERO_TO_FULL), 'little'))
 
-    for entry in list:
-        string_to_return += str(entry)
-    
-    return string_to_return
+    grid[index:end] = result.to_bytes(end - index, 'little')
 
-def _verify_legal_placement(element, list, config, index, is_odd_row):
-    """Make sure the selected element can legally be placed completely in the selected area."""
-    # If the element is set to override, any placement is legal!
-    if element.override == True:
-        return True
-    else:
-        # Trawl through the list starting from the selected point
-        current_index = index
-
-        for row in element.output:
-            for bubble in row:
-                if list[index] == 0:
-                    current_index += 1
-                else:
-                    return False
-            
-        index, is_odd_row = _jump_row(current_index, row, is_odd_row, config)
-        
-        # No issues found!
-        return True
-    
-def _weighted_roll(elements_set):
-    """Return a random index from a list with items with weighted chances."""
-    # Ensure we always at least return a random element.
-    element_to_return = random.choice(elements_set)
-
-    # Get the total weight and accumulated weights.
-    total_weight = 0
-    accumulated_weights = []
-    for element in elements_set:
-        total_weight += element.chance_weight
-        accumulated_weights += [total_weight]
-
-    # Roll on the total weight
-    roll = random.randint(0, total_weight)
-
-    # Find the element matching the roll result.
-    for element in elements_set:
-        if roll < accumulated_weights[elements_set.index(element)]:
-            element_to_return = element
-        
-    return element_to_return
\ No newline at end of file
+@lru_cache(maxsize=32)
+def _row_offsets(field_width, field_height):
+    """Return the index of the first bubble of every row, followed by the total number of bubbles."""
+    offsets = [0]
+    for height in range(0, field_height):
+        if height % 2 == 0:
+            offsets.append(offsets[-1] + field_width)
+        else:
+            offsets.append(offsets[-1] + field_width - 1)
+    return tuple(offsets)
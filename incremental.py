@@ -0,0 +1,400 @@
+import dataclasses
+import hashlib
+import json
+import os
+import secrets
+from dataclasses import dataclass
+
+from campaign import _output_format
+from farm import _chunks, _run_chunks, _worker_config
+from levelgen import GENERATION_VERSION, GeneratorConfig, _default_sets, _generate_from_setup, _level_entries, \
+    _parse_level_entry, _prepare_generation, level_seed
+from levelpack import LevelPackReader, _jsonl_line, write_level_pack
+from solver import _bubble_count
+
+# Bump this whenever the index layout changes. Levels are also tied to GENERATION_VERSION,
+# so levels from either an older layout or older generation are regenerated.
+INDEX_VERSION = 4
+
+
+@dataclass
+class DependencyIndex:
+    """What every level of a campaign was generated from, so later runs can tell which levels an edit affects.
+
+    Digests are shortened SHA-256 hashes of the reprs of elements, which cover every field of an element.
+
+    Parameters
+    ----------
+    master_seed : int or str
+        the master seed the levels were generated with
+    designs : dict
+        the digest of every DesignElement the levels were generated with, by name
+    fills : dict
+        the digest of every Fill the levels were generated with, by name
+    levels : dict
+        a record per level, keyed by (world, level, stars), holding the digest of the level's inputs ('inputs'),
+        of the elements its required names picked out ('queued'), of the names, costs and chance weights
+        of the designs and fills it could roll after its excludes ('pool'), and the names of the designs ('designs')
+        and the fill ('fill') it used
+    """
+    master_seed: object
+    designs: dict
+    fills: dict
+    levels: dict
+
+
+@dataclass
+class LevelUpdate:
+    """The result of update_levels.
+
+    Parameters
+    ----------
+    levels : list
+        a (world, level, stars, generated level) tuple per level, in the same order as the input
+    index : DependencyIndex
+        the dependencies of the updated levels, to pass to the next update
+    regenerated : dict
+        the reason every regenerated level was regenerated, keyed by (world, level, stars)
+    """
+    levels: list
+    index: DependencyIndex
+    regenerated: dict
+
+
+def plan_update(
+            levels, index, required=[], excludes=[], elements_set=None, fill_set=None,
+            config=GeneratorConfig(), only_required=False, master_seed=None, exact=True):
+    """Work out which levels have to be regenerated since the index was made, without generating anything.
+
+    A level has to be regenerated if it is new, if any of its inputs, such as its required, excludes or seed,
+    or the config changed, or if the elements its required names pick out changed. Beyond that:
+
+    - if one of the designs or the fill it used was edited or removed.
+    - with exact, also if the chances of its roll changed: a design or fill it could roll was added or removed,
+      or had its cost or chance_weight changed. The levels are then exactly the same as those of a full rebuild.
+      Edits to anything else of an element, such as its output, only affect the levels that used it.
+    - without exact, levels whose roll changed are kept, even though a full rebuild would roll them differently,
+      and added elements only turn up in levels that are regenerated for another reason.
+
+    Parameters
+    ----------
+    levels : iterable
+        the levels of the campaign, in any of the forms accepted by generate_levels
+    index : DependencyIndex
+        the index of the previous run, or None to regenerate every level
+    required, excludes, elements_set, fill_set, config, only_required : optional
+        see generate_levels
+    master_seed : int or str, optional
+        the master seed of the campaign, the one of the index if not provided (default is None)
+    exact : bool, optional
+        a flag used to regenerate every level whose roll could change, see above (default is True)
+
+    Returns
+    -------
+    dict
+        the reason every level that has to be regenerated has to be, keyed by (world, level, stars)
+    """
+    elements_set, fill_set = _default_sets(elements_set, fill_set)
+    if master_seed is None and index is not None:
+        master_seed = index.master_seed
+    plans = _plan_levels(levels, required, excludes, elements_set, fill_set, config, only_required, master_seed)
+    return _affected(plans, index, _element_digests(elements_set), _element_digests(fill_set), exact)
+
+def update_levels(
+            levels, previous, index=None, required=[], excludes=[], elements_set=None, fill_set=None,
+            config=GeneratorConfig(), only_required=False, master_seed=None, exact=True,
+            processes=1, chunk_size=64):
+    """Bring previously generated levels up to date with the current elements, only regenerating affected levels.
+
+    Every level gets its own seed from the master seed, see level_seed, so regenerated levels are the same
+    as a full rebuild would make them. See plan_update for which levels are regenerated.
+
+    Parameters
+    ----------
+    levels : iterable
+        the levels of the campaign, in any of the forms accepted by generate_levels
+    previous : dict
+        the previously generated levels, keyed by (world, level, stars); levels missing from it are regenerated
+    index : DependencyIndex, optional
+        the index returned with the previous levels, None to regenerate every level (default is None)
+    required, excludes, elements_set, fill_set, config, only_required : optional
+        see generate_levels
+    master_seed : int or str, optional
+        the master seed of the campaign, the one of the index if not provided; levels without a seed
+        of their own need one (default is None)
+    exact : bool, optional
+        see plan_update (default is True)
+    processes : int, optional
+        the number of worker processes to regenerate levels in, None to use every core (default is 1)
+    chunk_size : int, optional
+        the number of levels to send to a worker at once (default is 64)
+
+    Returns
+    -------
+    LevelUpdate
+        the updated levels, their new index and why each regenerated level was regenerated
+    """
+    elements_set, fill_set = _default_sets(elements_set, fill_set)
+    if master_seed is None and index is not None:
+        master_seed = index.master_seed
+    config = _worker_config(config)
+
+    plans = _plan_levels(levels, required, excludes, elements_set, fill_set, config, only_required, master_seed)
+    designs = _element_digests(elements_set)
+    fills = _element_digests(fill_set)
+    regenerated = _affected(plans, index, designs, fills, exact)
+    for plan in plans:
+        if plan.key not in regenerated and plan.key not in previous:
+            regenerated[plan.key] = 'missing from the previous levels'
+
+    entries = [plan.entry for plan in plans if plan.key in regenerated]
+    results = (result for chunk in _run_chunks(
+        _regenerate_chunk, _chunks(entries, chunk_size), (elements_set, fill_set, config), processes)
+        for result in chunk)
+
+    updated_levels = []
+    records = {}
+    for plan in plans:
+        if plan.key in regenerated:
+            generated_level, used_designs, used_fill = next(results)
+            records[plan.key] = {
+                'inputs': plan.inputs, 'queued': plan.queued, 'pool': plan.pool,
+                'designs': used_designs, 'fill': used_fill}
+        else:
+            generated_level = previous[plan.key]
+            records[plan.key] = index.levels[plan.key]
+        updated_levels.append((*plan.key, generated_level))
+
+    return LevelUpdate(
+        levels=updated_levels,
+        index=DependencyIndex(master_seed=master_seed, designs=designs, fills=fills, levels=records),
+        regenerated=regenerated)
+
+def update_campaign(
+            levels, output, master_seed=None, required=[], excludes=[], elements_set=None, fill_set=None,
+            config=GeneratorConfig(), only_required=False, exact=True, processes=1, chunk_size=64, dry_run=False):
+    """Update a campaign file in place, only regenerating the levels affected by changes since the last update.
+
+    The dependency index is kept next to the output in a '<output>.deps.json' file. Without one, or without
+    the output, every level is generated. The output is only replaced once every level is done.
+
+    Parameters
+    ----------
+    levels : iterable
+        the levels of the campaign, in any of the forms accepted by generate_levels, such as the output of read_campaign
+    output : str or path
+        the campaign file, its extension decides the format: .jsonl for JSON Lines or .blp for a level pack
+    master_seed : int or str, optional
+        the master seed of the campaign; the one of the index is used if not provided, or a random one if
+        there is no index (default is None)
+    required, excludes, elements_set, fill_set, config, only_required, exact, processes, chunk_size : optional
+        see update_levels
+    dry_run : bool, optional
+        a flag used to only work out which levels would be regenerated, without changing any files (default is False)
+
+    Returns
+    -------
+    dict
+        the reason every regenerated level was, or would be, regenerated, keyed by (world, level, stars)
+    """
+    levels = list(levels)
+    output_format = _output_format(output)
+    if output_format == 'pack' and config.return_string:
+        raise ValueError('Levels generated with return_string cannot be written to a level pack.')
+    index_path = f'{output}.deps.json'
+    index = load_index(index_path) if os.path.exists(index_path) else None
+    if master_seed is None and index is None:
+        master_seed = secrets.randbits(64)
+
+    if dry_run:
+        return plan_update(levels, index, required, excludes, elements_set, fill_set,
+                           config, only_required, master_seed, exact)
+
+    previous = _read_output(output, output_format) if os.path.exists(output) else {}
+    update = update_levels(
+        levels, previous, index, required, excludes, elements_set, fill_set,
+        config, only_required, master_seed, exact, processes, chunk_size)
+
+    # Write to a temporary file first, so an interrupted update leaves the previous campaign intact.
+    temporary_path = f'{output}.{os.getpid()}.tmp'
+    if output_format == 'jsonl':
+        with open(temporary_path, 'w', encoding='utf-8') as output_file:
+            for world, level, stars, generated_level in update.levels:
+                output_file.write(_jsonl_line(world, level, stars, generated_level))
+    else:
+        write_level_pack(update.levels, temporary_path, config)
+    os.replace(temporary_path, output)
+    save_index(update.index, index_path)
+    return update.regenerated
+
+def load_index(path):
+    """Read a DependencyIndex from a JSON file written by save_index."""
+    with open(path, 'r', encoding='utf-8') as index_file:
+        data = json.load(index_file)
+    if not isinstance(data, dict) or data.get('version') != INDEX_VERSION:
+        # Levels from an unknown version are simply all regenerated.
+        return DependencyIndex(master_seed=data.get('master_seed') if isinstance(data, dict) else None,
+                               designs={}, fills={}, levels={})
+    return DependencyIndex(
+        master_seed=data['master_seed'],
+        designs=data['designs'],
+        fills=data['fills'],
+        levels={(record.pop('world'), record.pop('level'), record.pop('stars')): record for record in data['levels']})
+
+def save_index(index, path):
+    """Write a DependencyIndex to a JSON file, replacing the previous one in one go."""
+    data = {
+        'version': INDEX_VERSION,
+        'master_seed': index.master_seed,
+        'designs': index.designs,
+        'fills': index.fills,
+        'levels': [{'world': world, 'level': level, 'stars': stars, **record}
+                   for (world, level, stars), record in index.levels.items()],
+        }
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as index_file:
+        json.dump(data, index_file, separators=(',', ':'))
+    os.replace(temporary_path, path)
+
+
+@dataclass
+class _LevelPlan:
+    """A level of the campaign with the digests of what it is generated from."""
+    key: tuple
+    entry: dict
+    inputs: str
+    queued: str
+    pool: str
+
+
+class _DependencyMonitor:
+    """Follows a level through _generate_from_setup and records the fill and designs it used."""
+
+    def __init__(self):
+        self.fill = None
+        self.designs = []
+
+    def record_selection(self, fill, queued_elements):
+        """Record the fill and elements picked for the level; elements that find no spot still used up the roll."""
+        self.fill = fill.name
+        self.designs = sorted({element.name for element in queued_elements})
+
+    def record_placement(self, element, legal_spots):
+        """Placements do not change what the level depends on."""
+
+    def record_fill_element(self, element):
+        """Elements applied as fills are already recorded with the selection."""
+
+    def reject_early(self, grid, queued_elements, position):
+        """Never abort a level."""
+        return False
+
+    def accept(self, grid):
+        """Keep every level."""
+        return True
+
+
+def _plan_levels(levels, required, excludes, elements_set, fill_set, config, only_required, master_seed):
+    """Return a _LevelPlan for every level, with its seed filled in and its filters worked out once per combination."""
+    bubble_config = dataclasses.replace(config, return_string=False, return_view=False)
+    filter_digests = {}
+    plans = []
+
+    for entry in levels:
+        world, level, stars, level_required, level_excludes, level_only_required, seed = _parse_level_entry(
+            entry, required, excludes, only_required)
+        if seed is None:
+            if master_seed is None:
+                raise ValueError('Updating levels needs a master_seed, or a seed for every level.')
+            seed = level_seed(master_seed, world, level, stars)
+
+        setup_key = (repr(list(level_required)), repr(list(level_excludes)))
+        if setup_key not in filter_digests:
+            setup = _prepare_generation(level_required, level_excludes, elements_set, fill_set, config)
+            filter_digests[setup_key] = (
+                _digest((setup.predefined_fill, setup.queued_elements)),
+                _digest(([_roll_fields(fill, False) for fill in setup.fills_to_roll],
+                         [_roll_fields(element, config.use_solver) for element in setup.elements_to_roll])))
+
+        plans.append(_LevelPlan(
+            key=(world, level, stars),
+            entry={'world': world, 'level': level, 'stars': stars, 'required': level_required,
+                   'excludes': level_excludes, 'only_required': level_only_required, 'seed': seed},
+            inputs=_digest((INDEX_VERSION, GENERATION_VERSION, world, level, stars, list(level_required), list(level_excludes),
+                            level_only_required, seed, bubble_config)),
+            queued=filter_digests[setup_key][0],
+            pool=filter_digests[setup_key][1]))
+    return plans
+
+def _affected(plans, index, designs, fills, exact):
+    """Return the reason every planned level that has to be regenerated has to be, keyed by (world, level, stars)."""
+    if index is None:
+        return {plan.key: 'no previous index' for plan in plans}
+
+    changed_designs = {name for name in index.designs.keys() | designs.keys()
+                       if index.designs.get(name) != designs.get(name)}
+    changed_fills = {name for name in index.fills.keys() | fills.keys() if index.fills.get(name) != fills.get(name)}
+
+    affected = {}
+    for plan in plans:
+        record = index.levels.get(plan.key)
+        if record is None:
+            affected[plan.key] = 'new level'
+        elif record['inputs'] != plan.inputs:
+            affected[plan.key] = 'inputs changed'
+        elif record['queued'] != plan.queued:
+            affected[plan.key] = 'required elements changed'
+        elif exact and record['pool'] != plan.pool:
+            affected[plan.key] = 'the chances of its roll changed'
+        elif record['fill'] in changed_fills:
+            affected[plan.key] = f"uses changed fill {record['fill']!r}"
+        else:
+            changed = [name for name in record['designs'] if name in changed_designs]
+            if changed:
+                affected[plan.key] = f'uses changed design {changed[0]!r}'
+    return affected
+
+def _regenerate_chunk(chunk, task):
+    """Generate a chunk of seeded levels, possibly inside a worker process, with the names of the elements each used."""
+    elements_set, fill_set, config = task
+    results = []
+    for world, level, stars, setup, only_required, rng in _level_entries(
+            chunk, [], [], elements_set, fill_set, config, False, None, None):
+        monitor = _DependencyMonitor()
+        generated_level = _generate_from_setup(setup, world, level, stars, only_required, config, rng, None, monitor)
+        results.append((generated_level, monitor.designs, monitor.fill))
+    return results
+
+def _roll_fields(element, use_solver):
+    """Return the fields of an element that change how it is rolled, the rest only matters if it is used."""
+    if use_solver:
+        return element.name, element.cost, element.chance_weight, _bubble_count(element)
+    return element.name, element.cost, element.chance_weight
+
+def _element_digests(elements):
+    """Return the digest of every element by name, combining elements that share a name."""
+    by_name = {}
+    for element in elements:
+        by_name.setdefault(element.name, []).append(element)
+    return {name: _digest(named) for name, named in by_name.items()}
+
+def _digest(value):
+    """Return a shortened SHA-256 hash of the repr of a value."""
+    return hashlib.sha256(repr(value).encode()).hexdigest()[:16]
+
+def _read_output(output, output_format):
+    """Read the levels of a campaign file, keyed by (world, level, stars)."""
+    previous = {}
+    if output_format == 'jsonl':
+        with open(output, 'r', encoding='utf-8') as output_file:
+            for line in output_file:
+                if line.strip():
+                    level = json.loads(line)
+                    previous[(level['world'], level['level'], level['stars'])] = level['grid']
+    else:
+        with LevelPackReader(output) as pack:
+            for key in pack:
+                level_bytes = pack.get_level_bytes(*key)
+                previous[key] = bytes(level_bytes)
+                level_bytes.release()
+    return previous
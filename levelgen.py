@@ -1,8 +1,20 @@
+import math
 from dataclasses import dataclass
+from time import perf_counter
 
-from consts import DESIGNS, FILLS
-from helpers import _apply_element, _apply_fill, _filter_list, _list_to_2D, \
-    _list_to_string, _weighted_roll, _2d_to_list
+import consts
+from colors import excluded_color_set, resolve_element_colors
+from helpers import _SpotTracker, _apply_element, _apply_fill, _blank_grid, _filter_list, _get_solver, \
+    _list_to_2D, _list_to_string, _plan_placements, _weighted_roll
+from sampler import WeightedSampler, resolve_rng
+from solver import DifficultySolver, _bubble_count
+
+# Bump this whenever generation changes in a way that changes the levels for the same inputs.
+# Cache keys, dependency indexes and campaign checkpoints include it, so levels from older versions are never reused.
+GENERATION_VERSION = 4
+# How many sets of elements the solver draws for a level before falling back to rolling elements,
+# when the elements of the sets cannot all be placed on the field.
+_SOLVE_TRIES = 8
 
 
 @dataclass
@@ -25,6 +37,20 @@ class GeneratorConfig:
         the maximum number of rows in your playing field
     return_string : bool, optional
         a flag used to return the output as one single string instead for compatibility reasons (default = False)
+    return_view : bool, optional
+        a flag used to return the rows as memoryviews over one compact bytearray instead of lists, which avoids
+        copying when you serialize large batches; ignored if return_string is True (default = False)
+    use_solver : bool, optional
+        a flag used to pick the design elements with a DifficultySolver, which spends the difficulty within
+        difficulty_tolerance, rather than rolling elements until the difficulty is spent. A set of elements is
+        only used once a spot on the field has been planned for every element, so all of them are placed;
+        falls back to rolling if no such set is found within a few draws (default = False)
+    difficulty_tolerance : int, optional
+        how far the solver may go over the difficulty of a level; with the default elements, which all cost
+        a multiple of 5, a tolerance of 0 almost always falls back to rolling (default = 0)
+    fill_scaling : str, optional
+        how fills laid out for another field size are fitted to the field: 'tile' repeats their rows and bubbles,
+        'stretch' scales them to the width and height of the field (default = 'tile')
     """
     base_difficulty: int = 20
     diff_per_level: int = 1
@@ -33,12 +59,16 @@ class GeneratorConfig:
     field_width: int = 8
     field_height: int = 8
     return_string: bool = False
+    return_view: bool = False
+    use_solver: bool = False
+    difficulty_tolerance: int = 0
+    fill_scaling: str = 'tile'
 
 
 def generate_level(
             world, level, stars=0,  required=[], excludes=[],
-            elements_set=DESIGNS, fill_set=FILLS, config=GeneratorConfig(),
-            only_required=False):
+            elements_set=None, fill_set=None, config=GeneratorConfig(),
+            only_required=False, rng=None, seed=None, telemetry=None):
     """Generate a level based on the provided designs and parameters.
     
     Generates a 2d Array or string that contains all of the integers for the level .JSON-file 
@@ -53,7 +83,7 @@ def generate_level(
     stars : int, optional
         the number of stars required to unlock the level, used to determine difficulty (default is 0)
     required : list, optional
-        a list of additional requirements for the method, this can be int for colors, and string for names or keywords (default is empty)
+        a list of additional requirements for the method, this can be int for colors from 0 to 127, and string for names or keywords (default is empty)
     excludes : list, optional
         a list of things to exclude from the generation, this can be int for colors, and string for names or keywords (default is empty)
     elements_set : list, optional
@@ -64,73 +94,389 @@ def generate_level(
         the configuration for this function (default is a default GeneratorConfig)
     only_required : bool, optional
         a flag used to make the function only use the specified requirements and no additions (default is False)
+    rng : random.Random or numpy.random.Generator, optional
+        the random number generator to use, pass a seeded one for reproducible levels (default is a new random.Random)
+    seed : int, str or bytes, optional
+        the seed for a new random.Random, storing this is enough to regenerate the exact same level
+        later on; cannot be combined with rng (default is None)
+    telemetry : GenerationTelemetry, optional
+        collects the time spent in each stage and counts such as elements that failed to place (default is None)
     """
+    rng = resolve_rng(rng, seed)
+    elements_set, fill_set = _default_sets(elements_set, fill_set)
+    setup = _prepare_generation(required, excludes, elements_set, fill_set, config)
+    return _generate_from_setup(setup, world, level, stars, only_required, config, rng, telemetry)
 
-    # Get total difficulty to spend on this level.
-    level_difficulty = (config.base_difficulty * world
-                        + config.diff_per_level * level 
-                        + config.diff_per_star * stars)
-    if level_difficulty <= config.minimum_difficulty:
-        level_difficulty = config.minimum_difficulty
-    spent_difficulty = 0
 
-    # Make bubble list, due to the nature of hex grids, 
-    # the field has a base width at even height numbers, 
-    # and width-1 at odd numbers.
-    bubble_list = []
-    for height in range(0, config.field_height):
-        if height % 2 == 0:
-            bubble_list += ([0] * config.field_width)
-        else:
-            bubble_list += ([0] * (config.field_width-1))
+def generate_levels(
+            levels, required=[], excludes=[],
+            elements_set=None, fill_set=None, config=GeneratorConfig(),
+            only_required=False, master_seed=None, rng=None, telemetry=None):
+    """Generate a batch of levels, such as a whole world or campaign, in one call.
 
-    # Select a fill either based on a pre-defined name 
-    # or from the constant, filtered or not.
-    fills_to_roll = []
-    selected_fill = None
+    Filtering the elements and fills, building the roll weights and making the blank
+    bubble list is only done once for every distinct combination of required and excludes,
+    after which it is reused for every level that shares that combination.
+
+    Parameters
+    ----------
+    levels : iterable
+        the levels to generate, either as (world, level) or (world, level, stars) tuples, or as
+        dicts with the keys 'world', 'level' and optionally 'stars', 'required', 'excludes',
+        'only_required' and 'seed' to override the defaults for that level, for instance rows from a campaign spreadsheet
+    required : list, optional
+        the default requirements for every level, see generate_level (default is empty)
+    excludes : list, optional
+        the default exclusions for every level, see generate_level (default is empty)
+    elements_set : list, optional
+        the list of DesignElements to incorporate (default is DESIGNS from consts.py)
+    fill_set : list, optional
+        the list of Fills to incorporate (default is FILLS from consts.py)
+    config : GeneratorConfig, optional
+        the configuration for this function (default is a default GeneratorConfig)
+    only_required : bool, optional
+        the default only_required flag for every level, see generate_level (default is False)
+    master_seed : int or str, optional
+        if provided, every level gets its own random number generator seeded with level_seed, which makes
+        each level reproducible no matter which other levels are generated with it (default is None)
+    rng : random.Random or numpy.random.Generator, optional
+        the random number generator to use for levels without a seed, cannot be combined with master_seed
+        (default is a new random.Random)
+    telemetry : GenerationTelemetry, optional
+        collects timings and counts over all of the levels, see generate_level (default is None)
+
+    Returns
+    -------
+    list
+        the generated levels, in the same order as the input
+    """
+    return [generated_level for _, _, _, generated_level in iter_levels(
+        levels, required=required, excludes=excludes, elements_set=elements_set, fill_set=fill_set,
+        config=config, only_required=only_required, master_seed=master_seed, rng=rng, telemetry=telemetry)]
+
+
+def iter_levels(
+            levels, required=[], excludes=[],
+            elements_set=None, fill_set=None, config=GeneratorConfig(),
+            only_required=False, master_seed=None, rng=None, telemetry=None):
+    """Lazily generate a batch of levels, one at a time.
+
+    Works the same as generate_levels and takes the same parameters, but only generates the next level
+    when it is asked for, so a whole campaign can be written to a file without keeping it in memory.
+    The levels input is consumed lazily as well.
+
+    Yields
+    ------
+    tuple
+        the world, level and stars of the level, followed by the generated level
+    """
+    for world, level, stars, setup, level_only_required, level_rng in _level_entries(
+            levels, required, excludes, elements_set, fill_set, config, only_required, master_seed, rng):
+        yield world, level, stars, _generate_from_setup(
+            setup, world, level, stars, level_only_required, config, level_rng, telemetry)
+
+
+def level_seed(master_seed, world, level, stars=0):
+    """Derive the seed for a single level from a master seed.
+
+    The seed only depends on its inputs, so the same level always gets the same seed,
+    no matter the order in which levels are generated or which process generates them.
+
+    Parameters
+    ----------
+    master_seed : int or str
+        the seed for the whole level pack
+    world : int
+        the number of the world
+    level : int
+        the number of the level
+    stars : int, optional
+        the number of stars required to unlock the level (default is 0)
+
+    Returns
+    -------
+    int
+        a 128-bit seed for random.Random
+    """
+    import hashlib
+
+    key = f'{master_seed!r}:{world}:{level}:{stars}'.encode()
+    return int.from_bytes(hashlib.blake2b(key, digest_size=16).digest(), 'big')
+
+
+@dataclass
+class _GenerationSetup:
+    """Everything generate_level needs that only depends on required, excludes and the sets."""
+    required: list
+    excludes: list
+    excluded_colors: frozenset
+    blank_list: bytearray
+    predefined_fill: object
+    fills_to_roll: list
+    fill_sampler: WeightedSampler
+    queued_elements: list
+    elements_to_roll: list
+    element_sampler: WeightedSampler
+    average_element_cost: float
+    solver: DifficultySolver
+    bubble_budget: int
+
+
+def _default_sets(elements_set, fill_set):
+    """Return the given sets, falling back to the default DESIGNS and FILLS, which are only loaded when first needed."""
+    if elements_set is None:
+        elements_set = consts.DESIGNS
+    if fill_set is None:
+        fill_set = consts.FILLS
+    return elements_set, fill_set
+
+
+def _level_entries(levels, required, excludes, elements_set, fill_set, config, only_required, master_seed, rng):
+    """Turn the levels of a batch into (world, level, stars, setup, only_required, rng) tuples, reusing setups."""
+    if master_seed is not None and rng is not None:
+        raise ValueError('Provide either an rng or a master_seed, not both.')
+    if master_seed is None:
+        rng = resolve_rng(rng)
+
+    elements_set, fill_set = _default_sets(elements_set, fill_set)
+    setups = {}
+
+    for entry in levels:
+        world, level, stars, level_required, level_excludes, level_only_required, seed = _parse_level_entry(
+            entry, required, excludes, only_required)
+
+        # Requirements and exclusions can hold both ints and strings, 
+        # so we key on their reprs to keep the order and types intact.
+        setup_key = (repr(list(level_required)), repr(list(level_excludes)))
+        if setup_key not in setups:
+            setups[setup_key] = _prepare_generation(
+                level_required, level_excludes, elements_set, fill_set, config)
+
+        # Seeded levels get their own generator, everything else shares one.
+        level_rng = rng
+        if seed is None and master_seed is not None:
+            seed = level_seed(master_seed, world, level, stars)
+        if seed is not None:
+            level_rng = resolve_rng(seed=seed)
+
+        yield world, level, stars, setups[setup_key], level_only_required, level_rng
+
+
+def _parse_level_entry(entry, required, excludes, only_required):
+    """Return the world, level, stars, required, excludes, only_required and seed of a batch entry, using the defaults for anything it leaves out."""
+    if isinstance(entry, dict):
+        return (entry['world'], entry['level'], entry.get('stars', 0), entry.get('required', required),
+                entry.get('excludes', excludes), entry.get('only_required', only_required), entry.get('seed'))
+
+    world, level, stars = (tuple(entry) + (0,))[:3]
+    return world, level, stars, required, excludes, only_required, None
+
+def _prepare_generation(required, excludes, elements_set, fill_set, config):
+    """Do all of the work for a level that does not depend on world, level or stars."""
+    # Required colors end up in the encoded outputs, where values from VARIABLE_BASE onwards are letter variables.
+    for entry in required:
+        if isinstance(entry, int) and not isinstance(entry, bool) and not 0 <= entry < consts.VARIABLE_BASE:
+            raise ValueError(f'Required colors must be ints from 0 to {consts.VARIABLE_BASE - 1}, got {entry!r}.')
+
+    # Make the bubble grid, stored as one byte per bubble.
+    blank_list = _blank_grid(config)
 
     # See if we have a fill defined. 
     # We can only use one fill, so we stop as soon as we find one pre-defined.
+    predefined_fill = None
     for fill in fill_set:
         if fill.name in required:
-            selected_fill = fill
+            predefined_fill = fill
             break
-    
+
     # If we have no pre-defined fills, filter the list of fills 
-    # using the excluding keywords, and roll on the result.
-    if selected_fill is None:
+    # using the excluding keywords, so we can roll on the result.
+    fills_to_roll = []
+    if predefined_fill is None:
         fills_to_roll = _filter_list(excludes, fill_set)
-        selected_fill = _weighted_roll(fills_to_roll)
-    spent_difficulty += selected_fill.cost
 
-    # Take the required names and queue all elements that are predefined, then apply them.
+    # Take the required names and queue all elements that are predefined.
     queued_elements = []
     for element in elements_set:
         if element.name in required:
-            spent_difficulty += element.cost
             queued_elements.append(element)
 
-    # Roll design elements and add the cost to what we have spent.
     elements_to_roll = _filter_list(excludes, elements_set)
-    while spent_difficulty < level_difficulty and not only_required:
-        selected_element = _weighted_roll(elements_to_roll)
-        spent_difficulty += selected_element.cost
-        queued_elements.append(element)
-    
-    # Apply all of the queued elements.
+    element_sampler = WeightedSampler(elements_to_roll)
+
+    # The average cost of a roll lets us guess how many elements we need to spend a budget.
+    average_element_cost = 0
+    if len(elements_to_roll) != 0:
+        average_element_cost = sum(
+            weight * element.cost for weight, element in zip(element_sampler.weights, elements_to_roll)
+            ) / element_sampler.total_weight
+
+    # The solver may only use the bubbles the required elements leave free.
+    solver = None
+    bubble_budget = 0
+    if config.use_solver:
+        solver = _get_solver(excludes, elements_set)
+        bubble_budget = max(0, len(blank_list) - sum(_bubble_count(element) for element in queued_elements))
+
+    return _GenerationSetup(
+        required=required,
+        excludes=excludes,
+        excluded_colors=excluded_color_set(excludes),
+        blank_list=blank_list,
+        predefined_fill=predefined_fill,
+        fills_to_roll=fills_to_roll,
+        fill_sampler=WeightedSampler(fills_to_roll),
+        queued_elements=queued_elements,
+        elements_to_roll=elements_to_roll,
+        element_sampler=element_sampler,
+        average_element_cost=average_element_cost,
+        solver=solver,
+        bubble_budget=bubble_budget)
+
+
+def _generate_from_setup(setup, world, level, stars, only_required, config, rng, telemetry=None, monitor=None):
+    """Generate a single level using the work done by _prepare_generation.
+
+    A monitor, see validation.py, is told which fill and elements were picked and about every placement
+    like telemetry. It can abort the level during placement or once it is filled, in which case None
+    is returned instead of the level.
+    """
+    # Telemetry is checked for explicitly everywhere, so it costs nothing when it is not used.
+    if telemetry is not None:
+        stage_start = perf_counter()
+
+    # Get total difficulty to spend on this level.
+    level_difficulty = (config.base_difficulty * world
+                        + config.diff_per_level * level 
+                        + config.diff_per_star * stars)
+    if level_difficulty <= config.minimum_difficulty:
+        level_difficulty = config.minimum_difficulty
+    spent_difficulty = 0
+
+    bubble_list = setup.blank_list.copy()
+
+    if telemetry is not None:
+        stage_start = telemetry.lap('difficulty', stage_start)
+
+    # Use the pre-defined fill if we have one, otherwise roll on the filtered fills.
+    selected_fill = setup.predefined_fill
+    if selected_fill is None:
+        selected_fill = _weighted_roll(setup.fills_to_roll, setup.fill_sampler, rng)
+    spent_difficulty += selected_fill.cost
+
+    if telemetry is not None:
+        stage_start = telemetry.lap('fill_selection', stage_start)
+
+    # Take the queued required elements and add their cost to what we have spent.
+    queued_elements = setup.queued_elements.copy()
     for element in queued_elements:
+        spent_difficulty += element.cost
+
+    # Let the solver pick elements that spend the rest of the budget, if it is used. Its bubble budget
+    # does not know where elements may go, so the picked elements are only used once a spot has been
+    # planned for every queued element; otherwise it draws again, a few times at most.
+    solved_elements = None
+    placements = None
+    if setup.solver is not None and not only_required:
+        for _ in range(_SOLVE_TRIES):
+            drawn_elements = setup.solver.solve(
+                level_difficulty - spent_difficulty, config.difficulty_tolerance, setup.bubble_budget, rng)
+            if drawn_elements is None:
+                break
+            placements = _plan_placements(queued_elements + drawn_elements, bubble_list, config, rng)
+            if placements is not None:
+                solved_elements = drawn_elements
+                break
+        if telemetry is not None:
+            telemetry.record_solve(solved_elements is not None)
+
+    if solved_elements is not None:
+        for selected_element in solved_elements:
+            spent_difficulty += selected_element.cost
+            queued_elements.append(selected_element)
+
+    # Otherwise roll design elements in batches and add the cost to what we have spent,
+    # stopping as soon as the budget is spent.
+    while solved_elements is None and spent_difficulty < level_difficulty and not only_required:
+        batch_size = 1
+        if setup.average_element_cost > 0:
+            batch_size = max(1, math.ceil((level_difficulty - spent_difficulty) / setup.average_element_cost))
+
+        for selected_element in setup.element_sampler.sample(batch_size, rng):
+            spent_difficulty += selected_element.cost
+            queued_elements.append(selected_element)
+            if spent_difficulty >= level_difficulty:
+                break
+
+    if telemetry is not None:
+        stage_start = telemetry.lap('element_rolling', stage_start)
+    
+    # Pick the colors for every queued element at once. Elements treated as fills pick
+    # theirs when they are applied, as they depend on the colors already on the field.
+    color_tables = resolve_element_colors(
+        [element for element in queued_elements if not element.treat_as_fill], setup.excluded_colors, rng)
+
+    if telemetry is not None:
+        stage_start = telemetry.lap('color_resolution', stage_start)
+
+    # Give up on the level before placing anything if the monitor can already tell it will not do.
+    placement_telemetry = telemetry
+    if monitor is not None:
+        monitor.record_selection(selected_fill, queued_elements)
+        if monitor.reject_early(bubble_list, queued_elements, 0):
+            return None
+        placement_telemetry = monitor
+
+    # Apply all of the queued elements at their planned spots, or otherwise keeping their legal spots
+    # up to date rather than searching the field every time.
+    color_tables = iter(color_tables)
+    spot_tracker = _SpotTracker() if placements is None else None
+    for position, element in enumerate(queued_elements):
         if element.treat_as_fill:
-            bubble_list = _apply_fill(element, bubble_list, config)
+            bubble_list = _apply_fill(
+                element, bubble_list, setup.excluded_colors, setup.required, config, rng, spot_tracker)
+            if monitor is not None:
+                monitor.record_fill_element(element)
         else:
-            bubble_list = _apply_element(element, bubble_list, config)
+            bubble_list = _apply_element(
+                element, bubble_list, config, rng, placement_telemetry, next(color_tables), spot_tracker,
+                None if placements is None else placements[position])
+
+        if monitor is not None and monitor.reject_early(bubble_list, queued_elements, position + 1):
+            return None
+
+    if telemetry is not None:
+        stage_start = telemetry.lap('placement', stage_start)
 
     # Apply the fill to our level
-    bubble_list = _apply_fill(selected_fill, bubble_list, excludes, required, config)
+    bubble_list = _apply_fill(selected_fill, bubble_list, setup.excluded_colors, setup.required, config, rng)
+
+    if telemetry is not None:
+        stage_start = telemetry.lap('fill_application', stage_start)
+
+    if monitor is not None and not monitor.accept(bubble_list):
+        return None
 
     if config.return_string: # Give output as one string.
-        return _list_to_string(bubble_list)
+        level_to_return = _list_to_string(bubble_list)
     else: # Give output as 2D List.
-        return _list_to_2D(bubble_list, config)
+        level_to_return = _list_to_2D(bubble_list, config, config.return_view)
+
+    if telemetry is not None:
+        telemetry.lap('output', stage_start)
+        telemetry.levels += 1
+        telemetry.elements_required += len(setup.queued_elements)
+        telemetry.elements_rolled += len(queued_elements) - len(setup.queued_elements)
+        telemetry.difficulty_budget += level_difficulty
+        telemetry.difficulty_spent += spent_difficulty
+        telemetry.fills[selected_fill.name] += 1
+
+    return level_to_return
+
 
 
-_2d_to_list(DESIGNS[5], GeneratorConfig())
\ No newline at end of file
+if __name__ == '__main__':
+    # Running `python -m levelgen <command>` hands over to the command line interface.
+    import sys
+    from cli import main
+    sys.exit(main())
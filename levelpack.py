@@ -0,0 +1,230 @@
+import json
+import mmap
+import struct
+from itertools import chain
+
+from helpers import _row_offsets
+
+# Level pack layout, all numbers little-endian:
+#
+#   header  magic (8 bytes), version, field_width, field_height, reserved (uint16 each),
+#           level count and index offset (uint64 each)
+#   data    every level as one byte per bubble, rows in order, each level the same size
+#   index   one entry per level sorted by (world, level, stars): world, level, stars (uint32 each)
+#           and the offset of the level's data from the start of the file (uint64)
+#
+# Sorting the index allows finding any level with a binary search straight from the file.
+PACK_MAGIC = b'BLVLPACK'
+PACK_VERSION = 1
+_HEADER = struct.Struct('<8sHHHHQQ')
+_INDEX_ENTRY = struct.Struct('<IIIQ')
+
+
+class LevelPackReader:
+    """Gives random access to the levels in a level pack without loading it.
+
+    The pack is memory-mapped read-only, so opening it only reads the header, and levels
+    are returned as memoryviews straight into the file without copying or parsing anything.
+    Any number of readers, in any number of processes, can have the same pack open at once;
+    the operating system shares the mapped pages between them.
+
+    Levels returned by the reader can be kept after it is closed, for instance after leaving a with block;
+    the file then stays mapped until the last of them is released or garbage collected.
+
+    Parameters
+    ----------
+    path : str or path
+        the level pack to open
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as pack_file:
+            self._map = mmap.mmap(pack_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._map) < _HEADER.size:
+            self._map.close()
+            raise ValueError(f'{path} is not a level pack.')
+        magic, version, self.field_width, self.field_height, _, self.level_count, self._index_offset = \
+            _HEADER.unpack_from(self._map, 0)
+        if magic != PACK_MAGIC:
+            self._map.close()
+            raise ValueError(f'{path} is not a level pack.')
+        if version != PACK_VERSION:
+            self._map.close()
+            raise ValueError(f'{path} is a version {version} level pack, expected version {PACK_VERSION}.')
+
+        self._row_offsets = _row_offsets(self.field_width, self.field_height)
+        self._view = memoryview(self._map)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.level_count
+
+    def __contains__(self, key):
+        return self._find(*key) is not None
+
+    def __getitem__(self, key):
+        return self.get_level(*key)
+
+    def __iter__(self):
+        """Iterate over the (world, level, stars) of every level in the pack, in sorted order."""
+        for position in range(self.level_count):
+            yield self._index_entry(position)[:3]
+
+    def close(self):
+        """Close the pack, or leave unmapping it to the garbage collector if levels from it are still in use."""
+        if self._map is None:
+            return
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # Memoryviews into the map are still in use. Dropping our reference unmaps the file once they are gone.
+            pass
+        self._map = None
+
+    def get_level(self, world, level, stars=None):
+        """Return a level as a list of rows, the same shape generate_level returns.
+
+        The rows are read-only memoryviews into the pack. If stars is not provided, the level
+        with the fewest stars for this world and level is returned.
+
+        Raises a KeyError if the level is not in the pack.
+        """
+        level_bytes = self.get_level_bytes(world, level, stars)
+        return [level_bytes[start:end] for start, end in zip(self._row_offsets, self._row_offsets[1:])]
+
+    def get_level_bytes(self, world, level, stars=None):
+        """Return a level as one read-only memoryview with one byte per bubble.
+
+        Raises a KeyError if the level is not in the pack.
+        """
+        offset = self._find(world, level, stars)
+        if offset is None:
+            raise KeyError((world, level, stars))
+        return self._view[offset:offset + self._row_offsets[-1]]
+
+    def _find(self, world, level, stars=None):
+        """Binary search the index for a level and return the offset of its data, or None."""
+        key = (world, level, 0 if stars is None else stars)
+        low = 0
+        high = self.level_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._index_entry(middle)[:3] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low == self.level_count:
+            return None
+        entry = self._index_entry(low)
+        if entry[:2] != (world, level) or (stars is not None and entry[2] != stars):
+            return None
+        return entry[3]
+
+    def _index_entry(self, position):
+        """Return the index entry at a position in the index."""
+        return _INDEX_ENTRY.unpack_from(self._map, self._index_offset + position * _INDEX_ENTRY.size)
+
+
+def write_jsonl(levels, file):
+    """Write levels to a JSON Lines file, one level per line, as they come in.
+
+    Parameters
+    ----------
+    levels : iterable
+        (world, level, stars, generated level) tuples, such as the output of iter_levels
+    file : str, path or file object
+        where to write to; file objects should be opened in text mode
+
+    Returns
+    -------
+    int
+        the number of levels written
+    """
+    if hasattr(file, 'write'):
+        return _write_jsonl(levels, file)
+    with open(file, 'w', encoding='utf-8') as opened_file:
+        return _write_jsonl(levels, opened_file)
+
+def write_level_pack(levels, path, config):
+    """Write levels to a binary level pack, one byte per bubble, as they come in.
+
+    Only the small index is kept in memory while writing, so packs can be much larger than memory.
+    Use LevelPackReader to read levels back from the pack.
+
+    Parameters
+    ----------
+    levels : iterable
+        (world, level, stars, generated level) tuples, such as the output of iter_levels;
+        levels can be given as 2D lists, lists of memoryviews or as one flat list of bubbles
+    path : str or path
+        the file to write the level pack to
+    config : GeneratorConfig
+        the configuration the levels were generated with, used for the field size
+
+    Returns
+    -------
+    int
+        the number of levels written
+    """
+    level_size = _row_offsets(config.field_width, config.field_height)[-1]
+    index = []
+
+    with open(path, 'wb') as pack_file:
+        # Leave room for the header, which we can only fill in at the end.
+        pack_file.write(bytes(_HEADER.size))
+        offset = _HEADER.size
+
+        for world, level, stars, generated_level in levels:
+            level_bytes = _level_to_bytes(generated_level)
+            if len(level_bytes) != level_size:
+                raise ValueError(
+                    f'Level {world}-{level} has {len(level_bytes)} bubbles, expected {level_size}.')
+
+            pack_file.write(level_bytes)
+            index.append((world, level, stars, offset))
+            offset += level_size
+
+        index.sort()
+        for position in range(1, len(index)):
+            if index[position][:3] == index[position - 1][:3]:
+                raise ValueError(f'Level {index[position][:3]} is in the pack more than once.')
+
+        for entry in index:
+            pack_file.write(_INDEX_ENTRY.pack(*entry))
+
+        pack_file.seek(0)
+        pack_file.write(_HEADER.pack(
+            PACK_MAGIC, PACK_VERSION, config.field_width, config.field_height, 0, len(index), offset))
+
+    return len(index)
+
+def _level_to_bytes(generated_level):
+    """Turn a generated level into one byte per bubble."""
+    if isinstance(generated_level, str):
+        raise TypeError('Levels generated with return_string cannot be written to a level pack.')
+    if len(generated_level) != 0 and not isinstance(generated_level[0], int):
+        return bytes(chain.from_iterable(generated_level))
+    return bytes(generated_level)
+
+def _write_jsonl(levels, opened_file):
+    """Write the levels to an already opened text file."""
+    written = 0
+    for world, level, stars, generated_level in levels:
+        opened_file.write(_jsonl_line(world, level, stars, generated_level))
+        written += 1
+    return written
+
+def _jsonl_line(world, level, stars, generated_level):
+    """Return the JSON Lines line of a single level, including the newline."""
+    if not isinstance(generated_level, str):
+        generated_level = [list(row) for row in generated_level]
+    return json.dumps(
+        {'world': world, 'level': level, 'stars': stars, 'grid': generated_level}, separators=(',', ':')) + '\n'
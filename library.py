@@ -0,0 +1,287 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import pickle
+from dataclasses import dataclass, fields
+
+from catalog import ElementCatalog, _remember_catalog
+from colors import BASIC_COLORS
+from consts import VARIABLE_BASE, DesignElement, Fill
+
+# Bump this whenever the compiled cache layout changes, so old caches are ignored.
+_CACHE_VERSION = 5
+_DEFAULT_CACHE_DIR = '.levelgen_cache'
+
+
+class LibraryError(ValueError):
+    """Raised when an element library file cannot be read or contains invalid entries."""
+
+
+@dataclass
+class ElementLibrary:
+    """DesignElements and Fills loaded from a library file, with their compiled catalogs.
+
+    Pass designs and fills as the elements_set and fill_set of generate_level; the catalogs
+    are already registered, so filtering them needs no further work.
+
+    Parameters
+    ----------
+    designs : list
+        the DesignElements in the library
+    fills : list
+        the Fills in the library
+    design_catalog : ElementCatalog
+        the compiled catalog of the designs
+    fill_catalog : ElementCatalog
+        the compiled catalog of the fills
+    digest : str
+        the SHA-256 hash of the library file's contents
+    """
+    designs: list
+    fills: list
+    design_catalog: ElementCatalog
+    fill_catalog: ElementCatalog
+    digest: str
+
+
+def load_library(path, cache_dir=_DEFAULT_CACHE_DIR):
+    """Load DesignElements and Fills from a JSON, TOML or CSV file.
+
+    JSON and TOML files hold a 'designs' and a 'fills' list of tables, with the same fields as
+    the DesignElement and Fill dataclasses. CSV files, for instance exported from a spreadsheet,
+    hold one element per row with a 'kind' column that is either 'design' or 'fill'; keywords and
+    allowed_colors are separated by spaces, and outputs use spaces between bubbles and '|' between rows,
+    e.g. '0 A A | A 97 A'.
+
+    Every entry is validated when the file is parsed. The compiled result is then written to a cache
+    keyed by the hash of the file's contents, so loading the same file again skips parsing and compiling.
+
+    Parameters
+    ----------
+    path : str or path
+        the library file, its extension decides the format (.json, .toml or .csv)
+    cache_dir : str or path, optional
+        the directory for compiled caches; relative paths are relative to the library file,
+        and None turns caching off (default = '.levelgen_cache')
+
+    Returns
+    -------
+    ElementLibrary
+        the loaded library
+    """
+    with open(path, 'rb') as library_file:
+        contents = library_file.read()
+    digest = hashlib.sha256(contents).hexdigest()
+
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(
+            os.path.dirname(os.path.abspath(path)), cache_dir,
+            f'{digest}-v{_CACHE_VERSION}.pickle')
+        library = _read_cache(cache_path)
+        if library is not None:
+            return library
+
+    designs, fills = _parse_library(path, contents)
+    library = ElementLibrary(
+        designs=designs,
+        fills=fills,
+        design_catalog=ElementCatalog(designs),
+        fill_catalog=ElementCatalog(fills),
+        digest=digest)
+    _register(library)
+
+    if cache_path is not None:
+        _write_cache(cache_path, library)
+    return library
+
+def _register(library):
+    """Make the library's own lists point at its catalogs and let get_catalog find them."""
+    library.designs = library.design_catalog.elements
+    library.fills = library.fill_catalog.elements
+    _remember_catalog(library.design_catalog)
+    _remember_catalog(library.fill_catalog)
+
+def _read_cache(cache_path):
+    """Return the library from a cache file, or None if there is no usable cache."""
+    try:
+        with open(cache_path, 'rb') as cache_file:
+            library = pickle.load(cache_file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+
+    if not isinstance(library, ElementLibrary):
+        return None
+    _register(library)
+    return library
+
+def _write_cache(cache_path, library):
+    """Write the compiled library to a cache file; failing to do so is not an error."""
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Write to a temporary file first, so other processes never see a half written cache.
+        temporary_path = f'{cache_path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'wb') as cache_file:
+            pickle.dump(library, cache_file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, cache_path)
+    except OSError:
+        pass
+
+def _parse_library(path, contents):
+    """Parse the contents of a library file into lists of DesignElements and Fills."""
+    extension = os.path.splitext(str(path))[1].lower()
+    try:
+        if extension == '.json':
+            tables = json.loads(contents)
+        elif extension == '.toml':
+            try:
+                import tomllib
+            except ImportError:
+                raise LibraryError('Reading TOML libraries requires Python 3.11 or newer.') from None
+            tables = tomllib.loads(contents.decode('utf-8'))
+        elif extension == '.csv':
+            tables = _csv_to_tables(contents.decode('utf-8-sig'))
+        else:
+            raise LibraryError(f'{path}: unknown library format {extension!r}, use .json, .toml or .csv.')
+    except LibraryError:
+        raise
+    except (ValueError, csv.Error) as error:
+        raise LibraryError(f'{path}: {error}') from error
+
+    if not isinstance(tables, dict) or not set(tables) <= {'designs', 'fills'}:
+        raise LibraryError(f"{path}: expected only a 'designs' and a 'fills' list.")
+
+    designs = [_build_entry(DesignElement, table, f'{path}: design {number}')
+               for number, table in enumerate(tables.get('designs', []), 1)]
+    fills = [_build_entry(Fill, table, f'{path}: fill {number}')
+             for number, table in enumerate(tables.get('fills', []), 1)]
+
+    for entries in (designs, fills):
+        names = set()
+        for entry in entries:
+            if entry.name in names:
+                raise LibraryError(f'{path}: the name {entry.name!r} is used more than once.')
+            names.add(entry.name)
+
+    return designs, fills
+
+def _csv_to_tables(text):
+    """Turn the rows of a CSV library into design and fill tables."""
+    tables = {'designs': [], 'fills': []}
+    for line_number, row in enumerate(csv.DictReader(io.StringIO(text)), 2):
+        # Ignore empty cells, so spreadsheets can leave optional columns blank.
+        row = {key.strip(): value.strip() for key, value in row.items() if key and value and value.strip()}
+        if not row:
+            continue
+
+        kind = row.pop('kind', '')
+        if kind not in ('design', 'fill'):
+            raise LibraryError(f"line {line_number}: kind must be 'design' or 'fill', got {kind!r}.")
+
+        table = {'keywords': []}
+        for key, value in row.items():
+            if key in ('cost', 'chance_weight', 'y_min', 'y_max', 'field_width', 'field_height'):
+                table[key] = _parse_csv_int(value, key, line_number)
+            elif key in ('treat_as_fill', 'override'):
+                table[key] = value.lower() in ('1', 'true', 'yes', 'y')
+            elif key == 'keywords':
+                table[key] = value.split()
+            elif key == 'allowed_colors':
+                table[key] = [_parse_csv_int(color, key, line_number) for color in value.split()]
+            else:
+                table[key] = value
+
+        # Design outputs are split into rows, fills and designs treated as fills are one long list.
+        if 'output' in table:
+            rows = [[_parse_csv_bubble(bubble) for bubble in output_row.split()]
+                    for output_row in table['output'].split('|')]
+            if kind == 'design' and not table.get('treat_as_fill', False):
+                table['output'] = rows
+            else:
+                table['output'] = [bubble for output_row in rows for bubble in output_row]
+
+        tables['designs' if kind == 'design' else 'fills'].append(table)
+    return tables
+
+def _parse_csv_int(value, key, line_number):
+    """Parse an integer cell of a CSV library."""
+    try:
+        return int(value)
+    except ValueError:
+        raise LibraryError(f'line {line_number}: {key} must be a whole number, got {value!r}.') from None
+
+def _parse_csv_bubble(bubble):
+    """Parse a bubble from a CSV output cell, which is either a color int or a letter variable."""
+    return int(bubble) if bubble.lstrip('-').isdigit() else bubble
+
+def _build_entry(entry_class, table, location):
+    """Validate a table and turn it into a DesignElement or Fill."""
+    if not isinstance(table, dict):
+        raise LibraryError(f'{location}: expected a table of fields.')
+
+    known_fields = {entry_field.name for entry_field in fields(entry_class)}
+    unknown_fields = set(table) - known_fields
+    if unknown_fields:
+        raise LibraryError(f'{location}: unknown fields {sorted(unknown_fields)}.')
+    # Check the lists before building the entry, as building it turns them into tuples and encodes the output.
+    if not isinstance(table.get('keywords', []), list):
+        raise LibraryError(f'{location}: keywords must be a list of strings.')
+    for flag_field in ('treat_as_fill', 'override'):
+        if not isinstance(table.get(flag_field, False), bool):
+            raise LibraryError(f'{location}: {flag_field} must be true or false.')
+    if entry_class is DesignElement:
+        allowed_colors = table.get('allowed_colors', [])
+        if not isinstance(allowed_colors, list) or not all(
+                isinstance(color, int) and not isinstance(color, bool) and 0 <= color < VARIABLE_BASE
+                for color in allowed_colors):
+            raise LibraryError(f'{location}: allowed_colors must be a list of ints from 0 to {VARIABLE_BASE - 1}.')
+        for position_field in ('y_min', 'y_max'):
+            value = table.get(position_field, 0)
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                raise LibraryError(f'{location}: {position_field} must be a whole number of at least 0.')
+        if table.get('y_max', 0) != 0 and table.get('y_min', 0) > table['y_max']:
+            raise LibraryError(f'{location}: y_min must not be more than y_max, unless y_max is 0.')
+    output = table.get('output')
+    if not isinstance(output, list) or len(output) == 0:
+        raise LibraryError(f'{location}: output must be a non-empty list.')
+    is_2d = entry_class is DesignElement and not table.get('treat_as_fill', False)
+    if is_2d:
+        if not all(isinstance(row, list) and len(row) != 0 for row in output):
+            raise LibraryError(f'{location}: the output of a design must be a list of non-empty rows.')
+        bubbles = [bubble for row in output for bubble in row]
+    else:
+        bubbles = output
+    for bubble in bubbles:
+        if isinstance(bubble, str):
+            if bubble == '' or not bubble.isalpha():
+                raise LibraryError(f'{location}: letter variables must be letters, got {bubble!r}.')
+        elif not isinstance(bubble, int) or isinstance(bubble, bool) or not 0 <= bubble < VARIABLE_BASE:
+            raise LibraryError(
+                f'{location}: bubbles must be ints from 0 to {VARIABLE_BASE - 1} or letters, got {bubble!r}.')
+
+    try:
+        entry = entry_class(**table)
+    except (TypeError, ValueError) as error:
+        raise LibraryError(f'{location}: {error}') from None
+
+    if not isinstance(entry.name, str) or entry.name == '':
+        raise LibraryError(f'{location}: name must be a non-empty string.')
+    location = f'{location} ({entry.name})'
+    for number_field in ('cost', 'chance_weight'):
+        value = getattr(entry, number_field)
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            raise LibraryError(f'{location}: {number_field} must be a whole number of at least 0.')
+    if not all(isinstance(keyword, str) for keyword in entry.keywords):
+        raise LibraryError(f'{location}: keywords must be a list of strings.')
+    for size_field in ('field_width', 'field_height'):
+        value = getattr(entry, size_field)
+        if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+            raise LibraryError(f'{location}: {size_field} must be a whole number of at least 1.')
+
+    if entry_class is DesignElement:
+        if len(entry.variables) > len(entry.allowed_colors or BASIC_COLORS):
+            raise LibraryError(f'{location}: there are more letter variables than colors to pick from.')
+
+    return entry
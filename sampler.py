@@ -0,0 +1,145 @@
+import random
+
+
+class WeightedSampler:
+    """Draws elements from a list with chances based on their chance_weight.
+
+    Builds Walker/Vose alias tables once, after which every draw takes constant time
+    no matter how many elements are in the list. Build one per filtered list and reuse it.
+
+    Parameters
+    ----------
+    elements : list
+        the list of DesignElements or Fills to draw from
+    weights : list, optional
+        the weight of each element, taken from each element's chance_weight if not provided
+    """
+
+    def __init__(self, elements, weights=None):
+        self.elements = list(elements)
+        if weights is None:
+            weights = [element.chance_weight for element in self.elements]
+        else:
+            weights = list(weights)
+
+        if len(weights) != len(self.elements):
+            raise ValueError('Expected one weight per element.')
+        if any(weight < 0 for weight in weights):
+            raise ValueError('Chance weights cannot be negative.')
+
+        # If nothing has any weight, give everything an equal chance instead.
+        total_weight = sum(weights)
+        if total_weight == 0:
+            weights = [1] * len(weights)
+            total_weight = len(weights)
+
+        self.weights = weights
+        self.total_weight = total_weight
+        self._probabilities, self._aliases = _build_alias_tables(weights, total_weight)
+
+    def __len__(self):
+        return len(self.elements)
+
+    def roll(self, rng=None):
+        """Return a single randomly drawn element, see resolve_rng for the accepted rngs."""
+        if len(self.elements) == 0:
+            raise IndexError('Cannot roll on an empty list of elements.')
+        rng = resolve_rng(rng)
+
+        index = int(rng.random() * len(self.elements))
+        if rng.random() < self._probabilities[index]:
+            return self.elements[index]
+        return self.elements[self._aliases[index]]
+
+    def sample(self, k, rng=None):
+        """Return a list of k randomly drawn elements, drawn with replacement, see resolve_rng for the accepted rngs."""
+        if len(self.elements) == 0:
+            raise IndexError('Cannot roll on an empty list of elements.')
+        rng = resolve_rng(rng)
+
+        elements = self.elements
+        probabilities = self._probabilities
+        aliases = self._aliases
+        count = len(elements)
+        draw = rng.random
+
+        samples = []
+        for _ in range(k):
+            index = int(draw() * count)
+            if draw() < probabilities[index]:
+                samples.append(elements[index])
+            else:
+                samples.append(elements[aliases[index]])
+        return samples
+
+
+def resolve_rng(rng=None, seed=None):
+    """Return a random number generator with the randint, random and choice methods of random.Random.
+
+    Parameters
+    ----------
+    rng : random.Random or numpy.random.Generator, optional
+        the generator to use; random.Random instances and the random module itself are used as-is,
+        NumPy Generators are wrapped. If not provided, a new random.Random is made (default is None)
+    seed : int, str or bytes, optional
+        the seed for the new random.Random if no rng is provided, for instance a 16-byte seed stored
+        per level (default is None, which seeds from the operating system)
+    """
+    if rng is not None:
+        if seed is not None:
+            raise ValueError('Provide either an rng or a seed, not both.')
+        if hasattr(rng, 'randint'):
+            return rng
+        if hasattr(rng, 'integers'):
+            return _NumpyRandom(rng)
+        raise TypeError(f'Unsupported random number generator: {rng!r}')
+
+    return random.Random(seed)
+
+class _NumpyRandom:
+    """Wraps a NumPy Generator so it can be used wherever a random.Random is expected."""
+
+    def __init__(self, generator):
+        self.generator = generator
+
+    def random(self):
+        return float(self.generator.random())
+
+    def randint(self, a, b):
+        return int(self.generator.integers(a, b, endpoint=True))
+
+    def choice(self, seq):
+        if len(seq) == 0:
+            raise IndexError('Cannot choose from an empty sequence')
+        return seq[self.randint(0, len(seq) - 1)]
+
+def _build_alias_tables(weights, total_weight):
+    """Build the probability and alias tables for Vose's alias method."""
+    count = len(weights)
+    probabilities = [0.0] * count
+    aliases = list(range(count))
+
+    # Scale the weights so the average is 1, then pair every under-full
+    # column with an over-full one until every column is exactly full.
+    scaled = [weight * count / total_weight for weight in weights]
+    small = [index for index, weight in enumerate(scaled) if weight < 1.0]
+    large = [index for index, weight in enumerate(scaled) if weight >= 1.0]
+
+    while small and large:
+        small_index = small.pop()
+        large_index = large.pop()
+
+        probabilities[small_index] = scaled[small_index]
+        aliases[small_index] = large_index
+
+        scaled[large_index] = (scaled[large_index] + scaled[small_index]) - 1.0
+        if scaled[large_index] < 1.0:
+            small.append(large_index)
+        else:
+            large.append(large_index)
+
+    # Anything left over is full up to rounding errors.
+    for index in large + small:
+        probabilities[index] = 1.0
+
+    return probabilities, aliases
@@ -0,0 +1,287 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import consts
+from catalog import get_catalog
+from levelgen import GeneratorConfig, generate_level, generate_levels
+from library import load_library
+
+# The parameters of a request that are passed on to generate_level as they are.
+REQUEST_PARAMETERS = ('world', 'level', 'stars', 'required', 'excludes', 'only_required', 'seed')
+# The libraries loaded in this process, by name; filled in by _warm_worker in every worker.
+_libraries = {}
+
+
+class RequestError(ValueError):
+    """Raised when a request to the server is not valid."""
+
+
+class ServerStats:
+    """Counts the requests a server answered and keeps their latencies for percentiles.
+
+    Parameters
+    ----------
+    window : int, optional
+        the number of most recent latencies to compute percentiles over (default is 10000)
+    """
+
+    def __init__(self, window=10000):
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.errors = 0
+        self.levels = 0
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds, levels=1, error=False):
+        """Record a request that took a number of seconds to answer."""
+        with self._lock:
+            self.requests += 1
+            self.levels += levels
+            if error:
+                self.errors += 1
+            self._latencies.append(seconds)
+
+    def summary(self):
+        """Return the throughput and latency percentiles as a dict of plain values."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            elapsed = time.perf_counter() - self.started
+            summary = {
+                'uptime_seconds': elapsed,
+                'requests': self.requests,
+                'errors': self.errors,
+                'levels': self.levels,
+                'requests_per_second': self.requests / elapsed if elapsed > 0 else 0.0,
+                'levels_per_second': self.levels / elapsed if elapsed > 0 else 0.0,
+                }
+        for percentile in (50, 90, 99):
+            summary[f'latency_p{percentile}_ms'] = _percentile(latencies, percentile) * 1000
+        return summary
+
+
+class LevelServer:
+    """Answers JSON level requests from a pool of warm worker processes.
+
+    Every worker loads the default DESIGNS and FILLS and the given libraries once when it starts, so
+    requests only pay for generating their levels. A request is a JSON object with the same parameters
+    as generate_level: world, level and optionally stars, required, excludes, only_required and seed,
+    plus a 'config' object with GeneratorConfig fields and a 'library' name to use a loaded library
+    instead of the defaults. Requests with a 'levels' list, and optionally a 'master_seed', generate
+    a batch as generate_levels does.
+
+    The answer is an object with the 'grid' (or 'grids' for batches), or an 'error'.
+
+    Parameters
+    ----------
+    libraries : dict, optional
+        library files to load, by the name requests use for them (default is empty)
+    workers : int, optional
+        the number of worker processes, None to use every core (default is None)
+    """
+
+    def __init__(self, libraries={}, workers=None):
+        self.libraries = dict(libraries)
+        # Load everything here first, so bad library files are reported before starting any workers.
+        _warm_worker(self.libraries)
+        workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=_warm_worker, initargs=(self.libraries,))
+        # Every submit starts a worker while none is idle, and a worker only runs work once it is warm,
+        # so this starts every worker and waits for them to run _warm_worker.
+        for future in [self.executor.submit(os.getpid) for _ in range(workers)]:
+            future.result()
+        self.stats = ServerStats()
+
+    def close(self):
+        """Shut down the worker processes."""
+        self.executor.shutdown(cancel_futures=True)
+
+    def submit(self, request):
+        """Hand a request to the workers and return a concurrent.futures.Future of its answer."""
+        try:
+            return self.executor.submit(_answer, request)
+        except Exception as error:
+            # The pool breaks when a worker dies, which is reported like any other failed request.
+            future = Future()
+            future.set_exception(error)
+            return future
+
+    def answer(self, request):
+        """Answer a request, waiting for a worker, and record it in the stats."""
+        start = time.perf_counter()
+        answer = _result(self.submit(request))
+        self.stats.record(time.perf_counter() - start, _level_count(request, answer), 'error' in answer)
+        return answer
+
+    def serve_http(self, host='127.0.0.1', port=8765):
+        """Answer POST requests to /generate and GET requests to /stats over HTTP until interrupted."""
+        level_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/stats':
+                    self._send(404, {'error': f'Unknown path {self.path}, use POST /generate or GET /stats.'})
+                    return
+                self._send(200, level_server.stats.summary())
+
+            def do_POST(self):
+                if self.path != '/generate':
+                    self._send(404, {'error': f'Unknown path {self.path}, use POST /generate or GET /stats.'})
+                    return
+                try:
+                    request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                except ValueError as error:
+                    self._send(400, {'error': f'Invalid JSON: {error}'})
+                    return
+                answer = level_server.answer(request)
+                self._send(400 if 'error' in answer else 200, answer)
+
+            def _send(self, status, body):
+                data = json.dumps(body, separators=(',', ':')).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                # Stats are available from /stats, so there is no need to log every request.
+                pass
+
+        httpd = ThreadingHTTPServer((host, port), Handler)
+        print(f'Serving levels on http://{host}:{httpd.server_port}', file=sys.stderr)
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            httpd.server_close()
+
+    def serve_stdio(self, input_file=None, output_file=None):
+        """Answer one JSON request per line of input with one JSON answer per line of output, until the input ends.
+
+        Requests are answered as soon as they are done, which may be out of order; an 'id' in a request
+        is copied to its answer. A request of {"command": "stats"} answers with the stats.
+        Reads from stdin and writes to stdout if no files are provided.
+        """
+        input_file = sys.stdin if input_file is None else input_file
+        output_file = sys.stdout if output_file is None else output_file
+        write_lock = threading.Lock()
+        pending = set()
+
+        def write(answer):
+            with write_lock:
+                output_file.write(json.dumps(answer, separators=(',', ':')) + '\n')
+                output_file.flush()
+
+        def finish(future, request, start):
+            with write_lock:
+                pending.discard(future)
+            answer = _result(future)
+            self.stats.record(time.perf_counter() - start, _level_count(request, answer), 'error' in answer)
+            if isinstance(request, dict) and 'id' in request:
+                answer['id'] = request['id']
+            write(answer)
+
+        for line in input_file:
+            if not line.strip():
+                continue
+            start = time.perf_counter()
+            try:
+                request = json.loads(line)
+            except ValueError as error:
+                write({'error': f'Invalid JSON: {error}'})
+                continue
+
+            if isinstance(request, dict) and request.get('command') == 'stats':
+                answer = self.stats.summary()
+                if 'id' in request:
+                    answer['id'] = request['id']
+                write(answer)
+                continue
+
+            future = self.submit(request)
+            with write_lock:
+                pending.add(future)
+            future.add_done_callback(lambda done, request=request, start=start: finish(done, request, start))
+
+        with write_lock:
+            remaining = list(pending)
+        wait(remaining)
+
+
+def _warm_worker(libraries):
+    """Load the default elements and the libraries and build their catalogs in this process, so requests do not have to."""
+    element_sets = [(consts.DESIGNS, consts.FILLS)]
+    for name, path in libraries.items():
+        _libraries[name] = load_library(path)
+        element_sets.append((_libraries[name].designs, _libraries[name].fills))
+    for designs, fills in element_sets:
+        get_catalog(designs).solver(())
+        get_catalog(fills)
+
+def _result(future):
+    """Return the answer of a future, or an error answer if it did not finish, e.g. because its worker died."""
+    try:
+        return future.result()
+    except Exception as error:
+        return {'error': f'{type(error).__name__}: {error}'}
+
+def _answer(request):
+    """Answer a single request inside a worker, returning the answer as a dict."""
+    try:
+        return _generate(request)
+    except RequestError as error:
+        return {'error': str(error)}
+    except Exception as error:
+        # Anything else is reported to the client as well, so one bad request cannot take the server down.
+        return {'error': f'{type(error).__name__}: {error}'}
+
+def _generate(request):
+    """Generate the level or levels a request asks for."""
+    if not isinstance(request, dict):
+        raise RequestError('A request has to be a JSON object.')
+
+    elements_set = fill_set = None
+    if 'library' in request:
+        if request['library'] not in _libraries:
+            raise RequestError(f"Unknown library {request['library']!r}.")
+        elements_set = _libraries[request['library']].designs
+        fill_set = _libraries[request['library']].fills
+
+    config_fields = request.get('config', {})
+    if not isinstance(config_fields, dict):
+        raise RequestError("'config' has to be an object of GeneratorConfig fields.")
+    # Memoryviews cannot be turned into JSON, so the rows are always lists.
+    config = GeneratorConfig(**{**config_fields, 'return_view': False})
+
+    if 'levels' in request:
+        grids = generate_levels(
+            request['levels'], required=request.get('required', []), excludes=request.get('excludes', []),
+            elements_set=elements_set, fill_set=fill_set, config=config,
+            only_required=request.get('only_required', False), master_seed=request.get('master_seed'))
+        return {'grids': grids}
+
+    if 'world' not in request or 'level' not in request:
+        raise RequestError("A request needs a 'world' and a 'level', or a list of 'levels'.")
+    parameters = {name: request[name] for name in REQUEST_PARAMETERS if name in request}
+    return {'grid': generate_level(elements_set=elements_set, fill_set=fill_set, config=config, **parameters)}
+
+def _level_count(request, answer):
+    """Return the number of levels in an answer."""
+    if 'grids' in answer:
+        return len(answer['grids'])
+    return 1 if 'grid' in answer else 0
+
+def _percentile(values, percentile):
+    """Return a percentile of sorted values, 0 if there are none."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * percentile / 100))]
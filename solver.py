@@ -0,0 +1,133 @@
+from collections import defaultdict
+
+from sampler import WeightedSampler, resolve_rng
+
+# Stands in for "no combination of elements reaches this cost".
+_UNREACHABLE = float('inf')
+
+
+class DifficultySolver:
+    """Picks a set of elements whose costs add up to a difficulty target and whose bubbles fit the field.
+
+    This is an unbounded knapsack over cost: for every cost up to the largest target asked for so far,
+    the solver knows the fewest bubbles any combination of elements needs to spend exactly that cost.
+    It then draws elements one at a time, weighted by chance_weight, only allowing elements after
+    which the rest of the target can still be reached within the bubbles left.
+
+    Bubbles are counted as the non-empty bubbles in an element's output. Elements that override
+    or are treated as fills never run out of space, so they count as taking none.
+    Fitting the bubble count is needed for every element to be placed, but does not guarantee it,
+    as elements can still block each other's spots or only fit in some rows; generate_level therefore
+    plans a spot for every drawn element before using them, see helpers._plan_placements.
+
+    Build one per filtered list of elements and reuse it, for instance through ElementCatalog.solver;
+    the work for every cost and target is kept.
+
+    Parameters
+    ----------
+    elements : list
+        the DesignElements to draw from
+    """
+
+    def __init__(self, elements):
+        groups = defaultdict(list)
+        for element in elements:
+            # Elements that cost nothing cannot help reach a target.
+            if element.cost > 0:
+                groups[(element.cost, _bubble_count(element))].append(element)
+
+        # Elements with the same cost and bubble count are interchangeable for the solver,
+        # so it works on the groups and only rolls within a group at the end.
+        self._groups = [(cost, bubbles, WeightedSampler(group), sum(element.chance_weight for element in group))
+                        for (cost, bubbles), group in groups.items()]
+        self._fewest_bubbles = [0]
+        self._plans = {}
+
+    def solve(self, target, tolerance=0, bubble_budget=None, rng=None):
+        """Draw a list of elements with costs adding up to between target and target + tolerance.
+
+        Parameters
+        ----------
+        target : int
+            the lowest total cost to reach
+        tolerance : int, optional
+            how far the total cost may go over the target (default is 0)
+        bubble_budget : int, optional
+            the most bubbles the elements may take up together, unlimited if not provided (default is None)
+        rng : random.Random or numpy.random.Generator, optional
+            the random number generator to use, see resolve_rng (default is None)
+
+        Returns
+        -------
+        list or None
+            the drawn elements, or None if no combination of elements reaches the target within the budget
+        """
+        if target <= 0:
+            return []
+        total_cost = self.plan(target, tolerance, bubble_budget)
+        if total_cost is None:
+            return None
+        if bubble_budget is None:
+            bubble_budget = _UNREACHABLE
+        rng = resolve_rng(rng)
+
+        # Draw backwards from the total, only offering groups after which the rest of the
+        # total can still be spent in the bubbles that are left.
+        elements_to_return = []
+        remaining_cost = total_cost
+        while remaining_cost > 0:
+            candidates = []
+            candidate_weight = 0
+            for cost, bubbles, sampler, weight in self._groups:
+                if cost > remaining_cost:
+                    continue
+                # An unlimited budget fits anything, so check the rest can be reached at all first.
+                fewest = self._fewest_bubbles[remaining_cost - cost]
+                if fewest < _UNREACHABLE and fewest + bubbles <= bubble_budget:
+                    candidates.append((cost, bubbles, sampler, weight))
+                    candidate_weight += weight
+
+            # Groups without any weight are only drawn if nothing else is left, all with the same chance.
+            if candidate_weight == 0:
+                cost, bubbles, sampler, _ = candidates[rng.randint(0, len(candidates) - 1)]
+            else:
+                roll = rng.random() * candidate_weight
+                for cost, bubbles, sampler, weight in candidates:
+                    roll -= weight
+                    if roll < 0:
+                        break
+
+            elements_to_return.append(sampler.roll(rng))
+            remaining_cost -= cost
+            bubble_budget -= bubbles
+        return elements_to_return
+
+    def plan(self, target, tolerance=0, bubble_budget=None):
+        """Return the lowest total cost from target to target + tolerance that fits the bubble budget, or None."""
+        key = (target, tolerance, bubble_budget)
+        if key not in self._plans:
+            self._extend(target + tolerance)
+            self._plans[key] = None
+            for total_cost in range(max(0, target), target + tolerance + 1):
+                fewest = self._fewest_bubbles[total_cost]
+                if fewest < _UNREACHABLE and (bubble_budget is None or fewest <= bubble_budget):
+                    self._plans[key] = total_cost
+                    break
+        return self._plans[key]
+
+    def _extend(self, max_cost):
+        """Work out the fewest bubbles needed for every cost up to max_cost."""
+        fewest_bubbles = self._fewest_bubbles
+        for total_cost in range(len(fewest_bubbles), max_cost + 1):
+            fewest = _UNREACHABLE
+            for cost, bubbles, _, _ in self._groups:
+                if cost <= total_cost and fewest_bubbles[total_cost - cost] + bubbles < fewest:
+                    fewest = fewest_bubbles[total_cost - cost] + bubbles
+            fewest_bubbles.append(fewest)
+
+
+def _bubble_count(element):
+    """Return the number of bubbles an element takes up on the field, 0 if it can never run out of space."""
+    if element.override or element.treat_as_fill:
+        return 0
+    return sum(len(row) - row.count(0) for row in element.encoded_rows)
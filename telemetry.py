@@ -0,0 +1,106 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from time import perf_counter
+
+# The stages of generating a level, in the order they happen.
+STAGES = ('difficulty', 'fill_selection', 'element_rolling', 'color_resolution', 'placement',
+          'fill_application', 'output')
+
+
+@dataclass
+class GenerationTelemetry:
+    """Collects timings and counts while generating levels.
+
+    Pass an instance as the telemetry argument of generate_level, generate_levels or iter_levels;
+    it keeps adding up over every level it is used for. Generation does no extra work at all
+    when no telemetry is passed.
+
+    Parameters
+    ----------
+    stage_seconds : dict
+        the time spent in every stage of generation, see STAGES
+    levels : int
+        the number of levels generated
+    elements_required : int
+        the number of elements queued because they were required
+    elements_rolled : int
+        the number of elements rolled to spend the difficulty budget
+    placements : int
+        the number of elements we tried to place on the field
+    failed_placements : int
+        the number of elements that were dropped because there was no legal spot left for them
+    legal_spots : int
+        the total number of legal spots over all placements, counted exactly on the field at the time of each
+    difficulty_budget : int
+        the total difficulty the levels were allowed to spend
+    difficulty_spent : int
+        the total difficulty the levels actually spent, including elements that failed to place
+    solved_levels : int
+        the number of levels whose elements were picked by the DifficultySolver
+    solver_fallbacks : int
+        the number of levels where the solver found no fitting set of elements, so elements were rolled instead
+    placed_elements : Counter
+        how often each element was placed, by name
+    failed_elements : Counter
+        how often each element failed to place, by name
+    fills : Counter
+        how often each fill was used, by name
+    """
+    stage_seconds: dict = field(default_factory=lambda: dict.fromkeys(STAGES, 0.0))
+    levels: int = 0
+    elements_required: int = 0
+    elements_rolled: int = 0
+    placements: int = 0
+    failed_placements: int = 0
+    legal_spots: int = 0
+    difficulty_budget: int = 0
+    difficulty_spent: int = 0
+    solved_levels: int = 0
+    solver_fallbacks: int = 0
+    placed_elements: Counter = field(default_factory=Counter)
+    failed_elements: Counter = field(default_factory=Counter)
+    fills: Counter = field(default_factory=Counter)
+
+    def lap(self, stage, start):
+        """Add the time since start to a stage and return the current time, to start timing the next stage."""
+        now = perf_counter()
+        self.stage_seconds[stage] += now - start
+        return now
+
+    def record_placement(self, element, legal_spots):
+        """Record an attempt to place an element that had a number of legal spots to choose from."""
+        self.placements += 1
+        self.legal_spots += legal_spots
+        if legal_spots == 0:
+            self.failed_placements += 1
+            self.failed_elements[element.name] += 1
+        else:
+            self.placed_elements[element.name] += 1
+
+    def record_solve(self, solved):
+        """Record whether the solver found a set of elements for a level."""
+        if solved:
+            self.solved_levels += 1
+        else:
+            self.solver_fallbacks += 1
+
+    def summary(self):
+        """Return the collected data as a dict of plain values, for logging or JSON."""
+        return {
+            'levels': self.levels,
+            'stage_seconds': dict(self.stage_seconds),
+            'total_seconds': sum(self.stage_seconds.values()),
+            'elements_required': self.elements_required,
+            'elements_rolled': self.elements_rolled,
+            'placements': self.placements,
+            'failed_placements': self.failed_placements,
+            'failed_placement_rate': self.failed_placements / self.placements if self.placements else 0.0,
+            'average_legal_spots': self.legal_spots / self.placements if self.placements else 0.0,
+            'difficulty_budget': self.difficulty_budget,
+            'difficulty_spent': self.difficulty_spent,
+            'solved_levels': self.solved_levels,
+            'solver_fallbacks': self.solver_fallbacks,
+            'placed_elements': dict(self.placed_elements),
+            'failed_elements': dict(self.failed_elements),
+            'fills': dict(self.fills),
+            }
@@ -0,0 +1,82 @@
+import random
+from collections import deque
+
+import pytest
+
+from analysis import _COLOR_OF, _has_floating_bubbles, analyze_levels, count_floating
+from helpers import _row_offsets
+from levelgen import GeneratorConfig
+
+
+def _neighbours(row, column, field_width, field_height):
+    """Return the cells next to a cell, with the narrow odd rows sitting half a bubble to the right."""
+    def length(other_row):
+        return field_width if other_row % 2 == 0 else field_width - 1
+
+    cells = [(row, column - 1), (row, column + 1)]
+    # Wide rows touch columns c - 1 and c of the narrow rows around them, narrow rows columns c and c + 1.
+    shift = -1 if row % 2 == 0 else 0
+    for other_row in (row - 1, row + 1):
+        cells += [(other_row, column + shift), (other_row, column + shift + 1)]
+    return [(other_row, other_column) for other_row, other_column in cells
+            if 0 <= other_row < field_height and 0 <= other_column < length(other_row)]
+
+def _reference(grid, field_width, field_height):
+    """Analyse a grid of bytes with a plain breadth-first search over (row, column) cells."""
+    offsets = _row_offsets(field_width, field_height)
+    value = {(row, column): grid[offsets[row] + column]
+             for row in range(field_height) for column in range(offsets[row + 1] - offsets[row])}
+
+    def search(starts, allowed):
+        seen = set(starts)
+        queue = deque(starts)
+        while queue:
+            for cell in _neighbours(*queue.popleft(), field_width, field_height):
+                if cell not in seen and allowed(cell):
+                    seen.add(cell)
+                    queue.append(cell)
+        return seen
+
+    filled = {cell for cell, bubble in value.items() if bubble}
+    attached = search([cell for cell in filled if cell[0] == 0], lambda cell: cell in filled)
+    reachable = search([cell for cell in value if cell not in filled and cell[0] == field_height - 1],
+                       lambda cell: cell not in filled)
+    shot_targets = {cell for cell in reachable if cell[0] == 0
+                    or any(other in filled for other in _neighbours(*cell, field_width, field_height))}
+
+    components = {}
+    unvisited = {cell for cell in filled if _COLOR_OF[value[cell]]}
+    while unvisited:
+        start = unvisited.pop()
+        color = _COLOR_OF[value[start]]
+        component = search([start], lambda cell: cell in unvisited and _COLOR_OF[value[cell]] == color)
+        unvisited -= component
+        components.setdefault(color, []).append(len(component))
+    return (len(filled), {color: sorted(sizes, reverse=True) for color, sizes in components.items()},
+            tuple(sorted(filled - attached)), tuple(sorted(shot_targets)))
+
+
+@pytest.mark.parametrize('field_width, field_height', [(8, 8), (3, 2), (5, 9), (9, 5), (12, 13)])
+def test_analysis_matches_breadth_first_search(field_width, field_height):
+    rng = random.Random(field_width * 100 + field_height)
+    config = GeneratorConfig(field_width=field_width, field_height=field_height)
+    size = _row_offsets(field_width, field_height)[-1]
+    # Empty, colored, locked and special bubbles, at densities from sparse to packed.
+    bubbles = [1, 2, 3, 4, 22, 23, 20, 97]
+    grids = []
+    for number in range(120):
+        density = number / 120
+        grids.append(bytes(rng.choice(bubbles) if rng.random() < density else 0 for _ in range(size)))
+
+    analyses = analyze_levels(grids, config)
+    floating_counts = count_floating(grids, config)
+    for grid, analysis, floating_count in zip(grids, analyses, floating_counts):
+        bubble_count, components, floating, shot_targets = _reference(grid, field_width, field_height)
+        assert analysis.bubbles == bubble_count
+        assert analysis.components == components
+        assert analysis.match_clusters == sorted(
+            (size for sizes in components.values() for size in sizes if size >= 3), reverse=True)
+        assert tuple(sorted(analysis.floating)) == floating
+        assert tuple(sorted(analysis.shot_targets)) == shot_targets
+        assert floating_count == len(floating)
+        assert _has_floating_bubbles(grid, field_width, field_height) == (len(floating) != 0)
@@ -0,0 +1,38 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import async_levelgen
+from async_levelgen import AsyncLevelGenerator
+from consts import DESIGNS, FILLS
+from levelgen import generate_level
+
+
+def _generate(generator, elements_set, fill_set, seeds):
+    async def run():
+        return [await generator.generate_level(1, seed, elements_set=elements_set, fill_set=fill_set, seed=seed)
+                for seed in seeds]
+    return asyncio.run(run())
+
+
+def test_custom_sets_match_generate_level_in_worker_processes():
+    elements_set, fill_set = list(DESIGNS[:12]), list(FILLS[:3])
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        generated = _generate(AsyncLevelGenerator(executor), elements_set, fill_set, range(1, 6))
+    assert generated == [generate_level(1, seed, elements_set=elements_set, fill_set=fill_set, seed=seed)
+                         for seed in range(1, 6)]
+
+
+def test_custom_sets_are_only_sent_once(monkeypatch):
+    monkeypatch.setattr(async_levelgen, '_worker_sets', async_levelgen.OrderedDict())
+    sent = []
+    generate_in_worker = async_levelgen._generate_in_worker
+
+    def recording_generate_in_worker(arguments, set_digests, sets=None):
+        sent.append(sets is not None)
+        return generate_in_worker(arguments, set_digests, sets)
+
+    monkeypatch.setattr(async_levelgen, '_generate_in_worker', recording_generate_in_worker)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        _generate(AsyncLevelGenerator(executor), list(DESIGNS[:12]), list(FILLS[:3]), range(1, 6))
+    # The first job is sent without the sets, turned down, and sent again with them.
+    assert sent == [False, True] + [False] * 4
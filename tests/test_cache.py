@@ -0,0 +1,60 @@
+import dataclasses
+
+from cache import LevelCache, level_key
+from consts import DESIGNS, FILLS
+from levelgen import GeneratorConfig, generate_level
+
+
+def _replace(elements, name, **changes):
+    return [dataclasses.replace(element, **changes) if element.name == name else element for element in elements]
+
+
+def test_key_is_stable_for_the_same_inputs():
+    assert level_key(1, 2, seed=3) == level_key(1, 2, seed=3)
+    # Equal sets in other lists, and other output forms of the same level, share the key.
+    assert level_key(1, 2, elements_set=list(DESIGNS), fill_set=list(FILLS), seed=3) == level_key(1, 2, seed=3)
+    assert level_key(1, 2, config=GeneratorConfig(return_view=True), seed=3) == level_key(1, 2, seed=3)
+
+
+def test_editing_an_element_changes_the_key():
+    key = level_key(1, 2, elements_set=list(DESIGNS), fill_set=list(FILLS), seed=3)
+    edits = [
+        (_replace(DESIGNS, 'cloud', output=[[7, 7, 0], [7, 7, 7]]), FILLS),
+        (_replace(DESIGNS, 'cloud', cost=15), FILLS),
+        (_replace(DESIGNS, 'circle', y_max=3), FILLS),
+        (_replace(DESIGNS, 'fireworks', allowed_colors=[1, 2]), FILLS),
+        (DESIGNS, _replace(FILLS, 'japan', override=True)),
+        (DESIGNS[1:], FILLS),
+        ]
+    keys = {level_key(1, 2, elements_set=list(designs), fill_set=list(fills), seed=3) for designs, fills in edits}
+    assert key not in keys
+    assert len(keys) == len(edits)
+
+
+def test_other_inputs_change_the_key():
+    key = level_key(1, 2, seed=3)
+    others = [level_key(1, 3, seed=3), level_key(1, 2, 1, seed=3), level_key(1, 2, seed=4),
+              level_key(1, 2, required=['cloud'], seed=3), level_key(1, 2, excludes=[4], seed=3),
+              level_key(1, 2, config=GeneratorConfig(base_difficulty=30), seed=3),
+              level_key(1, 2, only_required=True, seed=3)]
+    assert key not in others
+    assert len(set(others)) == len(others)
+
+
+def test_cache_returns_the_generated_level_from_memory_and_disk(tmp_path):
+    cache = LevelCache(tmp_path)
+    expected = generate_level(1, 2, seed=3)
+    assert cache.generate_level(1, 2, seed=3) == expected
+    assert cache.generate_level(1, 2, seed=3) == expected
+    assert (cache.misses, cache.hits) == (1, 1)
+
+    # A new cache over the same directory finds the level on disk.
+    other_cache = LevelCache(tmp_path)
+    assert other_cache.generate_level(1, 2, seed=3) == expected
+    assert other_cache.disk_hits == 1
+
+    # After an edit the key changes, so the old level is not returned.
+    designs = _replace(DESIGNS, 'cloud', cost=15)
+    assert other_cache.generate_level(1, 2, elements_set=designs, seed=3) == \
+        generate_level(1, 2, elements_set=designs, seed=3)
+    assert other_cache.misses == 1
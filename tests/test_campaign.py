@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from campaign import CampaignError, generate_campaign
+from levelgen import GeneratorConfig
+
+LEVELS = [{'world': world, 'level': level} for world in range(1, 4) for level in range(1, 21)]
+MASTER_SEED = 11
+
+
+class _Interrupted(Exception):
+    pass
+
+
+def _interrupt_after(limit):
+    def progress(done, total):
+        if done >= limit:
+            raise _Interrupted()
+    return progress
+
+
+def _interrupted_run(output, **options):
+    with pytest.raises(_Interrupted):
+        generate_campaign(LEVELS, output, MASTER_SEED, chunk_size=8, checkpoint_every=16,
+                          progress=_interrupt_after(24), **options)
+    assert os.path.exists(f'{output}.checkpoint')
+
+
+@pytest.mark.parametrize('extension', ['jsonl', 'blp'])
+def test_resumed_campaign_matches_an_uninterrupted_run(tmp_path, extension):
+    expected = tmp_path / f'expected.{extension}'
+    generate_campaign(LEVELS, expected, MASTER_SEED, chunk_size=8)
+
+    output = tmp_path / f'campaign.{extension}'
+    _interrupted_run(output)
+    # Bytes written after the last checkpoint, for instance by a run that was killed, are cut off on resume.
+    data_path = output if extension == 'jsonl' else f'{output}.partial'
+    with open(data_path, 'ab') as data_file:
+        data_file.write(b'half a level')
+
+    finished = []
+    assert generate_campaign(LEVELS, output, chunk_size=8, progress=lambda done, total: finished.append(done)) \
+        == len(LEVELS)
+    # Only the levels after the checkpoint were generated again.
+    assert finished[0] > 24
+    assert output.read_bytes() == expected.read_bytes()
+    assert not os.path.exists(f'{output}.checkpoint')
+
+
+@pytest.mark.parametrize('changes', [
+    {'master_seed': MASTER_SEED + 1},
+    {'config': GeneratorConfig(base_difficulty=30)},
+    {'excludes': ['cloud']},
+    ])
+def test_checkpoints_of_other_campaigns_are_not_resumed(tmp_path, changes):
+    output = tmp_path / 'campaign.jsonl'
+    _interrupted_run(output)
+    options = {'master_seed': MASTER_SEED, **changes}
+    with pytest.raises(CampaignError, match='different campaign'):
+        generate_campaign(LEVELS, output, chunk_size=8, **options)
+    # Restarting starts over with the new settings.
+    assert generate_campaign(LEVELS, output, chunk_size=8, restart=True, **options) == len(LEVELS)
+
+
+def test_checkpoints_without_their_levels_are_not_resumed(tmp_path):
+    output = tmp_path / 'campaign.jsonl'
+    _interrupted_run(output)
+    with open(output, 'r+b') as data_file:
+        data_file.truncate(10)
+    with pytest.raises(CampaignError, match='shorter than its checkpoint'):
+        generate_campaign(LEVELS, output, chunk_size=8)
+    os.remove(output)
+    with pytest.raises(CampaignError, match='missing'):
+        generate_campaign(LEVELS, output, chunk_size=8)
+
+
+def test_campaign_in_worker_processes_matches_a_single_process(tmp_path):
+    single = tmp_path / 'single.jsonl'
+    multiple = tmp_path / 'multiple.jsonl'
+    generate_campaign(LEVELS, single, MASTER_SEED, chunk_size=8)
+    generate_campaign(LEVELS, multiple, MASTER_SEED, chunk_size=8, jobs=2)
+    assert multiple.read_bytes() == single.read_bytes()
@@ -0,0 +1,24 @@
+import pytest
+
+import helpers
+from levelgen import GeneratorConfig, generate_level
+
+
+@pytest.mark.parametrize('field_width, field_height, base_difficulty', [(8, 8, 40), (13, 9, 60), (20, 60, 300)])
+def test_spot_tracker_matches_a_search_of_the_field(monkeypatch, field_width, field_height, base_difficulty):
+    pick = helpers._SpotTracker.pick
+    checked = []
+
+    def checked_pick(self, element, list, config, rng):
+        index, legal_spots = pick(self, element, list, config, rng)
+        legal_indexes = helpers._get_legal_indexes(element, list, config)
+        assert legal_spots == len(legal_indexes)
+        assert index is None or index in legal_indexes
+        checked.append(element)
+        return index, legal_spots
+
+    monkeypatch.setattr(helpers._SpotTracker, 'pick', checked_pick)
+    config = GeneratorConfig(field_width=field_width, field_height=field_height, base_difficulty=base_difficulty)
+    for level in range(1, 11):
+        generate_level(1, level, seed=level, config=config)
+    assert checked
@@ -0,0 +1,95 @@
+import dataclasses
+
+import pytest
+
+from consts import DESIGNS, FILLS, DesignElement
+from incremental import plan_update, update_campaign, update_levels
+
+LEVELS = [{'world': world, 'level': level} for world in range(1, 3) for level in range(1, 16)]
+MASTER_SEED = 7
+
+
+def _replace(elements, name, **changes):
+    return [dataclasses.replace(element, **changes) if element.name == name else element for element in elements]
+
+
+def _first(elements, name):
+    return next(element for element in elements if element.name == name)
+
+
+# Every edit gets the designs, the fills and the name of a fill that is used by the levels.
+EDITS = {
+    'output': lambda designs, fills, used_fill: (
+        _replace(designs, 'cloud', output=[[7, 7, 0], [7, 7, 7]]), fills),
+    'y_max': lambda designs, fills, used_fill: (
+        _replace(designs, 'circle', y_max=3), fills),
+    'allowed_colors': lambda designs, fills, used_fill: (
+        _replace(designs, 'triangle_up_small', allowed_colors=[1, 2]), fills),
+    'fill': lambda designs, fills, used_fill: (
+        designs, _replace(fills, used_fill, output=[4] + list(_first(fills, used_fill).output[1:]))),
+    'added element': lambda designs, fills, used_fill: (
+        designs + [DesignElement('dot', 5, 1, ['small'], [['A']])], fills),
+    }
+
+
+@pytest.fixture(scope='module')
+def base():
+    return update_levels(LEVELS, {}, elements_set=list(DESIGNS), fill_set=list(FILLS), master_seed=MASTER_SEED)
+
+
+def _previous(update):
+    return {(world, level, stars): grid for world, level, stars, grid in update.levels}
+
+
+@pytest.mark.parametrize('edit', sorted(EDITS))
+def test_update_matches_a_full_rebuild(base, edit):
+    designs, fills = EDITS[edit](list(DESIGNS), list(FILLS), base.index.levels[(1, 1, 0)]['fill'])
+    update = update_levels(LEVELS, _previous(base), base.index, elements_set=designs, fill_set=fills)
+    rebuild = update_levels(LEVELS, {}, elements_set=designs, fill_set=fills, master_seed=MASTER_SEED)
+
+    assert update.levels == rebuild.levels
+    assert 0 < len(update.regenerated)
+    assert len(rebuild.regenerated) == len(LEVELS)
+    # The update is exactly as good as a rebuild, so the next update against either finds nothing to do.
+    assert plan_update(LEVELS, update.index, elements_set=designs, fill_set=fills) == {}
+
+
+def test_output_edits_only_regenerate_the_levels_that_used_the_design(base):
+    # Only levels that used the cloud depend on its output, so an edit leaves every other level as it was.
+    designs = _replace(list(DESIGNS), 'cloud', output=[[7, 7, 0], [7, 7, 7]])
+    update = update_levels(LEVELS, _previous(base), base.index, elements_set=designs, fill_set=list(FILLS))
+    for key, reason in update.regenerated.items():
+        assert reason == "uses changed design 'cloud'"
+    assert len(update.regenerated) < len(LEVELS)
+
+
+def test_unchanged_elements_regenerate_nothing(base):
+    assert plan_update(LEVELS, base.index, elements_set=list(DESIGNS), fill_set=list(FILLS)) == {}
+    update = update_levels(LEVELS, _previous(base), base.index, elements_set=list(DESIGNS), fill_set=list(FILLS))
+    assert update.regenerated == {}
+    assert update.levels == base.levels
+
+
+def test_worker_processes_regenerate_the_same_levels(base):
+    designs = _replace(list(DESIGNS), 'circle', y_max=3)
+    in_process = update_levels(LEVELS, _previous(base), base.index, elements_set=designs, fill_set=list(FILLS))
+    in_workers = update_levels(LEVELS, _previous(base), base.index, elements_set=designs, fill_set=list(FILLS),
+                               processes=2, chunk_size=4)
+    assert in_workers.levels == in_process.levels
+    assert in_workers.index == in_process.index
+
+
+@pytest.mark.parametrize('extension', ['jsonl', 'blp'])
+def test_update_campaign_only_regenerates_affected_levels(tmp_path, extension):
+    output = tmp_path / f'campaign.{extension}'
+    assert len(update_campaign(LEVELS, output, master_seed=MASTER_SEED)) == len(LEVELS)
+    first_run = output.read_bytes()
+    assert update_campaign(LEVELS, output) == {}
+    assert output.read_bytes() == first_run
+
+    designs = _replace(list(DESIGNS), 'cloud', output=[[7, 7, 0], [7, 7, 7]])
+    regenerated = update_campaign(LEVELS, output, elements_set=designs)
+    assert 0 < len(regenerated) < len(LEVELS)
+    rebuilt = tmp_path / f'rebuilt.{extension}'
+    update_campaign(LEVELS, rebuilt, master_seed=MASTER_SEED, elements_set=designs)
+    assert output.read_bytes() == rebuilt.read_bytes()
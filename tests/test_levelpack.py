@@ -0,0 +1,67 @@
+import gc
+import json
+
+import pytest
+
+from levelgen import GeneratorConfig, generate_levels
+from levelpack import LevelPackReader, write_jsonl, write_level_pack
+
+CONFIG = GeneratorConfig(field_width=9, field_height=7)
+
+
+@pytest.fixture(scope='module')
+def levels():
+    keys = [(world, level, stars) for world in (2, 1) for level in range(1, 6) for stars in (0, 3)]
+    generated = generate_levels([{'world': world, 'level': level, 'stars': stars} for world, level, stars in keys],
+                                master_seed=5, config=CONFIG)
+    return [(*key, grid) for key, grid in zip(keys, generated)]
+
+
+def test_level_pack_round_trip(tmp_path, levels):
+    path = tmp_path / 'levels.blp'
+    assert write_level_pack(levels, path, CONFIG) == len(levels)
+
+    with LevelPackReader(path) as pack:
+        assert (pack.field_width, pack.field_height, len(pack)) == (9, 7, len(levels))
+        assert list(pack) == sorted((world, level, stars) for world, level, stars, _ in levels)
+        for world, level, stars, grid in levels:
+            assert (world, level, stars) in pack
+            assert [list(row) for row in pack.get_level(world, level, stars)] == grid
+            assert bytes(pack.get_level_bytes(world, level, stars)) == bytes(bubble for row in grid for bubble in row)
+        # Without stars, the level with the fewest stars is returned.
+        assert [list(row) for row in pack[1, 3, None]] == next(grid for *key, grid in levels if key == [1, 3, 0])
+        assert (1, 6, 0) not in pack
+        with pytest.raises(KeyError):
+            pack.get_level(1, 6)
+
+
+def test_levels_can_be_kept_after_closing_the_pack(tmp_path, levels):
+    path = tmp_path / 'levels.blp'
+    write_level_pack(levels, path, CONFIG)
+    kept = []
+    with LevelPackReader(path) as pack:
+        for world, level, stars in pack:
+            kept.append(pack.get_level(world, level, stars))
+    assert [[list(row) for row in grid] for grid in kept] == [grid for *_, grid in sorted(levels)]
+    pack.close()
+    del kept
+    gc.collect()
+
+
+def test_level_pack_rejects_duplicates_and_wrong_sizes(tmp_path, levels):
+    with pytest.raises(ValueError, match='more than once'):
+        write_level_pack(levels + levels[:1], tmp_path / 'duplicate.blp', CONFIG)
+    with pytest.raises(ValueError, match='bubbles'):
+        write_level_pack(levels, tmp_path / 'size.blp', GeneratorConfig(field_width=10, field_height=7))
+    (tmp_path / 'other.blp').write_bytes(b'not a level pack at all, really')
+    with pytest.raises(ValueError, match='not a level pack'):
+        LevelPackReader(tmp_path / 'other.blp')
+
+
+def test_jsonl_round_trip(tmp_path, levels):
+    path = tmp_path / 'levels.jsonl'
+    assert write_jsonl(levels, path) == len(levels)
+    with open(path, encoding='utf-8') as jsonl_file:
+        read = [json.loads(line) for line in jsonl_file]
+    assert [(line['world'], line['level'], line['stars'], line['grid']) for line in read] == \
+        [tuple(level) for level in levels]
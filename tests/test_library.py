@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+from consts import DesignElement
+from levelgen import generate_level
+from library import LibraryError, load_library
+
+
+def _write_library(tmp_path, design):
+    table = {'name': 'dot', 'cost': 5, 'chance_weight': 1, 'keywords': [], 'output': [['A']]}
+    table.update(design)
+    path = tmp_path / 'library.json'
+    path.write_text(json.dumps({'designs': [table], 'fills': []}))
+    return path
+
+
+@pytest.mark.parametrize('allowed_colors', [[300], [128], [-1], [1, 255]])
+def test_allowed_colors_out_of_range_are_rejected(tmp_path, allowed_colors):
+    with pytest.raises(LibraryError, match='allowed_colors'):
+        load_library(_write_library(tmp_path, {'allowed_colors': allowed_colors}), cache_dir=None)
+    with pytest.raises(ValueError, match='allowed_colors'):
+        DesignElement('dot', 5, 1, [], [['A']], allowed_colors=allowed_colors)
+
+
+def test_y_min_above_y_max_is_rejected(tmp_path):
+    with pytest.raises(LibraryError, match='y_min'):
+        load_library(_write_library(tmp_path, {'y_min': 5, 'y_max': 2}), cache_dir=None)
+    with pytest.raises(ValueError, match='y_min'):
+        DesignElement('dot', 5, 1, [], [['A']], y_min=5, y_max=2)
+
+
+def test_y_min_without_y_max_and_valid_colors_load(tmp_path):
+    library = load_library(_write_library(tmp_path, {'y_min': 5, 'allowed_colors': [1, 127]}), cache_dir=None)
+    assert library.designs[0].allowed_colors == (1, 127)
+
+
+def test_required_colors_out_of_range_are_rejected():
+    with pytest.raises(ValueError, match='Required colors'):
+        generate_level(1, 1, required=[1000], seed=1)
@@ -0,0 +1,50 @@
+import io
+import json
+from concurrent.futures import Future
+
+import pytest
+
+import server
+from levelgen import generate_level
+
+
+@pytest.fixture(scope='module')
+def level_server():
+    level_server = server.LevelServer(workers=2)
+    yield level_server
+    level_server.close()
+
+
+def _serve(level_server, requests):
+    output = io.StringIO()
+    level_server.serve_stdio(io.StringIO(''.join(json.dumps(request) + '\n' for request in requests)), output)
+    return {answer['id']: answer for answer in map(json.loads, output.getvalue().splitlines())}
+
+
+def test_workers_are_warm_before_the_first_request(level_server):
+    assert len(level_server.executor._processes) == 2
+
+
+def test_stdio_answers_every_request(level_server):
+    answers = _serve(level_server, [
+        {'id': 1, 'world': 1, 'level': 1, 'seed': 3},
+        {'id': 2, 'world': 1},
+        {'id': 3, 'levels': [[1, 1], [1, 2]], 'master_seed': 5},
+        ])
+    assert answers[1]['grid'] == generate_level(1, 1, seed=3)
+    assert 'error' in answers[2]
+    assert len(answers[3]['grids']) == 2
+
+
+def test_stdio_answers_requests_whose_worker_failed(level_server, monkeypatch):
+    def failing_submit(request):
+        future = Future()
+        future.set_exception(RuntimeError('worker died'))
+        return future
+
+    monkeypatch.setattr(level_server, 'submit', failing_submit)
+    answers = _serve(level_server, [{'id': 1, 'world': 1, 'level': 1}, {'id': 2, 'world': 1, 'level': 2}])
+    assert answers == {
+        1: {'id': 1, 'error': 'RuntimeError: worker died'},
+        2: {'id': 2, 'error': 'RuntimeError: worker died'},
+        }
@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from consts import DESIGNS
+from levelgen import GeneratorConfig, generate_level
+from solver import DifficultySolver, _bubble_count
+from telemetry import GenerationTelemetry
+
+
+@pytest.fixture(scope='module')
+def solver():
+    return DifficultySolver(DESIGNS)
+
+
+def test_unreachable_target_without_budget(solver):
+    # Every shipped design costs a multiple of 5, so 23 cannot be reached exactly.
+    assert solver.plan(23, 0, None) is None
+    for seed in range(20):
+        assert solver.solve(23, 0, None, random.Random(seed)) is None
+
+
+@pytest.mark.parametrize('bubble_budget', [None, 0, 10, 40, 200])
+def test_solutions_stay_within_tolerance_and_budget(solver, bubble_budget):
+    rng = random.Random(1234)
+    for target in range(0, 120):
+        for tolerance in range(0, 7):
+            elements = solver.solve(target, tolerance, bubble_budget, rng)
+            if elements is None:
+                assert solver.plan(target, tolerance, bubble_budget) is None
+                continue
+            if target == 0:
+                assert elements == []
+                continue
+            total_cost = sum(element.cost for element in elements)
+            assert target <= total_cost <= target + tolerance
+            if bubble_budget is not None:
+                assert sum(_bubble_count(element) for element in elements) <= bubble_budget
+
+
+def test_reachable_targets_are_solved(solver):
+    for target in range(5, 200, 5):
+        assert solver.plan(target, 0, None) == target
+        assert sum(element.cost for element in solver.solve(target, 0, None, random.Random(target))) == target
+
+
+@pytest.mark.parametrize('field_width, field_height', [(8, 8), (12, 16)])
+def test_solved_levels_place_every_element_and_hit_the_target(field_width, field_height):
+    tolerance = 4
+    config = GeneratorConfig(field_width=field_width, field_height=field_height,
+                             use_solver=True, difficulty_tolerance=tolerance)
+    solved_levels = 0
+    for world in range(1, 4):
+        for level in range(1, 21):
+            telemetry = GenerationTelemetry()
+            generate_level(world, level, seed=world * 100 + level, config=config, telemetry=telemetry)
+            if telemetry.solved_levels == 0:
+                continue
+            solved_levels += 1
+            assert telemetry.failed_placements == 0
+            assert telemetry.difficulty_budget <= telemetry.difficulty_spent <= telemetry.difficulty_budget + tolerance
+    assert solved_levels > 0
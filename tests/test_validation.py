@@ -0,0 +1,55 @@
+import dataclasses
+
+from consts import FILLS
+from levelgen import GeneratorConfig
+from validation import ColorCount, DistinctElements, NoFloatingBubbles, Validator, generate_validated_level, \
+    generate_validated_levels
+
+
+def test_color_count_does_not_reject_early_when_the_fill_overrides():
+    frame = next(fill for fill in FILLS if fill.name == 'frame')
+    assert frame.override
+    grid = bytearray([1, 2, 3, 4] + [0] * 56)
+    validator = ColorCount(max_colors=3)
+
+    # The frame fill may cover the border, so the extra color can still disappear.
+    assert not validator.reject_early(grid, GeneratorConfig(), [], [], frame)
+    assert validator.reject_early(grid, GeneratorConfig(), [], [], dataclasses.replace(frame, override=False))
+
+
+def test_candidates_in_worker_processes_match_a_single_process():
+    validators = [ColorCount(max_colors=6), NoFloatingBubbles(), DistinctElements(minimum=2)]
+    for seed in range(1, 4):
+        for target_score in (1.0, None):
+            single = generate_validated_level(1, seed, validators=validators, candidates=6,
+                                              target_score=target_score, seed=seed)
+            multiple = generate_validated_level(1, seed, validators=validators, candidates=6,
+                                                target_score=target_score, seed=seed, processes=2)
+            assert multiple == single
+
+
+def test_batches_in_worker_processes_match_a_single_process():
+    levels = [(world, level) for world in range(1, 3) for level in range(1, 7)]
+    validators = [ColorCount(max_colors=6), NoFloatingBubbles()]
+    assert generate_validated_levels(levels, validators, master_seed=3, processes=2, chunk_size=4) == \
+        generate_validated_levels(levels, validators, master_seed=3)
+
+
+@dataclasses.dataclass
+class _RecordingValidator(Validator):
+    calls: list = dataclasses.field(default_factory=list)
+
+    def reject_early(self, grid, config, placed_elements, remaining_elements, fill):
+        self.calls.append((list(placed_elements), list(remaining_elements), len(remaining_elements)))
+        return False
+
+
+def test_validators_see_the_elements_that_are_left_to_place():
+    validator = _RecordingValidator()
+    generate_validated_level(3, 5, validators=[validator], candidates=1, seed=2)
+    # Once before anything is placed, then after every element.
+    queued = validator.calls[0][1]
+    assert len(validator.calls) == len(queued) + 1
+    for position, (_, remaining, length) in enumerate(validator.calls):
+        assert remaining == queued[position:]
+        assert length == len(remaining)
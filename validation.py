@@ -0,0 +1,425 @@
+import os
+import random
+from collections.abc import Sequence
+from dataclasses import dataclass
+from itertools import islice
+
+from analysis import _COLOR_OF, _has_floating_bubbles
+from farm import _chunks, _run_chunks, _worker_config
+from levelgen import GeneratorConfig, _default_sets, _generate_from_setup, _level_entries, _prepare_generation
+from sampler import resolve_rng
+
+
+class Validator:
+    """Base class for the checks a candidate level has to pass, see generate_validated_level.
+
+    Subclasses override score and, if they can tell early on that a candidate will fail, reject_early.
+    Validators are passed to worker processes, so they should be picklable, as dataclasses are.
+    """
+
+    def score(self, grid, config, placed_elements):
+        """Return a score from 0 to 1 for a finished candidate, or None to reject it.
+
+        Parameters
+        ----------
+        grid : bytearray
+            the bubbles of the candidate, one byte per bubble, rows in order
+        config : GeneratorConfig
+            the configuration the candidate is generated with
+        placed_elements : list
+            the elements that made it onto the field, in the order they were placed
+        """
+        return 1.0
+
+    def reject_early(self, grid, config, placed_elements, remaining_elements, fill):
+        """Return True to abort a candidate while its elements are still being placed.
+
+        Only reject a candidate here if it can never pass score, whatever the remaining
+        elements and the fill do. The grid does not have its fill yet.
+
+        Parameters
+        ----------
+        grid : bytearray
+            the bubbles placed so far, one byte per bubble, rows in order
+        config : GeneratorConfig
+            the configuration the candidate is generated with
+        placed_elements : list
+            the elements that made it onto the field so far
+        remaining_elements : sequence
+            the elements that still have to be placed, a read-only view into the elements of the candidate
+        fill : Fill
+            the fill that is applied once every element is placed
+        """
+        return False
+
+
+@dataclass
+class ColorCount(Validator):
+    """Rejects levels with too few or too many distinct colors; locked bubbles count as their color.
+
+    Parameters
+    ----------
+    min_colors : int, optional
+        the fewest colors a level may have (default = 3)
+    max_colors : int, optional
+        the most colors a level may have (default = 9)
+    """
+    min_colors: int = 3
+    max_colors: int = 9
+
+    def score(self, grid, config, placed_elements):
+        if self.min_colors <= len(_colors(grid)) <= self.max_colors:
+            return 1.0
+        return None
+
+    def reject_early(self, grid, config, placed_elements, remaining_elements, fill):
+        # Bubbles that are placed stay placed unless something overrides them, which the fill may do as well.
+        if fill.override or len(_colors(grid)) <= self.max_colors:
+            return False
+        return not any(element.override for element in remaining_elements)
+
+
+@dataclass
+class BubbleDensity(Validator):
+    """Rejects levels with too few or too many bubbles, scoring the rest by how close they are to a target.
+
+    Parameters
+    ----------
+    minimum : float, optional
+        the lowest share of the field that has to hold a bubble (default = 0.0)
+    maximum : float, optional
+        the highest share of the field that may hold a bubble (default = 1.0)
+    target : float, optional
+        the share to aim for, levels further away score lower; every level within range scores 1 if not provided
+        (default = None)
+    """
+    minimum: float = 0.0
+    maximum: float = 1.0
+    target: float = None
+
+    def score(self, grid, config, placed_elements):
+        density = (len(grid) - grid.count(0)) / len(grid)
+        if not self.minimum <= density <= self.maximum:
+            return None
+        if self.target is None:
+            return 1.0
+        return 1.0 - abs(density - self.target)
+
+
+@dataclass
+class DistinctElements(Validator):
+    """Rejects levels with too few different elements on the field.
+
+    Parameters
+    ----------
+    minimum : int, optional
+        the fewest different elements, by name, that have to be placed (default = 1)
+    target : int, optional
+        the number of different elements to aim for, levels with fewer score lower; every level
+        with at least minimum scores 1 if not provided (default = None)
+    """
+    minimum: int = 1
+    target: int = None
+
+    def score(self, grid, config, placed_elements):
+        distinct = len({element.name for element in placed_elements})
+        if distinct < self.minimum:
+            return None
+        if self.target is None:
+            return 1.0
+        return min(1.0, distinct / self.target)
+
+    def reject_early(self, grid, config, placed_elements, remaining_elements, fill):
+        names = {element.name for element in placed_elements}
+        if len(names) >= self.minimum:
+            return False
+        names.update(element.name for element in remaining_elements)
+        return len(names) < self.minimum
+
+
+@dataclass
+class NoFloatingBubbles(Validator):
+    """Rejects levels with bubbles that are not connected to the top row through other bubbles."""
+
+    def score(self, grid, config, placed_elements):
+        if _has_floating_bubbles(grid, config.field_width, config.field_height):
+            return None
+        return 1.0
+
+
+@dataclass
+class ValidatedLevel:
+    """The best candidate generate_validated_level found for a level.
+
+    Parameters
+    ----------
+    grid : list or str
+        the generated level, in the same form generate_level returns, or None if every candidate was rejected
+    score : float
+        the score of the level, the product of the scores of every validator (0 if every candidate was rejected)
+    candidate : int
+        the number of the candidate that was picked, counting from 0 (None if every candidate was rejected)
+    candidates : int
+        the number of candidates that were generated, which may be fewer than asked for if one reached target_score
+    rejected : int
+        the number of candidates that were rejected, of which early_rejections were aborted during placement
+    early_rejections : int
+        the number of candidates that were aborted during placement
+    """
+    grid: object
+    score: float
+    candidate: int
+    candidates: int
+    rejected: int
+    early_rejections: int
+
+
+def generate_validated_level(
+            world, level, stars=0, validators=(), candidates=8, target_score=1.0,
+            required=[], excludes=[], elements_set=None, fill_set=None, config=GeneratorConfig(),
+            only_required=False, rng=None, seed=None, telemetry=None, processes=1):
+    """Generate candidates for a level, check each one with validators and return the best one.
+
+    Filtering the elements and fills is done once for all candidates. Candidates are aborted as soon
+    as a validator can tell they will fail, usually while their elements are still being placed,
+    and generation stops early once a candidate reaches target_score.
+
+    Every candidate gets its own seed from the random number generator, so candidates can be generated
+    across multiple processes; the result is exactly the same no matter how many processes are used.
+
+    Parameters
+    ----------
+    world : int
+        the number of the world, used to determine difficulty
+    level : int
+        the number of the level, used to determine difficulty
+    stars : int, optional
+        the number of stars, used to determine difficulty (default is 0)
+    validators : iterable, optional
+        the Validators every candidate has to pass, such as ColorCount or NoFloatingBubbles (default is empty)
+    candidates : int, optional
+        the most candidates to generate (default is 8)
+    target_score : float, optional
+        stop generating candidates once one scores at least this much, None to always generate
+        every candidate (default is 1.0)
+    required, excludes, elements_set, fill_set, config, only_required, rng, seed, telemetry : optional
+        see generate_level; telemetry is only collected when running in a single process
+    processes : int, optional
+        the number of worker processes to generate candidates in, None to use every core (default is 1)
+
+    Returns
+    -------
+    ValidatedLevel
+        the best candidate, with how many candidates were generated and rejected
+    """
+    rng = resolve_rng(rng, seed)
+    elements_set, fill_set = _default_sets(elements_set, fill_set)
+    candidate_seeds = _candidate_seeds(rng, candidates)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes <= 1 or candidates <= 1:
+        setup = _prepare_generation(required, excludes, elements_set, fill_set, config)
+        return _best_candidate(
+            _generate_candidates(setup, world, level, stars, only_required, config, candidate_seeds,
+                                 telemetry, validators, target_score),
+            target_score)
+
+    # Every worker takes every so many candidates in turn and stops after its first one that reaches
+    # target_score. Every candidate before the first one to reach it is then generated by some worker.
+    processes = min(processes, candidates)
+    task = (world, level, stars, validators, target_score, required, excludes, elements_set, fill_set,
+            _worker_config(config), only_required)
+    chunks = [list(range(candidates))[worker::processes] for worker in range(processes)]
+    results = {}
+    for chunk, generated in zip(chunks, _run_chunks(
+            _candidate_chunk, [[candidate_seeds[candidate] for candidate in chunk] for chunk in chunks],
+            task, processes)):
+        results.update(zip(chunk, generated))
+
+    ordered_results = []
+    for candidate in range(candidates):
+        if candidate not in results:
+            break
+        ordered_results.append(results[candidate])
+    return _best_candidate(ordered_results, target_score)
+
+def generate_validated_levels(
+            levels, validators=(), candidates=8, target_score=1.0,
+            required=[], excludes=[], elements_set=None, fill_set=None, config=GeneratorConfig(),
+            only_required=False, master_seed=None, rng=None, telemetry=None, processes=1, chunk_size=16):
+    """Run generate_validated_level for a batch of levels, optionally across multiple processes.
+
+    With a master_seed every level gets its own random number generator, see level_seed, so the output
+    is exactly the same no matter how many processes are used.
+
+    Parameters
+    ----------
+    levels : iterable
+        the levels to generate, in any of the forms accepted by generate_levels
+    validators, candidates, target_score : optional
+        see generate_validated_level
+    required, excludes, elements_set, fill_set, config, only_required, master_seed, rng, telemetry : optional
+        see generate_levels; telemetry is only collected when running in a single process
+    processes : int, optional
+        the number of worker processes, None to use every core; more than one process needs a master_seed (default is 1)
+    chunk_size : int, optional
+        the number of levels to send to a worker at once (default is 16)
+
+    Returns
+    -------
+    list
+        a (world, level, stars, ValidatedLevel) tuple per level, in the same order as the input
+    """
+    levels = list(levels)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    chunks = _chunks(levels, chunk_size)
+    if processes <= 1 or len(chunks) <= 1:
+        task = (validators, candidates, target_score, required, excludes, elements_set, fill_set,
+                config, only_required, master_seed)
+        return _validate_chunk(levels, task, rng, telemetry)
+    if master_seed is None:
+        raise ValueError('Generating levels across multiple processes needs a master_seed.')
+
+    task = (validators, candidates, target_score, required, excludes, elements_set, fill_set,
+            _worker_config(config), only_required, master_seed)
+    return [validated for chunk in _run_chunks(_validate_chunk, chunks, task, processes) for validated in chunk]
+
+def _validate_chunk(chunk, task, rng=None, telemetry=None):
+    """Generate the best candidate for every level in a chunk, possibly inside a worker process."""
+    (validators, candidates, target_score, required, excludes, elements_set, fill_set,
+     config, only_required, master_seed) = task
+    return [(world, level, stars, _best_candidate(_generate_candidates(
+                setup, world, level, stars, level_only_required, config, _candidate_seeds(level_rng, candidates),
+                telemetry, validators, target_score), target_score))
+            for world, level, stars, setup, level_only_required, level_rng in _level_entries(
+                chunk, required, excludes, elements_set, fill_set, config, only_required, master_seed, rng)]
+
+def _candidate_chunk(candidate_seeds, task):
+    """Generate the candidates with these seeds for a single level inside a worker process."""
+    (world, level, stars, validators, target_score, required, excludes, elements_set, fill_set,
+     config, only_required) = task
+    setup = _prepare_generation(required, excludes, elements_set, fill_set, config)
+    return _generate_candidates(
+        setup, world, level, stars, only_required, config, candidate_seeds, None, validators, target_score)
+
+def _candidate_seeds(rng, candidates):
+    """Draw a seed for every candidate of a level from its random number generator."""
+    return [rng.randint(0, 2**63 - 1) for _ in range(candidates)]
+
+def _generate_candidates(setup, world, level, stars, only_required, config, candidate_seeds,
+                         telemetry, validators, target_score):
+    """Generate candidates from a setup in order, stopping after the first one that reaches target_score.
+
+    Returns a (grid, score, rejected early) tuple per generated candidate, with None as the grid
+    and score of rejected candidates.
+    """
+    monitor = _CandidateMonitor(list(validators), config, telemetry)
+    results = []
+    for candidate_seed in candidate_seeds:
+        monitor.reset()
+        grid = _generate_from_setup(
+            setup, world, level, stars, only_required, config, random.Random(candidate_seed), telemetry, monitor)
+        score = None if grid is None else monitor.score
+        results.append((grid, score, monitor.rejected_early))
+        if score is not None and target_score is not None and score >= target_score:
+            break
+    return results
+
+def _best_candidate(results, target_score):
+    """Pick the best of the results of _generate_candidates as a ValidatedLevel."""
+    best = ValidatedLevel(grid=None, score=0.0, candidate=None, candidates=0, rejected=0, early_rejections=0)
+    for candidate, (grid, score, rejected_early) in enumerate(results):
+        best.candidates += 1
+        if grid is None:
+            best.rejected += 1
+            best.early_rejections += rejected_early
+            continue
+
+        if best.grid is None or score > best.score:
+            best.grid = grid
+            best.score = score
+            best.candidate = candidate
+        if target_score is not None and best.score >= target_score:
+            break
+    return best
+
+
+class _CandidateMonitor:
+    """Follows a candidate through _generate_from_setup and runs the validators on it."""
+
+    def __init__(self, validators, config, telemetry=None):
+        self.validators = validators
+        self.config = config
+        self.telemetry = telemetry
+        self.reset()
+
+    def reset(self):
+        """Forget the previous candidate."""
+        self.placed_elements = []
+        self.fill = None
+        self.score = None
+        self.rejected_early = False
+
+    def record_selection(self, fill, queued_elements):
+        """Record the fill picked for the candidate; validators only look at the elements that get placed."""
+        self.fill = fill
+
+    def record_placement(self, element, legal_spots):
+        """Record an attempt to place an element, like GenerationTelemetry does."""
+        if self.telemetry is not None:
+            self.telemetry.record_placement(element, legal_spots)
+        if legal_spots != 0:
+            self.placed_elements.append(element)
+
+    def record_fill_element(self, element):
+        """Record an element that was applied as a fill, which always ends up on the field."""
+        self.placed_elements.append(element)
+
+    def reject_early(self, grid, queued_elements, position):
+        """Return True if any validator can already tell the candidate will fail, with the elements from position on still to place."""
+        remaining_elements = _RemainingElements(queued_elements, position)
+        for validator in self.validators:
+            if validator.reject_early(grid, self.config, self.placed_elements, remaining_elements, self.fill):
+                self.rejected_early = True
+                return True
+        return False
+
+    def accept(self, grid):
+        """Score the finished candidate, returning False if any validator rejects it."""
+        score = 1.0
+        for validator in self.validators:
+            validator_score = validator.score(grid, self.config, self.placed_elements)
+            if validator_score is None:
+                return False
+            score *= validator_score
+        self.score = score
+        return True
+
+
+class _RemainingElements(Sequence):
+    """A read-only view of the queued elements from a position onwards, so the queue is not copied for every placement."""
+
+    def __init__(self, elements, start):
+        self._elements = elements
+        self._start = start
+
+    def __len__(self):
+        return max(0, len(self._elements) - self._start)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('remaining element index out of range')
+        return self._elements[self._start + index]
+
+    def __iter__(self):
+        return islice(self._elements, self._start, None)
+
+
+def _colors(grid):
+    """Return the distinct colors on a grid, counting locked bubbles (21-39) as their color (1-19)."""
+    return set(grid.translate(_COLOR_OF)) - {0}